@@ -2,11 +2,15 @@ from database.database_module import (
     get_student,
     delete_student,
     update_student,
-    get_attendance_records,
+    iter_attendance_records,
+    get_daily_attendance,
+    get_weekly_attendance,
+    rebuild_attendance_rollup,
     delete_attendance_record,
     get_connection,
     get_student_by_name,
 )
+from database.attendance_export import export_attendance
 
 def list_all_students():
     """Retrieve and return all student records."""
@@ -46,13 +50,56 @@ def admin_list_attendance(student_id=None, start_date=None, end_date=None):
     Print attendance records. If student_id is provided, filter by student.
     Use start_date and end_date to filter by timestamp.
     """
-    records = get_attendance_records(student_id, start_date, end_date)
-    if records:
-        for record in records:
+    count = 0
+    try:
+        for record in iter_attendance_records(student_id, start_date, end_date):
             print(record)
-    else:
+            count += 1
+    except Exception as e:
+        print(f"Error retrieving attendance records: {e}")
+        return
+    if count == 0:
         print("No attendance records found.")
 
+def admin_export_attendance(path, student_id=None, start_date=None, end_date=None):
+    """Export attendance records to a .csv, .csv.gz or .parquet file via the admin interface."""
+    try:
+        count = export_attendance(path, student_id, start_date, end_date)
+    except Exception as e:
+        print(f"Failed to export attendance records: {e}")
+        return
+    print(f"Exported {count} attendance records to {path}.")
+
+def admin_daily_report(start_day, end_day, student_id=None):
+    """
+    Print per-student daily attendance (first seen, last seen, sightings)
+    between start_day and end_day, read from the AttendanceDaily rollup.
+    """
+    rows = get_daily_attendance(start_day, end_day, student_id)
+    if not rows:
+        print("No attendance found for that range.")
+        return
+    for row in rows:
+        print(f"{row['day']}  {row['name']:<30} first {row['first_seen'].time()}  "
+              f"last {row['last_seen'].time()}  x{row['count']}")
+
+def admin_weekly_report(start_day, end_day, student_id=None):
+    """Print per-student days present per week between start_day and end_day, read from the rollup."""
+    rows = get_weekly_attendance(start_day, end_day, student_id)
+    if not rows:
+        print("No attendance found for that range.")
+        return
+    for row in rows:
+        print(f"week of {row['week_start']}  {row['name']:<30} {row['days_present']} day(s)  x{row['count']}")
+
+def admin_rebuild_rollup(start_day=None, end_day=None):
+    """Recompute the daily attendance rollup from raw records (whole history by default)."""
+    written = rebuild_attendance_rollup(start_day, end_day)
+    if written is None:
+        print("Failed to rebuild the attendance rollup.")
+    else:
+        print(f"Attendance rollup rebuilt ({written} student-day rows).")
+
 def admin_delete_attendance(attendance_id):
     """Delete an attendance record via the admin interface."""
     if delete_attendance_record(attendance_id):
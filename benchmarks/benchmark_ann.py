@@ -0,0 +1,54 @@
+"""
+Recall-vs-latency report for the IVF index against exact search on synthetic
+128-d galleries.
+
+Run from the repository root:
+    python -m benchmarks.benchmark_ann
+"""
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_gallery, make_queries
+from face_encodings.ann_index import IVFIndex
+
+GALLERY_STUDENTS = [20000, 100000]
+ENCODINGS_PER_STUDENT = 2
+NUM_QUERIES = 500
+N_PROBES = [1, 2, 4, 8, 16, 32, 64]
+
+
+def timed_nearest(search, queries):
+    """Run `search` one query at a time (as the live loop does) and return results and ms/query."""
+    rows = np.empty(len(queries), dtype=np.int64)
+    start = time.perf_counter()
+    for i in range(len(queries)):
+        rows[i] = search(queries[i:i + 1])[0][0]
+    elapsed = time.perf_counter() - start
+    return rows, elapsed * 1000.0 / len(queries)
+
+
+def main():
+    for num_students in GALLERY_STUDENTS:
+        encodings_dict, centers = make_gallery(num_students, ENCODINGS_PER_STUDENT)
+        queries, _ = make_queries(centers, NUM_QUERIES)
+
+        start = time.perf_counter()
+        index = IVFIndex.from_encodings_dict(encodings_dict)
+        build_s = time.perf_counter() - start
+        print(f"\n{len(index)} encodings, {index.n_lists} lists, built in {build_s:.1f}s")
+
+        exact_rows, exact_ms = timed_nearest(index.exact_nearest, queries)
+        exact_labels = index.labels[exact_rows]
+        print(f"{'n_probe':>8} {'recall@1':>9} {'ms/query':>9} {'speedup':>8}")
+        print(f"{'exact':>8} {1.0:>9.3f} {exact_ms:>9.3f} {1.0:>7.1f}x")
+        for n_probe in N_PROBES:
+            rows, ms = timed_nearest(lambda q: index.nearest(q, n_probe=n_probe), queries)
+            # Recall counts a hit when the probed search finds the same student
+            # that exhaustive search does.
+            recall = np.mean(index.labels[rows] == exact_labels)
+            print(f"{n_probe:>8} {recall:>9.3f} {ms:>9.3f} {exact_ms / ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
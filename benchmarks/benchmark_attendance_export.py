@@ -0,0 +1,99 @@
+"""
+Peak RSS and rows/sec when reading a large Attendance table: get_attendance_records
+(fetchall into a list of dicts) vs. iter_attendance_records and the streaming
+exporter.
+
+Needs the MySQL server configured in database/database_module.py and a user
+allowed to create databases. Seeds a scratch database named
+<database>_export_bench (dropped afterwards unless --keep), then runs every
+mode in its own process so peak RSS is measured independently. Run from the
+repository root:
+    python -m benchmarks.benchmark_attendance_export [--rows 10000000]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from database import database_module
+
+MODES = ["fetchall", "iterate", "csv.gz", "parquet"]
+
+
+def run_mode(mode, out_dir):
+    """Run one mode in this process and print 'rows seconds peak_rss_mb'."""
+    from database.attendance_export import export_attendance
+    from database.database_module import get_attendance_records, iter_attendance_records
+
+    start = time.perf_counter()
+    if mode == "fetchall":
+        rows = len(get_attendance_records() or [])
+    elif mode == "iterate":
+        rows = sum(1 for _ in iter_attendance_records(as_dict=False))
+    else:
+        rows = export_attendance(os.path.join(out_dir, "attendance." + mode))
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux.
+    print(rows, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--keep", action="store_true", help="Keep the seeded database for reruns.")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--database", help=argparse.SUPPRESS)
+    parser.add_argument("--out-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        database_module.DB_CONFIG["database"] = args.database
+        run_mode(args.mode, args.out_dir)
+        return
+
+    from benchmarks.benchmark_indexes import seed, server_connection
+    from database.migrations import migrate
+
+    bench_db = database_module.DB_CONFIG["database"] + "_export_bench"
+    conn = server_connection()
+    conn.cursor().execute(f"CREATE DATABASE IF NOT EXISTS {bench_db}")
+    conn.close()
+    database_module.DB_CONFIG["database"] = bench_db
+    try:
+        migrate()
+        with database_module.transaction() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM Attendance")
+            existing = cursor.fetchone()[0]
+        if existing:
+            print(f"Reusing {existing} attendance rows kept by an earlier --keep run.")
+        else:
+            print(f"Seeding {args.students} students and {args.rows} attendance rows...")
+            seed(args.students, args.rows)
+
+        print(f"{'mode':>9} {'rows':>10} {'seconds':>8} {'rows/s':>10} {'peak RSS MB':>12}")
+        with tempfile.TemporaryDirectory() as out_dir:
+            for mode in MODES:
+                result = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.benchmark_attendance_export", "--mode", mode,
+                     "--database", bench_db, "--out-dir", out_dir],
+                    capture_output=True, text=True)
+                if result.returncode != 0 or not result.stdout.strip():
+                    reason = (result.stderr.strip().splitlines() or [f"exit code {result.returncode}"])[-1]
+                    print(f"{mode:>9} failed: {reason}")
+                    continue
+                rows, elapsed, rss_mb = result.stdout.strip().splitlines()[-1].split()
+                rows, elapsed, rss_mb = int(rows), float(elapsed), float(rss_mb)
+                print(f"{mode:>9} {rows:>10} {elapsed:>8.1f} {rows / elapsed:>10.0f} {rss_mb:>12.1f}")
+    finally:
+        if not args.keep:
+            conn = server_connection()
+            conn.cursor().execute(f"DROP DATABASE IF EXISTS {bench_db}")
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
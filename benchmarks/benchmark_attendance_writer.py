@@ -0,0 +1,74 @@
+"""
+Sustained attendance events/sec: synchronous log_attendance vs. AttendanceWriter.
+
+Needs the MySQL database configured in database/database_module.py. Creates
+temporary students named bench_student_*, and removes them and their
+attendance rows afterwards. Run from the repository root:
+    python -m benchmarks.benchmark_attendance_writer
+"""
+import time
+
+from database.attendance_writer import AttendanceWriter
+from database.database_module import create_student, get_connection
+from database.logging_module import log_attendance
+
+NUM_STUDENTS = 2000
+NAME_PREFIX = "bench_student_"
+
+
+def cleanup():
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE a FROM Attendance a JOIN Students s ON a.student_id = s.student_id "
+                       "WHERE s.name LIKE %s", (NAME_PREFIX + "%",))
+        cursor.execute("DELETE FROM Students WHERE name LIKE %s", (NAME_PREFIX + "%",))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def clear_attendance():
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("DELETE a FROM Attendance a JOIN Students s ON a.student_id = s.student_id "
+                       "WHERE s.name LIKE %s", (NAME_PREFIX + "%",))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def main():
+    cleanup()
+    names = [f"{NAME_PREFIX}{i:05d}" for i in range(NUM_STUDENTS)]
+    for name in names:
+        create_student(name)
+
+    try:
+        start = time.perf_counter()
+        for name in names:
+            log_attendance(name, duplicate_threshold=0)
+        sync_elapsed = time.perf_counter() - start
+        clear_attendance()
+
+        writer = AttendanceWriter(duplicate_threshold=0, max_queue=NUM_STUDENTS)
+        writer.start()
+        start = time.perf_counter()
+        for name in names:
+            writer.submit(name)
+        submit_elapsed = time.perf_counter() - start
+        writer.close()
+        writer_elapsed = time.perf_counter() - start
+        stats = writer.stats()
+    finally:
+        cleanup()
+
+    print(f"log_attendance (sync):   {NUM_STUDENTS / sync_elapsed:>10.1f} events/s")
+    print(f"AttendanceWriter total:  {NUM_STUDENTS / writer_elapsed:>10.1f} events/s "
+          f"({stats['inserted']} inserted in {stats['batches']} batches)")
+    print(f"AttendanceWriter submit: {NUM_STUDENTS / submit_elapsed:>10.1f} events/s on the frame loop")
+
+
+if __name__ == "__main__":
+    main()
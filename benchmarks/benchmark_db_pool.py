@@ -0,0 +1,68 @@
+"""
+Load test: per-call mysql.connector.connect (the old get_connection) vs. the
+pooled get_connection, running a student lookup from several threads.
+
+Needs the MySQL database configured in database/database_module.py.
+Run from the repository root:
+    python -m benchmarks.benchmark_db_pool
+"""
+import threading
+import time
+
+import mysql.connector  # type: ignore
+import numpy as np
+
+from database.database_module import DB_CONFIG, POOL_CONFIG, get_connection, get_pool_stats
+
+CONCURRENCY = [1, 4, 8, 16]
+QUERIES_PER_THREAD = 200
+QUERY = "SELECT * FROM Students WHERE name = %s"
+
+
+def direct_connection():
+    return mysql.connector.connect(
+        host=DB_CONFIG["host"],
+        user=DB_CONFIG["user"],
+        password=DB_CONFIG["password"],
+        database=DB_CONFIG["database"]
+    )
+
+
+def run_queries(connect, latencies):
+    for i in range(QUERIES_PER_THREAD):
+        start = time.perf_counter()
+        conn = connect()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(QUERY, (f"student_{i}",))
+            cursor.fetchall()
+        finally:
+            conn.close()
+        latencies.append(time.perf_counter() - start)
+
+
+def load_test(connect, threads):
+    latencies = []
+    workers = [threading.Thread(target=run_queries, args=(connect, latencies)) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000.0
+    return len(latencies) / elapsed, np.percentile(ms, 50), np.percentile(ms, 95)
+
+
+def main():
+    print(f"pool_size={POOL_CONFIG['pool_size']}")
+    print(f"{'threads':>7} {'mode':>7} {'queries/s':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for threads in CONCURRENCY:
+        for mode, connect in (("direct", direct_connection), ("pooled", get_connection)):
+            qps, p50, p95 = load_test(connect, threads)
+            print(f"{threads:>7} {mode:>7} {qps:>10.1f} {p50:>8.2f} {p95:>8.2f}")
+    print(f"Pool stats: {get_pool_stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Re-encode speed with the detect-once face store vs. encoding full photos.
+
+Times three passes over a folder of enrollment photos (known_faces layout):
+    full photo   decode + detect + encode (the previous builders)
+    first pass   the same plus storing the aligned chip (empty face store)
+    re-encode    encode the stored chips only
+and checks that stored chips give the same encodings as full photos. Use real
+photos: detection cost depends on resolution and content. Run from the
+repository root:
+    python -m benchmarks.benchmark_face_store --faces-dir known_faces
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import face_recognition
+import numpy as np
+
+from face_encodings.data_preparation import encode_image_file, read_rgb_image
+from face_encodings.manifest import scan_local_images
+
+
+def encode_full_photo(image_path):
+    rgb_image = read_rgb_image(image_path)
+    if rgb_image is None:
+        return None
+    encodings = face_recognition.face_encodings(rgb_image)
+    return encodings[0] if encodings else None
+
+
+def timed_pass(paths, encode):
+    start = time.perf_counter()
+    encodings = [encode(path) for path in paths]
+    return time.perf_counter() - start, encodings
+
+
+def directory_size(root):
+    return sum(os.path.getsize(os.path.join(folder, name)) for folder, _, files in os.walk(root) for name in files)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--faces-dir", required=True, help="Folder of <student>/<photo> enrollment images.")
+    parser.add_argument("--limit", type=int, help="Use at most this many images.")
+    args = parser.parse_args()
+
+    current, _ = scan_local_images(args.faces_dir)
+    paths = [os.path.join(args.faces_dir, image_id) for image_id in sorted(current)][:args.limit]
+    photo_bytes = sum(os.path.getsize(path) for path in paths)
+
+    with tempfile.TemporaryDirectory() as store_dir:
+        results = [("full photo",) + timed_pass(paths, encode_full_photo)]
+        results.append(("first pass",) + timed_pass(paths, lambda p: encode_image_file(p, face_store_dir=store_dir)))
+        results.append(("re-encode",) + timed_pass(paths, lambda p: encode_image_file(p, face_store_dir=store_dir)))
+        store_bytes = directory_size(store_dir)
+
+    baseline = results[0][1]
+    print(f"{len(paths)} images, {photo_bytes / 1e6:.1f} MB of photos, "
+          f"face store {store_bytes / 1e6:.1f} MB ({store_bytes / max(len(paths), 1) / 1e3:.1f} KB/image)")
+    print(f"{'pass':>10} {'seconds':>8} {'images/s':>9} {'speedup':>8}")
+    for label, seconds, _ in results:
+        print(f"{label:>10} {seconds:>8.2f} {len(paths) / seconds:>9.1f} {baseline / seconds:>8.2f}")
+
+    reference, stored = results[0][2], results[2][2]
+    same_faces = sum((a is None) == (b is None) for a, b in zip(reference, stored))
+    differences = [np.abs(a - b).max() for a, b in zip(reference, stored) if a is not None and b is not None]
+    print(f"Face found/not found agrees for {same_faces}/{len(paths)} images; "
+          f"max encoding difference {max(differences, default=0.0):.2e}.")
+
+
+if __name__ == "__main__":
+    main()
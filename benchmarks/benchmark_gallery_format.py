@@ -0,0 +1,59 @@
+"""
+Load time and size of the binary gallery format vs. encodings.pickle.
+
+Run from the repository root:
+    python -m benchmarks.benchmark_gallery_format
+"""
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_gallery
+from face_encodings.gallery_format import Gallery, load_gallery, save_gallery
+from face_encodings.matcher import build_matcher
+
+GALLERY_SIZES = [1000, 10000, 50000]
+ENCODINGS_PER_STUDENT = 5
+
+
+def time_call(func, repeats=3):
+    """Return the best wall-clock time of `repeats` calls, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+
+def load_pickle(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def main():
+    print(f"{'students':>8} {'format':>18} {'size MB':>8} {'load ms':>8} {'load+index ms':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_students in GALLERY_SIZES:
+            encodings_dict, _ = make_gallery(num_students, ENCODINGS_PER_STUDENT, seed=num_students)
+            pickle_path = os.path.join(tmp, "encodings.pickle")
+            with open(pickle_path, "wb") as f:
+                pickle.dump(encodings_dict, f)
+            cases = [("pickle", pickle_path, lambda: load_pickle(pickle_path))]
+            for dtype, label in ((np.float32, "float32"), (np.float16, "float16")):
+                path = os.path.join(tmp, f"encodings_{label}.gallery")
+                save_gallery(path, Gallery.from_encodings_dict(encodings_dict, dtype=dtype))
+                cases.append((f"{label} mmap", path, lambda p=path: load_gallery(p)))
+                cases.append((f"{label} no-verify", path, lambda p=path: load_gallery(p, verify=False)))
+            for label, path, load in cases:
+                size_mb = os.path.getsize(path) / 1e6
+                load_ms = time_call(load)
+                index_ms = time_call(lambda: build_matcher(load(), index="exact"))
+                print(f"{num_students:>8} {label:>18} {size_mb:>8.1f} {load_ms:>8.1f} {index_ms:>14.1f}")
+
+
+if __name__ == "__main__":
+    main()
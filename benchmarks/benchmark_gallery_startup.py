@@ -0,0 +1,106 @@
+"""
+Time to a loaded gallery at startup, with and without the local gallery cache.
+
+Needs S3 or a local stand-in (e.g. S3_ENDPOINT_URL=http://localhost:9000 for
+MinIO or a moto server). Synthetic galleries are uploaded to a scratch bucket
+that is deleted afterwards. Run from the repository root:
+    python -m benchmarks.benchmark_gallery_startup
+"""
+import os
+import pickle
+import tempfile
+import time
+
+from benchmarks.synthetic import make_gallery
+from face_encodings import data_preparation
+from face_encodings.gallery_format import Gallery
+from face_encodings.s3_utils import S3_ENDPOINT_ENV, get_s3_client, reset_s3_client
+from face_encodings.sharded_gallery import publish_sharded_gallery
+
+GALLERY_SIZES = [1000, 10000, 50000]
+ENCODINGS_PER_STUDENT = 5
+SCRATCH_BUCKET = f"{data_preparation.BUCKET_NAME}-startup-bench"
+# Nothing listens here, so every S3 call fails as it would offline.
+UNREACHABLE_ENDPOINT = "http://127.0.0.1:9"
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def load_pickle_uncached():
+    """The previous startup path: download and unpickle the whole gallery."""
+    response = get_s3_client().get_object(Bucket=SCRATCH_BUCKET, Key=data_preparation.PICKLE_S3_KEY)
+    return Gallery.from_encodings_dict(pickle.loads(response["Body"].read()))
+
+
+def load_offline(shard_cache_dir, cache_dir):
+    previous = os.environ.get(S3_ENDPOINT_ENV)
+    os.environ[S3_ENDPOINT_ENV] = UNREACHABLE_ENDPOINT
+    reset_s3_client()
+    try:
+        return data_preparation.load_known_gallery(shard_cache_dir, cache_dir)
+    finally:
+        if previous is None:
+            os.environ.pop(S3_ENDPOINT_ENV, None)
+        else:
+            os.environ[S3_ENDPOINT_ENV] = previous
+        reset_s3_client()
+
+
+def empty_bucket(s3_client):
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=SCRATCH_BUCKET):
+        for obj in page.get("Contents", []):
+            s3_client.delete_object(Bucket=SCRATCH_BUCKET, Key=obj["Key"])
+
+
+def run_cases(layout, tmp):
+    shard_cache_dir = os.path.join(tmp, layout, "shards")
+    cache_dir = os.path.join(tmp, layout, "cache")
+    cases = []
+    if layout == "pickle":
+        cases.append(("no cache (before)", load_pickle_uncached))
+    cases += [
+        ("cold cache", lambda: data_preparation.load_known_gallery(shard_cache_dir, cache_dir)),
+        ("warm cache (304)", lambda: data_preparation.load_known_gallery(shard_cache_dir, cache_dir)),
+        ("cached start", lambda: data_preparation.load_cached_gallery(shard_cache_dir, cache_dir)[0]),
+        ("offline", lambda: load_offline(shard_cache_dir, cache_dir)),
+    ]
+    results = []
+    for label, load in cases:
+        seconds, gallery = timed(load)
+        results.append((label, seconds, len(gallery) if gallery is not None else 0))
+    return results
+
+
+def main():
+    data_preparation.BUCKET_NAME = SCRATCH_BUCKET
+    s3_client = get_s3_client()
+    s3_client.create_bucket(Bucket=SCRATCH_BUCKET)
+    rows = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for num_students in GALLERY_SIZES:
+                encodings_dict, _ = make_gallery(num_students, ENCODINGS_PER_STUDENT, seed=num_students)
+                empty_bucket(s3_client)
+                s3_client.put_object(Bucket=SCRATCH_BUCKET, Key=data_preparation.PICKLE_S3_KEY,
+                                     Body=pickle.dumps(encodings_dict))
+                for label, seconds, size in run_cases("pickle", os.path.join(tmp, str(num_students))):
+                    rows.append((num_students, "pickle", label, seconds, size))
+                publish_sharded_gallery(encodings_dict, bucket=SCRATCH_BUCKET)
+                for label, seconds, size in run_cases("sharded", os.path.join(tmp, str(num_students))):
+                    rows.append((num_students, "sharded", label, seconds, size))
+    finally:
+        empty_bucket(s3_client)
+        s3_client.delete_bucket(Bucket=SCRATCH_BUCKET)
+
+    print(f"\n{'students':>8} {'S3 layout':>9} {'startup':>18} {'seconds':>8} {'encodings':>10}")
+    for num_students, layout, label, seconds, size in rows:
+        print(f"{num_students:>8} {layout:>9} {label:>18} {seconds:>8.3f} {size:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Incremental image upload (face_encodings/upload_images_to_s3.py) on a local S3.
+
+Runs fully offline against a moto server or S3_ENDPOINT_URL (see
+benchmarks/offline.py). A known_faces tree of synthetic images is uploaded to
+a scratch bucket that is deleted afterwards, then changed in the ways the
+listing diff (needs_upload) tells apart:
+    first upload   every image is new
+    unchanged      nothing to do and nothing hashed
+    touched        newer mtime, same size and content: hashed, not uploaded
+    touched again  the same files are hashed on every run, as their mtime
+                   stays newer than the object
+    rewritten      newer mtime, same size, new content: hashed and uploaded
+    resized        a different size: uploaded without hashing
+Each step prints its time and how many files were uploaded, skipped and
+MD5-hashed, and warns if those differ from what the step should cause. S3
+keeps object times to the second, so a file written within the second of its
+upload looks newer than the object too; between steps every mtime is set back
+an hour so each step counts only its own change.
+Run from the repository root:
+    python -m benchmarks.benchmark_image_upload --images 500
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.offline import local_s3
+from face_encodings import upload_images_to_s3 as uploader
+from face_encodings.s3_utils import get_s3_client
+
+SCRATCH_BUCKET = "attendance-images-upload-upload-bench"
+
+
+def write_images(known_faces_dir, num_images, images_per_student, size, rng):
+    paths = []
+    for i in range(num_images):
+        folder = os.path.join(known_faces_dir, f"student_{i // images_per_student:04d}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{i:05d}.jpg")
+        with open(path, "wb") as f:
+            f.write(rng.bytes(size))
+        paths.append(path)
+    settle(paths)
+    return paths
+
+
+def settle(paths):
+    """Date every file an hour back, before any upload, as photos taken before a sync would be."""
+    past = time.time() - 3600
+    for path in paths:
+        os.utime(path, (past, past))
+
+
+def counting_md5():
+    """Count the MD5 hashes needs_upload computes; returns (counter, restore)."""
+    file_md5 = uploader._file_md5
+    counter = {"hashed": 0}
+
+    def counted(path):
+        counter["hashed"] += 1
+        return file_md5(path)
+
+    uploader._file_md5 = counted
+    return counter, lambda: setattr(uploader, "_file_md5", file_md5)
+
+
+def delete_bucket(s3_client):
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=SCRATCH_BUCKET):
+        for obj in page.get("Contents", []):
+            s3_client.delete_object(Bucket=SCRATCH_BUCKET, Key=obj["Key"])
+    s3_client.delete_bucket(Bucket=SCRATCH_BUCKET)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=500)
+    parser.add_argument("--images-per-student", type=int, default=5)
+    parser.add_argument("--size", type=int, default=64 * 1024, help="Image file size in bytes.")
+    parser.add_argument("--changed", type=int, default=20, help="Images touched, rewritten and resized per step.")
+    parser.add_argument("--workers", type=int, default=uploader.UPLOAD_WORKERS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    n = args.changed
+
+    def touch(paths):
+        for path in paths:
+            os.utime(path)
+
+    def rewrite(paths):
+        for path in paths:
+            with open(path, "wb") as f:
+                f.write(rng.bytes(args.size))
+
+    def resize(paths):
+        for path in paths:
+            with open(path, "ab") as f:
+                f.write(b"\0")
+
+    with tempfile.TemporaryDirectory() as tmp, local_s3() as endpoint:
+        known_faces_dir = os.path.join(tmp, "known_faces")
+        paths = write_images(known_faces_dir, args.images, args.images_per_student, args.size, rng)
+        s3_client = get_s3_client()
+        s3_client.create_bucket(Bucket=SCRATCH_BUCKET)
+        counter, restore = counting_md5()
+        print(f"{len(paths)} images of {args.size / 1024:.0f} KB, S3 at {endpoint}")
+        # (label, change to make first, settle afterwards, expected uploaded, skipped, hashed)
+        steps = [
+            ("first upload", None, True, len(paths), 0, 0),
+            ("unchanged", None, True, 0, len(paths), 0),
+            ("touched", lambda: touch(paths[:n]), False, 0, len(paths), n),
+            ("touched again", None, True, 0, len(paths), n),
+            ("rewritten", lambda: rewrite(paths[n:2 * n]), True, n, len(paths) - n, n),
+            ("resized", lambda: resize(paths[2 * n:3 * n]), True, n, len(paths) - n, 0),
+        ]
+        try:
+            print(f"{'step':>13} {'seconds':>8} {'uploaded':>9} {'skipped':>8} {'hashed':>7} {'MB/s':>6}")
+            for label, change, settle_after, *expected in steps:
+                if change is not None:
+                    change()
+                counter["hashed"] = 0
+                stats = uploader.upload_images_to_s3(SCRATCH_BUCKET, known_faces_dir, max_workers=args.workers)
+                actual = [stats["uploaded"], stats["skipped"], counter["hashed"]]
+                print(f"{label:>13} {stats['seconds']:>8.2f} {actual[0]:>9} {actual[1]:>8} {actual[2]:>7} "
+                      f"{stats['mb_per_second']:>6.1f}")
+                if actual != expected or stats["failed"]:
+                    print(f"WARNING: expected {expected[0]} uploaded, {expected[1]} skipped and "
+                          f"{expected[2]} hashed; {stats['failed']} failed.")
+                if settle_after:
+                    settle(paths)
+        finally:
+            restore()
+            delete_bucket(s3_client)
+
+
+if __name__ == "__main__":
+    main()
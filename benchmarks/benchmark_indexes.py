@@ -0,0 +1,134 @@
+"""
+Query plans and latency of the attendance hot queries before and after the
+index migrations, on a seeded table of millions of attendance rows.
+
+Needs the MySQL server configured in database/database_module.py and a user
+allowed to create databases. The benchmark works in a scratch database named
+<database>_index_bench, which it drops afterwards. Run from the repository root:
+    python -m benchmarks.benchmark_indexes [--rows 2000000] [--students 5000]
+"""
+import argparse
+import datetime
+import time
+
+import mysql.connector  # type: ignore
+import numpy as np
+
+from database import database_module
+from database.migrations import migrate
+
+QUERIES_PER_CASE = 200
+SEED_CHUNK = 20000
+
+
+def server_connection():
+    return mysql.connector.connect(
+        host=database_module.DB_CONFIG["host"],
+        user=database_module.DB_CONFIG["user"],
+        password=database_module.DB_CONFIG["password"],
+    )
+
+
+def seed(num_students, num_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    start = datetime.datetime(2024, 1, 1)
+    span_seconds = 365 * 24 * 3600
+    with database_module.transaction() as cursor:
+        cursor.executemany("INSERT INTO Students (name) VALUES (%s)",
+                           [(f"student_{i:06d}",) for i in range(num_students)])
+    with database_module.transaction() as cursor:
+        cursor.execute("SELECT MIN(student_id) FROM Students")
+        first_id = cursor.fetchone()[0]
+    for offset in range(0, num_rows, SEED_CHUNK):
+        n = min(SEED_CHUNK, num_rows - offset)
+        ids = rng.integers(first_id, first_id + num_students, n)
+        seconds = rng.integers(0, span_seconds, n)
+        rows = [(int(i), start + datetime.timedelta(seconds=int(s))) for i, s in zip(ids, seconds)]
+        with database_module.transaction() as cursor:
+            cursor.executemany("INSERT INTO Attendance (student_id, timestamp) VALUES (%s, %s)", rows)
+        print(f"  seeded {offset + n}/{num_rows} attendance rows", end="\r")
+    print()
+    with database_module.transaction() as cursor:
+        cursor.execute("ANALYZE TABLE Students, Attendance")
+        cursor.fetchall()
+    return first_id
+
+
+def query_cases(first_id, num_students, rng):
+    """(label, sql, params generator) for the queries the attendance path and reports run."""
+    start = datetime.datetime(2024, 1, 1)
+
+    def duplicate_check():
+        end = start + datetime.timedelta(seconds=int(rng.integers(3600, 365 * 24 * 3600)))
+        return (int(rng.integers(first_id, first_id + num_students)), end - datetime.timedelta(hours=1), end)
+
+    def name_lookup():
+        return (f"student_{int(rng.integers(0, num_students)):06d}",)
+
+    def daily_report():
+        day = start + datetime.timedelta(days=int(rng.integers(0, 365)))
+        return (day, day + datetime.timedelta(days=1))
+
+    return [
+        ("duplicate check", "SELECT * FROM Attendance WHERE student_id = %s AND timestamp >= %s AND timestamp <= %s",
+         duplicate_check),
+        ("name lookup", "SELECT * FROM Students WHERE name = %s", name_lookup),
+        ("daily count", "SELECT COUNT(*) FROM Attendance WHERE timestamp >= %s AND timestamp < %s", daily_report),
+    ]
+
+
+def measure(cases, label):
+    print(f"\n== {label} ==")
+    results = {}
+    with database_module.transaction(dictionary=True) as cursor:
+        for name, sql, params in cases:
+            cursor.execute("EXPLAIN " + sql, params())
+            for row in cursor.fetchall():
+                print(f"{name:>16}: type={row['type']} key={row['key']} rows={row['rows']} extra={row['Extra']}")
+            latencies = []
+            for _ in range(QUERIES_PER_CASE):
+                p = params()
+                t0 = time.perf_counter()
+                cursor.execute(sql, p)
+                cursor.fetchall()
+                latencies.append(time.perf_counter() - t0)
+            ms = np.array(latencies) * 1000.0
+            results[name] = (np.percentile(ms, 50), np.percentile(ms, 95))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--students", type=int, default=5000)
+    args = parser.parse_args()
+
+    bench_db = database_module.DB_CONFIG["database"] + "_index_bench"
+    conn = server_connection()
+    conn.cursor().execute(f"CREATE DATABASE IF NOT EXISTS {bench_db}")
+    conn.close()
+    # Point the shared pool at the scratch database before its first use.
+    database_module.DB_CONFIG["database"] = bench_db
+    try:
+        migrate(target=1)
+        print(f"Seeding {args.students} students and {args.rows} attendance rows...")
+        first_id = seed(args.students, args.rows)
+        rng = np.random.default_rng(1)
+        cases = query_cases(first_id, args.students, rng)
+        before = measure(cases, "schema version 1 (foreign-key indexes only)")
+        t0 = time.perf_counter()
+        migrate()
+        print(f"Index migrations took {time.perf_counter() - t0:.1f}s")
+        after = measure(cases, "latest schema")
+        print(f"\n{'query':>16} {'p50 before':>11} {'p50 after':>10} {'p95 before':>11} {'p95 after':>10} (ms)")
+        for name in before:
+            print(f"{name:>16} {before[name][0]:>11.2f} {after[name][0]:>10.2f} "
+                  f"{before[name][1]:>11.2f} {after[name][1]:>10.2f}")
+    finally:
+        conn = server_connection()
+        conn.cursor().execute(f"DROP DATABASE IF EXISTS {bench_db}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Scaling of the local gallery build (data_preparation.compute_face_encodings)
+across 1, 2, 4 and 8 encoder processes.
+
+By default a synthetic known_faces tree of 640x480 JPEGs is generated; these
+have no real faces, so the time is dominated by the face detector, which is
+also the bulk of the cost on real photos. Pass --faces-dir to time a real tree.
+Run from the repository root:
+    python -m benchmarks.benchmark_local_build [--images 400] [--faces-dir known_faces]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from face_encodings.data_preparation import compute_face_encodings
+
+WORKER_COUNTS = [1, 2, 4, 8]
+IMAGES_PER_STUDENT = 5
+
+
+def make_faces_dir(root, num_images, seed=0):
+    """Write num_images random 640x480 JPEGs as root/<student>/<n>.jpg."""
+    rng = np.random.default_rng(seed)
+    for n in range(num_images):
+        student_folder = os.path.join(root, f"student_{n // IMAGES_PER_STUDENT:04d}")
+        os.makedirs(student_folder, exist_ok=True)
+        image = rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+        cv2.imwrite(os.path.join(student_folder, f"{n % IMAGES_PER_STUDENT}.jpg"), cv2.GaussianBlur(image, (9, 9), 0))
+
+
+def count_images(root):
+    return sum(len(files) for _, _, files in os.walk(root))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=400, help="Synthetic images to generate.")
+    parser.add_argument("--faces-dir", help="Time this known_faces tree instead of synthetic images.")
+    parser.add_argument("--workers", type=int, nargs="+", default=WORKER_COUNTS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        faces_dir = args.faces_dir
+        if faces_dir is None:
+            faces_dir = os.path.join(tmp, "known_faces")
+            make_faces_dir(faces_dir, args.images)
+        num_images = count_images(faces_dir)
+        print(f"{num_images} images, {os.cpu_count()} CPUs")
+        print(f"{'workers':>7} {'seconds':>8} {'images/s':>9} {'speedup':>8}")
+        baseline = None
+        for workers in args.workers:
+            start = time.perf_counter()
+            compute_face_encodings(faces_dir, workers=workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            print(f"{workers:>7} {elapsed:>8.2f} {num_images / elapsed:>9.1f} {baseline / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compare the batched GalleryMatcher with the original per-student compare_faces loop.
+
+Run from the repository root:
+    python -m benchmarks.benchmark_matcher
+"""
+import time
+
+import face_recognition
+
+from benchmarks.synthetic import make_gallery, make_queries
+from face_encodings.matcher import GalleryMatcher, UNKNOWN_NAME
+
+GALLERY_SIZES = [100, 1000, 10000, 50000]
+FACES_PER_FRAME = 3
+TOLERANCE = 0.4
+
+
+def legacy_match(known_encodings_dict, face_encodings, tolerance):
+    """The matching loop previously inlined in start_face_recognition."""
+    names = []
+    for face_encoding in face_encodings:
+        name = UNKNOWN_NAME
+        for student_name, student_encodings in known_encodings_dict.items():
+            matches = face_recognition.compare_faces(student_encodings, face_encoding, tolerance)
+            if True in matches:
+                name = student_name
+                break
+        names.append(name)
+    return names
+
+
+def time_call(func, repeats):
+    """Return the best wall-clock time of `repeats` calls, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000.0
+
+
+def main():
+    print(f"{'students':>9} {'legacy ms':>10} {'matcher ms':>11} {'speedup':>8} {'build ms':>9}")
+    for num_students in GALLERY_SIZES:
+        encodings_dict, centers = make_gallery(num_students)
+        queries, _ = make_queries(centers, FACES_PER_FRAME)
+
+        start = time.perf_counter()
+        matcher = GalleryMatcher.from_encodings_dict(encodings_dict)
+        build_ms = (time.perf_counter() - start) * 1000.0
+
+        repeats = 3 if num_students >= 10000 else 10
+        legacy_ms = time_call(lambda: legacy_match(encodings_dict, queries, TOLERANCE), repeats)
+        matcher_ms = time_call(lambda: matcher.match(queries, TOLERANCE), repeats)
+        print(f"{num_students:>9} {legacy_ms:>10.2f} {matcher_ms:>11.3f} "
+              f"{legacy_ms / matcher_ms:>7.1f}x {build_ms:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""
+End-to-end recognition benchmark that runs fully offline.
+
+Times every stage of the start_face_recognition path separately, frame by frame:
+    preprocess   downscale + BGR->RGB (FramePreprocessor.process)
+    detect       face_recognition.face_locations
+    encode       face_recognition.face_encodings
+    match        matcher.match against the gallery
+    attendance   AttendanceWriter.submit on the frame loop, plus every batch
+                 the writer flushes to the database (attendance_flush)
+and the gallery startup (publish to S3, load and index).
+
+Frames come from a recorded video (--video) or are synthesised: faces (photos
+from --faces-dir, or drawn ones) moving over a noisy background. In synthetic
+frames faces are encoded at the boxes where they were placed, so encoding and
+matching are measured even where the detector misses a drawn face. Faces seen
+in the frames are enrolled as visitor_* students next to a synthetic gallery
+of --gallery-size students, so matches and attendance events happen.
+
+S3 is a local moto server (or S3_ENDPOINT_URL), MySQL a SQLite file; see
+benchmarks/offline.py. Results are written as JSON; pass an earlier result
+to --compare to see per-stage changes. Run from the repository root:
+    python -m benchmarks.benchmark_recognition --gallery-size 10000 -o results.json
+    python -m benchmarks.benchmark_recognition --video hallway.mp4 --compare results.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+import cv2
+import face_recognition
+import numpy as np
+
+from benchmarks.offline import local_s3, sqlite_database
+from benchmarks.synthetic import make_gallery
+from database import attendance_writer as attendance_writer_module
+from database.attendance_writer import AttendanceWriter
+from database.student_cache import student_cache
+from face_encodings import data_preparation
+from face_encodings.gallery_refresher import GalleryRefresher
+from face_encodings.matcher import UNKNOWN_NAME
+from face_encodings.s3_utils import get_s3_client
+from face_encodings.sharded_gallery import publish_sharded_gallery
+from src.preprocessing import FramePreprocessor
+
+SCRATCH_BUCKET = f"{data_preparation.BUCKET_NAME}-recognition-bench"
+STAGES = ("preprocess", "detect", "encode", "match", "attendance_submit", "attendance_flush", "frame")
+# Faces closer than this are taken to be the same visitor when enrolling.
+VISITOR_DISTANCE = 0.4
+
+
+def load_video_frames(path, max_frames):
+    video_capture = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < max_frames:
+        ret, frame = video_capture.read()
+        if not ret:
+            break
+        frames.append((frame, None))
+    video_capture.release()
+    if not frames:
+        raise ValueError(f"No frames could be read from {path}.")
+    return frames
+
+
+def load_face_images(faces_dir, limit):
+    images = []
+    for folder, _, files in sorted(os.walk(faces_dir)):
+        for filename in sorted(files):
+            image = cv2.imread(os.path.join(folder, filename))
+            if image is not None:
+                images.append(image)
+            if len(images) >= limit:
+                return images
+    return images
+
+
+def draw_face(size, rng):
+    """A plain drawn face for when no photos are given."""
+    face = np.full((size, size, 3), rng.integers(60, 120, size=3), dtype=np.uint8)
+    skin = tuple(int(c) for c in rng.integers(110, 230, size=3))
+    center = (size // 2, size // 2)
+    cv2.ellipse(face, center, (size * 3 // 8, size // 2 - 2), 0, 0, 360, skin, -1)
+    for dx in (-size // 6, size // 6):
+        cv2.circle(face, (center[0] + dx, size * 2 // 5), max(2, size // 20), (40, 40, 40), -1)
+    cv2.ellipse(face, (center[0], size * 2 // 3), (size // 8, size // 20), 0, 0, 180, (60, 40, 120), 2)
+    return face
+
+
+def synthetic_frames(num_frames, width, height, faces_per_frame, face_size, face_images=None, seed=0):
+    """
+    Frames with faces_per_frame faces drifting across a noisy background.
+    Returns [(frame, boxes)] with (top, right, bottom, left) boxes in frame coordinates.
+    """
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    background = cv2.GaussianBlur(background, (0, 0), 5)
+    faces = []
+    for i in range(faces_per_frame):
+        image = face_images[i % len(face_images)] if face_images else draw_face(face_size, rng)
+        position = rng.uniform([0, 0], [width - face_size, height - face_size])
+        velocity = rng.uniform(-3.0, 3.0, size=2)
+        faces.append((cv2.resize(image, (face_size, face_size)), position, velocity))
+
+    frames = []
+    for _ in range(num_frames):
+        frame = background.copy()
+        boxes = []
+        for face, position, velocity in faces:
+            position += velocity
+            for axis, limit in ((0, width - face_size), (1, height - face_size)):
+                if not 0 <= position[axis] <= limit:
+                    velocity[axis] = -velocity[axis]
+                    position[axis] = min(max(position[axis], 0), limit)
+            left, top = int(position[0]), int(position[1])
+            frame[top:top + face_size, left:left + face_size] = face
+            boxes.append((top, left + face_size, top + face_size, left))
+        frames.append((frame, boxes))
+    return frames
+
+
+def encode_locations(small_locations, boxes, scale):
+    """Boxes to encode: placed faces for synthetic frames, detected ones for recorded video."""
+    if boxes is None:
+        return small_locations
+    return [tuple(int(round(v * scale)) for v in box) for box in boxes]
+
+
+def enroll_visitors(frames, preprocessor, upsample):
+    """Encode the faces in the frames once (this also warms up dlib) and give each distinct face a name."""
+    visitors = []
+    for frame, boxes in frames:
+        rgb_small_frame, scale, _ = preprocessor.process(frame)
+        small_locations = face_recognition.face_locations(rgb_small_frame, number_of_times_to_upsample=upsample)
+        locations = encode_locations(small_locations, boxes, scale)
+        for encoding in face_recognition.face_encodings(rgb_small_frame, locations):
+            if not visitors or min(np.linalg.norm(v - encoding) for v in visitors) > VISITOR_DISTANCE:
+                visitors.append(encoding)
+    return {f"visitor_{i:03d}": [encoding] for i, encoding in enumerate(visitors)}
+
+
+def summarize(seconds):
+    if not seconds:
+        return {"count": 0}
+    ms = np.array(seconds) * 1000.0
+    return {
+        "count": len(ms),
+        "total_s": float(ms.sum() / 1000.0),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "max_ms": float(ms.max()),
+    }
+
+
+def delete_bucket(s3_client):
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=SCRATCH_BUCKET):
+        for obj in page.get("Contents", []):
+            s3_client.delete_object(Bucket=SCRATCH_BUCKET, Key=obj["Key"])
+    s3_client.delete_bucket(Bucket=SCRATCH_BUCKET)
+
+
+def load_gallery(encodings_dict, tmp, index):
+    """Publish the gallery to the local S3 and load it the way start_face_recognition does."""
+    data_preparation.BUCKET_NAME = SCRATCH_BUCKET
+    start = time.perf_counter()
+    publish_sharded_gallery(encodings_dict, bucket=SCRATCH_BUCKET)
+    publish_seconds = time.perf_counter() - start
+
+    shard_cache_dir = os.path.join(tmp, "shards")
+    cache_dir = os.path.join(tmp, "cache")
+    refresher = GalleryRefresher(lambda: data_preparation.load_known_gallery_with_version(shard_cache_dir, cache_dir),
+                                 data_preparation.get_s3_gallery_version, source_name="S3", versioned=True,
+                                 index=index)
+    if not refresher.reload():
+        raise RuntimeError("The published gallery could not be loaded.")
+    return refresher.matcher, {
+        "students": refresher.matcher.num_students,
+        "encodings": len(refresher.matcher),
+        "matcher": type(refresher.matcher).__name__,
+        "publish_seconds": publish_seconds,
+        "load_seconds": refresher.last_reload_seconds,
+    }
+
+
+def setup_students(connect, names):
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO Students (name, metadata) VALUES (%s, %s)", [(name, None) for name in names])
+    conn.commit()
+    conn.close()
+    student_cache.warm()
+
+
+def run_frames(frames, preprocessor, matcher, writer, upsample, tolerance, repeat):
+    timings = {stage: [] for stage in STAGES}
+    faces_detected = faces_encoded = recognized = 0
+    for _ in range(repeat):
+        for frame, boxes in frames:
+            frame_start = start = time.perf_counter()
+            rgb_small_frame, scale, _ = preprocessor.process(frame)
+            timings["preprocess"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            small_locations = face_recognition.face_locations(rgb_small_frame, number_of_times_to_upsample=upsample)
+            timings["detect"].append(time.perf_counter() - start)
+            faces_detected += len(small_locations)
+
+            locations = encode_locations(small_locations, boxes, scale)
+            names = []
+            if locations:
+                start = time.perf_counter()
+                encodings = face_recognition.face_encodings(rgb_small_frame, locations)
+                timings["encode"].append(time.perf_counter() - start)
+                faces_encoded += len(encodings)
+
+                start = time.perf_counter()
+                names = [name for name, _ in matcher.match(encodings, tolerance)]
+                timings["match"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            for name in names:
+                if name != UNKNOWN_NAME:
+                    writer.submit(name)
+                    recognized += 1
+            timings["attendance_submit"].append(time.perf_counter() - start)
+            timings["frame"].append(time.perf_counter() - frame_start)
+    return timings, {"faces_detected": faces_detected, "faces_encoded": faces_encoded, "recognized": recognized}
+
+
+def timed_flushes(timings):
+    """Wrap the writer's database call so every batch it flushes is timed."""
+    log_attendance_batch = attendance_writer_module.log_attendance_batch
+
+    def timed(records, duplicate_threshold=3600, status="present"):
+        start = time.perf_counter()
+        try:
+            return log_attendance_batch(records, duplicate_threshold, status)
+        finally:
+            timings.append(time.perf_counter() - start)
+
+    attendance_writer_module.log_attendance_batch = timed
+    return lambda: setattr(attendance_writer_module, "log_attendance_batch", log_attendance_batch)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(args):
+    if args.video:
+        frames = load_video_frames(args.video, args.frames)
+    else:
+        face_images = load_face_images(args.faces_dir, args.faces_per_frame) if args.faces_dir else None
+        frames = synthetic_frames(args.frames, args.width, args.height, args.faces_per_frame, args.face_size,
+                                  face_images, seed=args.seed)
+    preprocessor = FramePreprocessor(scale=args.scale, upsample=args.upsample)
+
+    visitors = enroll_visitors(frames, preprocessor, args.upsample)
+    encodings_dict, _ = make_gallery(args.gallery_size, args.encodings_per_student, seed=args.seed)
+    encodings_dict.update(visitors)
+
+    flush_timings = []
+    with tempfile.TemporaryDirectory() as tmp, local_s3(), sqlite_database(os.path.join(tmp, "attendance.db")) as connect:
+        s3_client = get_s3_client()
+        s3_client.create_bucket(Bucket=SCRATCH_BUCKET)
+        try:
+            matcher, gallery = load_gallery(encodings_dict, tmp, args.index)
+        finally:
+            delete_bucket(s3_client)
+        setup_students(connect, encodings_dict)
+
+        restore = timed_flushes(flush_timings)
+        writer = AttendanceWriter(duplicate_threshold=args.duplicate_threshold)
+        writer.start()
+        try:
+            start = time.perf_counter()
+            timings, counts = run_frames(frames, preprocessor, matcher, writer, args.upsample, args.tolerance,
+                                         args.repeat)
+            elapsed = time.perf_counter() - start
+        finally:
+            writer.close()
+            restore()
+        timings["attendance_flush"] = flush_timings
+        attendance = writer.stats()
+
+    height, width = frames[0][0].shape[:2]
+    return {
+        "benchmark": "recognition",
+        "created_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+        },
+        "config": vars(args),
+        "frames": {
+            "source": args.video or ("photos" if args.faces_dir else "synthetic"),
+            "count": len(frames) * args.repeat,
+            "width": width,
+            "height": height,
+            "visitors_enrolled": len(visitors),
+            **counts,
+        },
+        "gallery": gallery,
+        "stages": {stage: summarize(seconds) for stage, seconds in timings.items()},
+        "frames_per_second": len(frames) * args.repeat / elapsed,
+        "attendance": attendance,
+    }
+
+
+def print_results(results, baseline=None):
+    gallery = results["gallery"]
+    print(f"{results['frames']['count']} frames ({results['frames']['source']}, "
+          f"{results['frames']['width']}x{results['frames']['height']}), gallery of {gallery['encodings']} encodings "
+          f"for {gallery['students']} students ({gallery['matcher']}) loaded in {gallery['load_seconds']:.2f}s")
+    header = f"{'stage':>17} {'count':>6} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"
+    print(header + (f" {'baseline':>9} {'change':>7}" if baseline else ""))
+    for stage, stats in results["stages"].items():
+        if not stats["count"]:
+            print(f"{stage:>17} {0:>6}")
+            continue
+        line = (f"{stage:>17} {stats['count']:>6} {stats['mean_ms']:>8.2f} {stats['p50_ms']:>8.2f} "
+                f"{stats['p95_ms']:>8.2f} {stats['max_ms']:>8.2f}")
+        before = baseline["stages"].get(stage, {}) if baseline else {}
+        if before.get("count"):
+            line += f" {before['mean_ms']:>9.2f} {stats['mean_ms'] / before['mean_ms'] - 1:>+7.1%}"
+        print(line)
+    line = f"{results['frames_per_second']:.1f} frames/s end to end"
+    if baseline:
+        line += f" (baseline {baseline['frames_per_second']:.1f})"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--video", help="Recorded video to use instead of synthetic frames.")
+    parser.add_argument("--frames", type=int, default=100, help="Frames to use (default: 100).")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the frames.")
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--faces-per-frame", type=int, default=2)
+    parser.add_argument("--face-size", type=int, default=200, help="Synthetic face size in pixels.")
+    parser.add_argument("--faces-dir", help="Photos to paste into synthetic frames (e.g. known_faces).")
+    parser.add_argument("--gallery-size", type=int, default=1000, help="Synthetic students in the gallery.")
+    parser.add_argument("--encodings-per-student", type=int, default=5)
+    parser.add_argument("--index", default="auto", help="Matcher index (see face_encodings.matcher.build_matcher).")
+    parser.add_argument("--scale", type=float, default=0.25)
+    parser.add_argument("--upsample", type=int, default=1)
+    parser.add_argument("--tolerance", type=float, default=0.4)
+    parser.add_argument("--duplicate-threshold", type=int, default=3600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--compare", help="Earlier JSON result to compare against.")
+    args = parser.parse_args()
+
+    results = run_benchmark(args)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
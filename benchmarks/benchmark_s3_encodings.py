@@ -0,0 +1,124 @@
+"""
+S3 encoding build on a local S3, against S3_ENDPOINT_URL.
+
+Runs fully offline: S3 is a moto server, or whatever S3_ENDPOINT_URL points at
+(see benchmarks/offline.py), and every client comes from
+s3_utils.get_s3_client, so the run also checks that the shared client really
+talks to that endpoint. Synthetic face images are uploaded under images/ in a
+scratch bucket that is deleted afterwards, then:
+    downloads     every image fetched on --threads threads through the shared
+                  client, and through a new client per download (the old way)
+    cold build    compute_encodings_from_s3.update_manifest on an empty manifest
+    no changes    the same again: one listing, nothing downloaded
+    changed       after --changed images were re-uploaded and one deleted
+Run from the repository root:
+    python -m benchmarks.benchmark_s3_encodings --images 200
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from benchmarks.benchmark_recognition import draw_face
+from benchmarks.offline import local_s3
+from face_encodings import compute_encodings_from_s3
+from face_encodings.manifest import EncodingManifest
+from face_encodings.s3_utils import create_s3_client, get_s3_client
+
+SCRATCH_BUCKET = f"{compute_encodings_from_s3.BUCKET_NAME}-s3-encodings-bench"
+
+
+def face_jpeg(rng, size):
+    ok, data = cv2.imencode(".jpg", draw_face(size, rng))
+    if not ok:
+        raise RuntimeError("OpenCV cannot encode JPEG images.")
+    return data.tobytes()
+
+
+def upload_images(s3_client, num_images, images_per_student, size, rng):
+    keys = []
+    for i in range(num_images):
+        key = f"{compute_encodings_from_s3.IMAGE_PREFIX}student_{i // images_per_student:04d}/{i:05d}.jpg"
+        s3_client.put_object(Bucket=SCRATCH_BUCKET, Key=key, Body=face_jpeg(rng, size))
+        keys.append(key)
+    return keys
+
+
+def time_downloads(keys, threads, new_client_per_call):
+    def download(key):
+        s3_client = create_s3_client() if new_client_per_call else get_s3_client()
+        return len(s3_client.get_object(Bucket=SCRATCH_BUCKET, Key=key)["Body"].read())
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        total = sum(pool.map(download, keys))
+    return time.perf_counter() - start, total
+
+
+def timed_update(manifest, args):
+    start = time.perf_counter()
+    changed, removed, errors = compute_encodings_from_s3.update_manifest(
+        manifest, SCRATCH_BUCKET, download_workers=args.threads, encode_workers=args.workers)
+    return time.perf_counter() - start, changed, removed, errors
+
+
+def delete_bucket(s3_client):
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=SCRATCH_BUCKET):
+        for obj in page.get("Contents", []):
+            s3_client.delete_object(Bucket=SCRATCH_BUCKET, Key=obj["Key"])
+    s3_client.delete_bucket(Bucket=SCRATCH_BUCKET)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--images-per-student", type=int, default=5)
+    parser.add_argument("--size", type=int, default=160, help="Synthetic face image size in pixels.")
+    parser.add_argument("--threads", type=int, default=compute_encodings_from_s3.DOWNLOAD_WORKERS)
+    parser.add_argument("--workers", type=int, default=None, help="Encoder processes (default: one per CPU).")
+    parser.add_argument("--changed", type=int, default=10, help="Images re-uploaded before the last build.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp, local_s3() as endpoint:
+        # Keep the face store of this run out of the repository's encodings/.
+        compute_encodings_from_s3.FACE_STORE_DIR = os.path.join(tmp, "face_chips")
+        s3_client = get_s3_client()
+        if s3_client.meta.endpoint_url.rstrip("/") != endpoint.rstrip("/"):
+            raise RuntimeError(f"The shared S3 client uses {s3_client.meta.endpoint_url}, not {endpoint}.")
+        if get_s3_client() is not s3_client:
+            raise RuntimeError("get_s3_client returned a new client instead of the shared one.")
+        print(f"S3 at {endpoint}")
+        s3_client.create_bucket(Bucket=SCRATCH_BUCKET)
+        try:
+            keys = upload_images(s3_client, args.images, args.images_per_student, args.size, rng)
+
+            print(f"{'downloads':>24} {'seconds':>8} {'images/s':>9}")
+            for label, new_client in (("shared client", False), ("new client per download", True)):
+                seconds, _ = time_downloads(keys, args.threads, new_client)
+                print(f"{label:>24} {seconds:>8.2f} {len(keys) / seconds:>9.1f}")
+
+            manifest = EncodingManifest()
+            print(f"{'build':>24} {'seconds':>8} {'changed':>8} {'removed':>8} {'errors':>7}")
+            for label in ("cold build", "no changes", "changed"):
+                if label == "changed":
+                    for key in keys[:args.changed]:
+                        s3_client.put_object(Bucket=SCRATCH_BUCKET, Key=key, Body=face_jpeg(rng, args.size))
+                    s3_client.delete_object(Bucket=SCRATCH_BUCKET, Key=keys[-1])
+                seconds, changed, removed, errors = timed_update(manifest, args)
+                print(f"{label:>24} {seconds:>8.2f} {len(changed):>8} {len(removed):>8} {len(errors):>7}")
+                expected = {"cold build": (len(keys), 0), "no changes": (0, 0), "changed": (args.changed, 1)}[label]
+                if (len(changed), len(removed)) != expected:
+                    print(f"WARNING: expected {expected[0]} changed and {expected[1]} removed images.")
+        finally:
+            delete_bucket(s3_client)
+
+
+if __name__ == "__main__":
+    main()
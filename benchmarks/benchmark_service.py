@@ -0,0 +1,140 @@
+"""
+Headless multi-camera service benchmark that runs fully offline.
+
+Writes synthetic clips (faces drifting over a noisy background, see
+benchmark_recognition.synthetic_frames) to video files with cv2.VideoWriter
+and feeds them to src/service.py: once through run_stream in this process as a
+single-stream baseline, then through run_service with 1, 2, ... worker
+processes. Faces detected in the clips are enrolled as visitor_* students next
+to a synthetic gallery, so every stream produces attendance events; MySQL is a
+SQLite file (see benchmarks/offline.py) and the attendance rows written are
+counted after each run.
+
+Checks that every stream ends, every frame is read and the single attendance
+writer records each visitor once per run, and reports aggregate frames/s.
+Run from the repository root:
+    python -m benchmarks.benchmark_service --streams 4 --workers 1 2 4
+"""
+import argparse
+import os
+import queue
+import tempfile
+import time
+
+import cv2
+
+from benchmarks.benchmark_recognition import enroll_visitors, load_video_frames, setup_students, synthetic_frames
+from benchmarks.offline import sqlite_database
+from benchmarks.synthetic import make_gallery
+from database.student_cache import student_cache
+from face_encodings.matcher import build_matcher
+from src import service
+from src.preprocessing import FramePreprocessor
+
+
+def write_clip(path, frames, fps):
+    height, width = frames[0][0].shape[:2]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), fps, (width, height))
+    if not writer.isOpened():
+        raise RuntimeError(f"OpenCV cannot write {path}.")
+    for frame, _ in frames:
+        writer.write(frame)
+    writer.release()
+
+
+def attendance_rows(connect):
+    conn = connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*), COUNT(DISTINCT student_id) FROM Attendance")
+        return cursor.fetchone()
+    finally:
+        conn.close()
+
+
+def clear_attendance(connect):
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM Attendance")
+    cursor.execute("DELETE FROM AttendanceDaily")
+    conn.commit()
+    conn.close()
+
+
+def run_baseline(clip, matcher, args):
+    """One stream through run_stream in this process, with a plain queue for events."""
+    events = queue.Queue()
+    service._init_worker(events, matcher)
+    start = time.perf_counter()
+    summary = service.run_stream(clip, args.tolerance, use_tracker=not args.no_tracker)
+    elapsed = time.perf_counter() - start
+    return summary, elapsed, events.qsize()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=4, help="Synthetic clips, one per simulated camera.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--frames", type=int, default=60, help="Frames per clip.")
+    parser.add_argument("--fps", type=float, default=15.0)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--faces-per-frame", type=int, default=2)
+    parser.add_argument("--face-size", type=int, default=120, help="Synthetic face size in pixels.")
+    parser.add_argument("--gallery-size", type=int, default=1000, help="Synthetic students in the gallery.")
+    parser.add_argument("--tolerance", type=float, default=0.4)
+    parser.add_argument("--no-tracker", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, sqlite_database(os.path.join(tmp, "attendance.db")) as connect:
+        clips = []
+        visitors = {}
+        for i in range(args.streams):
+            frames = synthetic_frames(args.frames, args.width, args.height, args.faces_per_frame,
+                                      args.face_size, seed=i)
+            clip = os.path.join(tmp, f"camera_{i}.avi")
+            write_clip(clip, frames, args.fps)
+            clips.append(clip)
+            # Enrol the faces the detector finds in the written clip, as the service will see them.
+            decoded = load_video_frames(clip, args.frames)
+            for encoding in enroll_visitors(decoded, FramePreprocessor(), 1).values():
+                visitors[f"visitor_{len(visitors):03d}"] = encoding
+        encodings_dict, _ = make_gallery(args.gallery_size, seed=0)
+        encodings_dict.update(visitors)
+        matcher = build_matcher(encodings_dict)
+        setup_students(connect, encodings_dict)
+        print(f"{args.streams} clips of {args.frames} frames ({args.width}x{args.height}), "
+              f"{len(visitors)} visitors in a gallery of {matcher.num_students} students")
+
+        summary, elapsed, events = run_baseline(clips[0], matcher, args)
+        print(f"run_stream baseline: {summary['frames']} frames in {elapsed:.2f}s "
+              f"({summary['frames'] / elapsed:.1f} frames/s), {events} events")
+        if summary["frames"] != args.frames:
+            print(f"WARNING: read {summary['frames']} of {args.frames} frames from {clips[0]}.")
+
+        # run_service loads the gallery itself; hand it the one built above.
+        service.load_known_matcher = lambda: matcher
+        print(f"{'workers':>7} {'seconds':>8} {'frames':>7} {'frames/s':>9} {'events':>7} "
+              f"{'rows':>5} {'students':>8}")
+        for workers in args.workers:
+            clear_attendance(connect)
+            student_cache.warm()
+            start = time.perf_counter()
+            summaries = service.run_service(clips, workers=workers, tolerance=args.tolerance,
+                                            use_tracker=not args.no_tracker)
+            elapsed = time.perf_counter() - start
+            frames = sum(s.get("frames", 0) for s in summaries)
+            events = sum(s.get("recognitions", 0) for s in summaries)
+            rows, students = attendance_rows(connect)
+            print(f"{workers:>7} {elapsed:>8.2f} {frames:>7} {frames / elapsed:>9.1f} {events:>7} "
+                  f"{rows:>5} {students:>8}")
+            failed = [s for s in summaries if s.get("error")]
+            if len(summaries) != len(clips) or failed or frames != args.frames * len(clips):
+                print(f"WARNING: {len(summaries)} of {len(clips)} streams finished, "
+                      f"{frames} of {args.frames * len(clips)} frames read, errors: {failed}")
+            if rows != students:
+                print(f"WARNING: {rows} attendance rows for {students} students; expected one each.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Local stand-ins for the services the recognition path talks to, so benchmarks
+can run without network access:
+
+    local_s3()         S3 at S3_ENDPOINT_URL if it is set (MinIO, LocalStack),
+                       otherwise an in-process moto server (pip install "moto[server]")
+    sqlite_database()  database_module's MySQL connections replaced by a SQLite file
+
+Both are context managers and restore the real configuration on exit.
+"""
+import contextlib
+import datetime
+import logging
+import os
+import re
+import sqlite3
+
+from mysql.connector import Error, errorcode  # type: ignore
+from mysql.connector.errors import ProgrammingError  # type: ignore
+
+from database import database_module
+from face_encodings.s3_utils import S3_ENDPOINT_ENV, reset_s3_client
+
+try:
+    from moto.server import ThreadedMotoServer  # type: ignore
+except ImportError:
+    ThreadedMotoServer = None
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Students (
+    student_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name VARCHAR(255) NOT NULL,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_students_name ON Students (name);
+CREATE TABLE IF NOT EXISTS Attendance (
+    attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id INT REFERENCES Students(student_id),
+    timestamp DATETIME NOT NULL,
+    status VARCHAR(50) DEFAULT 'present'
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_student_timestamp ON Attendance (student_id, timestamp);
+CREATE TABLE IF NOT EXISTS AttendanceDaily (
+    student_id INT NOT NULL,
+    day DATE NOT NULL,
+    first_seen DATETIME NOT NULL,
+    last_seen DATETIME NOT NULL,
+    count INT NOT NULL,
+    PRIMARY KEY (student_id, day)
+);
+CREATE TABLE IF NOT EXISTS student_images (
+    image_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    student_id INT REFERENCES Students(student_id),
+    image_url VARCHAR(255) NOT NULL
+);
+"""
+
+# MySQL syntax used by database_module and its SQLite equivalent.
+_MYSQL_TO_SQLITE = [
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"ON DUPLICATE KEY UPDATE"), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"\bVALUES\((\w+)\)"), r"excluded.\1"),
+    (re.compile(r"\bLEAST\("), "MIN("),
+    (re.compile(r"\bGREATEST\("), "MAX("),
+]
+# SQLite hands timestamps back as text (always, for aggregates like MAX).
+_TIMESTAMP_TEXT = re.compile(r"^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(\.\d+)?$")
+
+
+def translate_sql(sql):
+    for pattern, replacement in _MYSQL_TO_SQLITE:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+def _mysql_error(error):
+    """The mysql.connector error database_module would see for a sqlite3 error."""
+    if str(error).startswith("no such table"):
+        return ProgrammingError(msg=str(error), errno=errorcode.ER_NO_SUCH_TABLE)
+    return Error(str(error))
+
+
+def _adapt(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def _convert(value):
+    if isinstance(value, str) and _TIMESTAMP_TEXT.match(value):
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+
+class SqliteCursor:
+    """The subset of a mysql.connector cursor database_module uses, on sqlite3."""
+
+    def __init__(self, cursor, dictionary=False):
+        self._cursor = cursor
+        self._dictionary = dictionary
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def execute(self, sql, params=()):
+        try:
+            self._cursor.execute(translate_sql(sql), tuple(_adapt(p) for p in params or ()))
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def executemany(self, sql, rows):
+        try:
+            self._cursor.executemany(translate_sql(sql), [tuple(_adapt(p) for p in row) for row in rows])
+        except sqlite3.Error as e:
+            raise _mysql_error(e) from e
+
+    def _row(self, row):
+        if row is None:
+            return None
+        values = tuple(_convert(value) for value in row)
+        if self._dictionary:
+            return dict(zip((column[0] for column in self._cursor.description), values))
+        return values
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def close(self):
+        self._cursor.close()
+
+
+class SqliteConnection:
+    """One sqlite3 connection per get_connection() call, like a pooled MySQL connection."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=30.0)
+
+    def cursor(self, dictionary=False, buffered=None):
+        # sqlite3 cursors always fetch lazily, so `buffered` changes nothing.
+        return SqliteCursor(self._conn.cursor(), dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+@contextlib.contextmanager
+def sqlite_database(path):
+    """
+    Point database_module (and everything built on it: student_cache,
+    AttendanceWriter, logging_module) at a SQLite file with the attendance
+    schema. Yields a function that opens a connection to it.
+    """
+    conn = sqlite3.connect(path)
+    conn.executescript(SQLITE_SCHEMA)
+    conn.close()
+
+    def connect():
+        return SqliteConnection(path)
+
+    previous = database_module.get_connection
+    database_module.get_connection = connect
+    try:
+        yield connect
+    finally:
+        database_module.get_connection = previous
+
+
+@contextlib.contextmanager
+def local_s3():
+    """
+    Yield the endpoint URL of a local S3: S3_ENDPOINT_URL when already set,
+    otherwise a moto server started on a free local port for the duration.
+    """
+    if os.environ.get(S3_ENDPOINT_ENV):
+        yield os.environ[S3_ENDPOINT_ENV]
+        return
+    if ThreadedMotoServer is None:
+        raise ImportError('No local S3: set S3_ENDPOINT_URL or install moto (pip install "moto[server]").')
+    # moto accepts any credentials, but boto3 refuses to sign requests without some.
+    for name, value in (("AWS_ACCESS_KEY_ID", "benchmark"), ("AWS_SECRET_ACCESS_KEY", "benchmark"),
+                        ("AWS_DEFAULT_REGION", "us-east-1")):
+        os.environ.setdefault(name, value)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)  # one log line per request otherwise
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    os.environ[S3_ENDPOINT_ENV] = f"http://{host}:{port}"
+    reset_s3_client()
+    try:
+        yield os.environ[S3_ENDPOINT_ENV]
+    finally:
+        os.environ.pop(S3_ENDPOINT_ENV, None)
+        reset_s3_client()
+        server.stop()
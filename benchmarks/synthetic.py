@@ -0,0 +1,29 @@
+import numpy as np
+
+ENCODING_DIM = 128
+# Scales chosen so that synthetic encodings behave like dlib's: distinct
+# students sit roughly 0.9 apart and a student's own samples within ~0.3.
+CENTER_SCALE = 0.9 / np.sqrt(2 * ENCODING_DIM)
+SAMPLE_SCALE = 0.25 / np.sqrt(ENCODING_DIM)
+
+
+def make_gallery(num_students, encodings_per_student=5, dim=ENCODING_DIM, seed=0):
+    """
+    Build a synthetic {student_name: [encoding, ...]} gallery.
+    Returns (encodings_dict, centers) where centers[i] is student i's identity vector.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0.0, CENTER_SCALE, size=(num_students, dim))
+    encodings_dict = {}
+    for i in range(num_students):
+        samples = centers[i] + rng.normal(0.0, SAMPLE_SCALE, size=(encodings_per_student, dim))
+        encodings_dict[f"student_{i:06d}"] = list(samples)
+    return encodings_dict, centers
+
+
+def make_queries(centers, num_queries, seed=1):
+    """Return (queries, true_student_indices) sampled around random gallery students."""
+    rng = np.random.default_rng(seed)
+    truth = rng.integers(0, len(centers), size=num_queries)
+    queries = centers[truth] + rng.normal(0.0, SAMPLE_SCALE, size=(num_queries, centers.shape[1]))
+    return queries, truth
@@ -0,0 +1,119 @@
+"""
+Constant-memory attendance export built on iter_attendance_records.
+
+    python -m database.attendance_export attendance.csv.gz --start 2025-01-01 --end 2025-06-30
+
+The format follows the file extension: .csv, .csv.gz or .parquet (Parquet
+needs the optional pyarrow package).
+"""
+import argparse
+import csv
+import datetime
+import gzip
+import time
+
+from database.database_module import ATTENDANCE_COLUMNS, iter_attendance_records
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except ImportError:
+    pa = None
+    pq = None
+
+EXPORT_FORMATS = ("csv", "csv.gz", "parquet")
+
+
+def _format_for(path):
+    for fmt in ("csv.gz", "parquet", "csv"):
+        if path.endswith("." + fmt):
+            return fmt
+    raise ValueError(f"Cannot infer export format from '{path}'; use one of {EXPORT_FORMATS}.")
+
+
+def _write_csv(rows, path, columns, compress):
+    opener = gzip.open if compress else open
+    count = 0
+    with opener(path, "wt", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+def _arrow_schema(columns):
+    types = {
+        "attendance_id": pa.int64(),
+        "student_id": pa.int64(),
+        "timestamp": pa.timestamp("s"),
+        "status": pa.string(),
+    }
+    return pa.schema([(c, types[c]) for c in columns])
+
+
+def _arrow_table(batch, schema):
+    columns = list(zip(*batch)) if batch else [()] * len(schema)
+    return pa.Table.from_arrays([pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                                schema=schema)
+
+
+def _write_parquet(rows, path, columns, batch_rows):
+    if pa is None:
+        raise ImportError("Parquet export needs pyarrow (pip install pyarrow).")
+    schema = _arrow_schema(columns)
+    count = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_rows:
+                writer.write_table(_arrow_table(batch, schema))
+                count += len(batch)
+                batch = []
+        if batch or count == 0:
+            writer.write_table(_arrow_table(batch, schema))
+            count += len(batch)
+    return count
+
+
+def export_attendance(path, student_id=None, start_date=None, end_date=None, columns=ATTENDANCE_COLUMNS,
+                      fmt=None, page_size=10000):
+    """
+    Stream attendance records matching the filters into `path`.
+    Memory stays bounded by one page of page_size rows whatever the result size.
+    Returns the number of rows written.
+    """
+    fmt = fmt or _format_for(path)
+    columns = tuple(columns)
+    rows = iter_attendance_records(student_id, start_date, end_date, columns=columns,
+                                   page_size=page_size, as_dict=False)
+    if fmt == "parquet":
+        return _write_parquet(rows, path, columns, batch_rows=page_size)
+    if fmt in ("csv", "csv.gz"):
+        return _write_csv(rows, path, columns, compress=fmt == "csv.gz")
+    raise ValueError(f"Unknown export format '{fmt}'; use one of {EXPORT_FORMATS}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export attendance records in constant memory.")
+    parser.add_argument("path", help="Output file (.csv, .csv.gz or .parquet).")
+    parser.add_argument("--student-id", type=int)
+    parser.add_argument("--start", type=datetime.datetime.fromisoformat, help="ISO date/time, inclusive.")
+    parser.add_argument("--end", type=datetime.datetime.fromisoformat, help="ISO date/time, inclusive.")
+    parser.add_argument("--columns", default=",".join(ATTENDANCE_COLUMNS),
+                        help="Comma-separated subset of " + ", ".join(ATTENDANCE_COLUMNS))
+    parser.add_argument("--page-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    count = export_attendance(args.path, args.student_id, args.start, args.end,
+                              columns=args.columns.split(","), page_size=args.page_size)
+    elapsed = time.perf_counter() - start
+    print(f"Exported {count} attendance records to {args.path} in {elapsed:.1f}s "
+          f"({count / elapsed if elapsed else 0:.0f} rows/s).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import datetime
+import queue
+import threading
+import time
+
+from database.database_module import log_attendance_batch
+from database.student_cache import student_cache
+
+
+class AttendanceWriter(threading.Thread):
+    """
+    Background attendance writer that keeps database round trips off the frame loop.
+
+    submit() never blocks: events go into a bounded queue and are dropped (and
+    counted) when it is full. The writer thread coalesces events per student,
+    skips students it already logged within duplicate_threshold seconds, and
+    flushes the rest with log_attendance_batch (one connection, one executemany,
+    one transaction) once batch_size students are pending or flush_interval
+    seconds have passed. A failed batch stays pending and is retried after
+    retry_interval seconds. close() flushes everything still queued.
+    on_flush(seconds, inserted), if given, is called after every database
+    flush with its duration and the number of rows inserted (None on failure).
+    """
+
+    def __init__(self, duplicate_threshold=3600, max_queue=1000, batch_size=100, flush_interval=1.0,
+                 retry_interval=5.0, on_flush=None):
+        super().__init__(name="attendance-writer", daemon=True)
+        self.on_flush = on_flush
+        self.duplicate_threshold = duplicate_threshold
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self._retry_at = 0.0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop_event = threading.Event()
+        self._last_logged = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "submitted": 0,
+            "dropped": 0,
+            "coalesced": 0,
+            "skipped_recent": 0,
+            "batches": 0,
+            "inserted": 0,
+            "failed_batches": 0,
+            "max_queue_depth": 0,
+            "last_flush_ms": None,
+        }
+
+    def submit(self, name, timestamp=None):
+        """Queue a recognition event. Returns False if it was dropped because the queue is full."""
+        try:
+            self._queue.put_nowait((name, timestamp or datetime.datetime.now()))
+        except queue.Full:
+            with self._lock:
+                self._stats["dropped"] += 1
+            return False
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._queue.qsize())
+        return True
+
+    def _add_pending(self, pending, name, timestamp):
+        last = self._last_logged.get(name)
+        if last is not None and (timestamp - last).total_seconds() < self.duplicate_threshold:
+            with self._lock:
+                self._stats["skipped_recent"] += 1
+            return
+        if name in pending:
+            # Keep the earliest sighting of each student in the batch.
+            with self._lock:
+                self._stats["coalesced"] += 1
+            pending[name] = min(pending[name], timestamp)
+        else:
+            pending[name] = timestamp
+
+    def _fail_batch(self, pending):
+        print(f"Failed to log attendance for {len(pending)} student(s); retrying in {self.retry_interval}s.")
+        with self._lock:
+            self._stats["failed_batches"] += 1
+        self._retry_at = time.monotonic() + self.retry_interval
+
+    def _flush(self, pending):
+        if not pending or time.monotonic() < self._retry_at:
+            return
+        start = time.perf_counter()
+        if not student_cache.ensure_loaded():
+            self._fail_batch(pending)
+            return
+        names_by_id = {}
+        records = []
+        for name, timestamp in list(pending.items()):
+            student_id = student_cache.get_student_id(name)
+            if student_id is None:
+                print(f"Student '{name}' not found in the database.")
+                del pending[name]
+                continue
+            names_by_id[student_id] = name
+            records.append((student_id, timestamp))
+        inserted = log_attendance_batch(records, self.duplicate_threshold)
+        elapsed_ms = (time.perf_counter() - start) * 1000.0
+        if self.on_flush is not None:
+            self.on_flush(elapsed_ms / 1000.0, None if inserted is None else len(inserted))
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["last_flush_ms"] = elapsed_ms
+            if inserted is not None:
+                self._stats["inserted"] += len(inserted)
+        if inserted is None:
+            self._fail_batch(pending)
+            return
+        # Students already logged in the database are remembered too, so
+        # they are not looked up again until the threshold has passed.
+        for name, timestamp in pending.items():
+            self._last_logged[name] = timestamp
+        for student_id, timestamp in inserted:
+            print(f"Logged attendance for '{names_by_id[student_id]}' at {timestamp}.")
+        pending.clear()
+
+    def run(self):
+        pending = {}
+        deadline = time.monotonic() + self.flush_interval
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            try:
+                name, timestamp = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                self._add_pending(pending, name, timestamp)
+            except queue.Empty:
+                pass
+            if len(pending) >= self.batch_size or time.monotonic() >= deadline:
+                self._flush(pending)
+                deadline = time.monotonic() + self.flush_interval
+        # Final flush on shutdown, even if a retry is still pending.
+        self._retry_at = 0.0
+        self._flush(pending)
+
+    def close(self, timeout=None):
+        """Stop accepting work, flush everything still queued and wait for the thread."""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
@@ -1,6 +1,11 @@
 
+import contextlib
+import datetime
+import threading
+import time
 import mysql.connector # type: ignore
-from mysql.connector import Error # type: ignore
+from mysql.connector import Error, errorcode, pooling # type: ignore
+from mysql.connector.errors import PoolError # type: ignore
 from urllib.parse import quote_plus
 
 # Database configuration – adjust host, user, and database as needed.
@@ -11,19 +16,146 @@ DB_CONFIG = {
     "database": "attendance_db"
 }
 
+# Connection pool settings. pool_size is capped at 32 by mysql.connector;
+# timeout is how long get_connection waits for a free connection (seconds).
+POOL_CONFIG = {
+    "pool_name": "attendance_pool",
+    "pool_size": 8,
+    "timeout": 5.0,
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_stats = {
+    "acquired": 0,
+    "waits": 0,
+    "timeouts": 0,
+    "in_use": 0,
+    "max_in_use": 0,
+    "wait_seconds": 0.0,
+}
+
+class PooledConnection:
+    """
+    Thin wrapper around a pooled mysql.connector connection that tracks pool
+    utilisation. close() hands the connection back to the pool, which resets
+    the session (ending any open transaction) before it is reused.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._closed = False
+
+    def __getattr__(self, attr):
+        return getattr(self._conn, attr)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        with _pool_lock:
+            _pool_stats["in_use"] -= 1
+        self._conn.close()
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pooling.MySQLConnectionPool(
+                pool_name=POOL_CONFIG["pool_name"],
+                pool_size=POOL_CONFIG["pool_size"],
+                pool_reset_session=True,
+                host=DB_CONFIG["host"],
+                user=DB_CONFIG["user"],
+                password=DB_CONFIG["password"],
+                database=DB_CONFIG["database"]
+            )
+        return _pool
+
 def get_connection():
-    """Establish a connection to the MySQL database."""
+    """
+    Borrow a connection from the MySQL connection pool.
+    Waits up to POOL_CONFIG["timeout"] seconds for a free connection; closing
+    the returned connection returns it to the pool.
+    """
     try:
-        conn = mysql.connector.connect(
-            host=DB_CONFIG["host"],
-            user=DB_CONFIG["user"],
-            password=DB_CONFIG["password"],
-            database=DB_CONFIG["database"]
-        )
-        return conn
+        pool = _get_pool()
     except Error as e:
         print(f"Error connecting to MySQL: {e}")
         return None
+    start = time.monotonic()
+    waited = False
+    while True:
+        try:
+            conn = pool.get_connection()
+            break
+        except PoolError:
+            # Every pooled connection is busy; wait for one to be returned.
+            waited = True
+            if time.monotonic() - start >= POOL_CONFIG["timeout"]:
+                with _pool_lock:
+                    _pool_stats["timeouts"] += 1
+                print("Error connecting to MySQL: timed out waiting for a pooled connection.")
+                return None
+            time.sleep(0.005)
+        except Error as e:
+            print(f"Error connecting to MySQL: {e}")
+            return None
+    with _pool_lock:
+        _pool_stats["acquired"] += 1
+        _pool_stats["in_use"] += 1
+        _pool_stats["max_in_use"] = max(_pool_stats["max_in_use"], _pool_stats["in_use"])
+        if waited:
+            _pool_stats["waits"] += 1
+            _pool_stats["wait_seconds"] += time.monotonic() - start
+    return PooledConnection(conn)
+
+@contextlib.contextmanager
+def transaction(dictionary=False):
+    """
+    Run several statements on one pooled connection in a single transaction.
+    Yields a cursor; commits on success, rolls back and re-raises on error.
+
+        with transaction() as cursor:
+            cursor.execute(...)
+            cursor.execute(...)
+    """
+    conn = get_connection()
+    if conn is None:
+        raise Error("Could not connect to the database.")
+    cursor = conn.cursor(dictionary=dictionary)
+    try:
+        yield cursor
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def get_pool_stats():
+    """Return connection pool utilisation counters."""
+    with _pool_lock:
+        stats = dict(_pool_stats)
+    stats["pool_size"] = POOL_CONFIG["pool_size"]
+    stats["avg_wait_ms"] = 1000.0 * stats["wait_seconds"] / stats["waits"] if stats["waits"] else 0.0
+    return stats
+
+# Callables run as listener(student_id, name) after a student is created,
+# updated or deleted (name is None for deletions and metadata-only updates).
+_student_change_listeners = []
+
+def register_student_change_listener(listener):
+    """Register a callable to be notified of student changes (used by caches)."""
+    _student_change_listeners.append(listener)
+
+def _notify_student_change(student_id, name=None):
+    for listener in _student_change_listeners:
+        try:
+            listener(student_id, name)
+        except Exception as e:
+            print(f"Error notifying student change listener: {e}")
 
 # =========================
 # CRUD for Students Table
@@ -42,6 +174,7 @@ def create_student(name, metadata=None):
         sql = "INSERT INTO Students (name, metadata) VALUES (%s, %s)"
         cursor.execute(sql, (name, metadata))
         conn.commit()
+        _notify_student_change(cursor.lastrowid, name)
         return cursor.lastrowid
     except Error as e:
         print(f"Error creating student: {e}")
@@ -67,6 +200,22 @@ def get_student(student_id):
         if conn:
             conn.close()
 
+def get_student_ids_by_name():
+    """Return a {name: student_id} mapping for every student, in one query."""
+    conn = get_connection()
+    if conn is None:
+        return None
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, student_id FROM Students")
+        return {name: student_id for name, student_id in cursor.fetchall()}
+    except Error as e:
+        print(f"Error fetching student ids: {e}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+
 def update_student(student_id, name=None, metadata=None):
     """Update details for a student. Only provided fields are updated."""
     conn = get_connection()
@@ -88,6 +237,7 @@ def update_student(student_id, name=None, metadata=None):
         sql = "UPDATE Students SET " + ", ".join(updates) + " WHERE student_id = %s"
         cursor.execute(sql, tuple(params))
         conn.commit()
+        _notify_student_change(student_id, name)
         return cursor.rowcount > 0
     except Error as e:
         print(f"Error updating student: {e}")
@@ -106,6 +256,7 @@ def delete_student(student_id):
         sql = "DELETE FROM Students WHERE student_id = %s"
         cursor.execute(sql, (student_id,))
         conn.commit()
+        _notify_student_change(student_id)
         return cursor.rowcount > 0
     except Error as e:
         print(f"Error deleting student: {e}")
@@ -127,8 +278,10 @@ def log_attendance_record(student_id, timestamp, status="present"):
         cursor = conn.cursor()
         sql = "INSERT INTO Attendance (student_id, timestamp, status) VALUES (%s, %s, %s)"
         cursor.execute(sql, (student_id, timestamp, status))
+        record_id = cursor.lastrowid
+        _update_rollup(cursor, _upsert_daily_rollup, [(student_id, timestamp)])
         conn.commit()
-        return cursor.lastrowid
+        return record_id
     except Error as e:
         print(f"Error logging attendance: {e}")
         return None
@@ -167,6 +320,64 @@ def get_attendance_records(student_id=None, start_date=None, end_date=None):
         if conn:
             conn.close()
 
+ATTENDANCE_COLUMNS = ("attendance_id", "student_id", "timestamp", "status")
+
+def iter_attendance_records(student_id=None, start_date=None, end_date=None, columns=ATTENDANCE_COLUMNS,
+                            page_size=10000, after_id=None, as_dict=True):
+    """
+    Stream attendance records in attendance_id order without loading them all.
+    Filters match get_attendance_records. Only `columns` are selected; rows are
+    yielded as dicts (or tuples in `columns` order with as_dict=False).
+
+    Rows are read in pages of page_size with keyset pagination
+    (attendance_id > last id seen), each page on an unbuffered cursor over a
+    pooled connection that is returned before the page is yielded, so memory
+    stays bounded by one page and a slow consumer never holds a connection.
+    Pass after_id to resume after the last attendance_id already processed.
+    Unlike the CRUD helpers this raises mysql.connector.Error on failure, so a
+    partial stream is never mistaken for a complete one.
+    """
+    columns = tuple(columns)
+    unknown = set(columns) - set(ATTENDANCE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown attendance columns: {sorted(unknown)}")
+    # attendance_id is always selected (first) because it is the pagination key.
+    selected = ("attendance_id",) + tuple(c for c in columns if c != "attendance_id")
+    positions = [selected.index(c) for c in columns]
+    where = ["attendance_id > %s"]
+    filters = []
+    if student_id:
+        where.append("student_id = %s")
+        filters.append(student_id)
+    if start_date:
+        where.append("timestamp >= %s")
+        filters.append(start_date)
+    if end_date:
+        where.append("timestamp <= %s")
+        filters.append(end_date)
+    sql = (f"SELECT {', '.join(selected)} FROM Attendance WHERE {' AND '.join(where)} "
+           f"ORDER BY attendance_id LIMIT %s")
+    last_id = after_id or 0
+    while True:
+        conn = get_connection()
+        if conn is None:
+            raise Error("Could not connect to the database.")
+        try:
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(sql, (last_id, *filters, page_size))
+            page = cursor.fetchall()
+            cursor.close()
+        finally:
+            conn.close()
+        if not page:
+            return
+        last_id = page[-1][0]
+        for row in page:
+            values = tuple(row[i] for i in positions)
+            yield dict(zip(columns, values)) if as_dict else values
+        if len(page) < page_size:
+            return
+
 def update_attendance_record(attendance_id, status):
     """Update the status (e.g., present, absent) for an attendance record."""
     conn = get_connection()
@@ -192,10 +403,15 @@ def delete_attendance_record(attendance_id):
         return False
     try:
         cursor = conn.cursor()
+        cursor.execute("SELECT student_id, timestamp FROM Attendance WHERE attendance_id = %s", (attendance_id,))
+        record = cursor.fetchone()
         sql = "DELETE FROM Attendance WHERE attendance_id = %s"
         cursor.execute(sql, (attendance_id,))
+        deleted = cursor.rowcount > 0
+        if deleted and record[0] is not None:
+            _update_rollup(cursor, _recompute_daily_rollup, record[0], record[1].date())
         conn.commit()
-        return cursor.rowcount > 0
+        return deleted
     except Error as e:
         print(f"Error deleting attendance record: {e}")
         return False
@@ -203,6 +419,207 @@ def delete_attendance_record(attendance_id):
         if conn:
             conn.close()
 
+def log_attendance_batch(records, duplicate_threshold=3600, status="present"):
+    """
+    Log attendance for many (student_id, timestamp) records in one transaction.
+    Records for students with an attendance entry within duplicate_threshold
+    seconds are skipped (checked with a single query), and the remaining rows
+    are written with one executemany.
+    Returns the list of (student_id, timestamp) records inserted, or None on error.
+    """
+    if not records:
+        return []
+    try:
+        with transaction() as cursor:
+            ids = sorted({student_id for student_id, _ in records})
+            earliest = min(ts for _, ts in records) - datetime.timedelta(seconds=duplicate_threshold)
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(
+                f"SELECT student_id, MAX(timestamp) FROM Attendance "
+                f"WHERE student_id IN ({placeholders}) AND timestamp >= %s GROUP BY student_id",
+                tuple(ids) + (earliest,))
+            last_seen = dict(cursor.fetchall())
+
+            rows = []
+            inserted = []
+            for student_id, ts in sorted(records, key=lambda record: record[1]):
+                previous = last_seen.get(student_id)
+                if previous is not None and (ts - previous).total_seconds() < duplicate_threshold:
+                    continue
+                last_seen[student_id] = ts
+                rows.append((student_id, ts, status))
+                inserted.append((student_id, ts))
+            if rows:
+                cursor.executemany("INSERT INTO Attendance (student_id, timestamp, status) VALUES (%s, %s, %s)", rows)
+                _update_rollup(cursor, _upsert_daily_rollup, inserted)
+        return inserted
+    except Error as e:
+        print(f"Error logging attendance batch: {e}")
+        return None
+
+# =========================
+# Attendance rollups
+# =========================
+# AttendanceDaily holds one row per student per day (first_seen, last_seen,
+# count) for every Attendance record, whatever its status. It is kept up to
+# date by log_attendance_record, log_attendance_batch and
+# delete_attendance_record in the same transaction as the raw rows;
+# rebuild_attendance_rollup recomputes it from Attendance after bulk changes
+# made outside these functions.
+# Attendance is the system of record and the rollup only derived from it, so
+# while AttendanceDaily does not exist yet (its migration not applied) the
+# rollup update is undone on its own through a savepoint and the raw rows are
+# still committed; run rebuild_attendance_rollup once the table exists. Any
+# other error propagates: InnoDB undoes the whole transaction on a deadlock or
+# lock wait timeout, so the caller has to report the write as failed.
+
+_rollup_failures = 0
+_rollup_failures_lock = threading.Lock()
+
+def _update_rollup(cursor, update, *args):
+    """Run update(cursor, *args) in a savepoint, skipping it only if the rollup table is missing."""
+    global _rollup_failures
+    try:
+        cursor.execute("SAVEPOINT attendance_rollup")
+        update(cursor, *args)
+        cursor.execute("RELEASE SAVEPOINT attendance_rollup")
+    except Error as e:
+        if e.errno != errorcode.ER_NO_SUCH_TABLE:
+            raise
+        cursor.execute("ROLLBACK TO SAVEPOINT attendance_rollup")
+        with _rollup_failures_lock:
+            _rollup_failures += 1
+            failures = _rollup_failures
+        if failures == 1 or failures % 100 == 0:
+            print(f"Attendance rollup not updated ({failures} times so far; attendance itself was "
+                  f"recorded): {e}. Apply the migrations, then run rebuild_attendance_rollup().")
+
+def get_rollup_failures():
+    """Number of rollup updates skipped since start-up (each left AttendanceDaily behind Attendance)."""
+    with _rollup_failures_lock:
+        return _rollup_failures
+
+_ROLLUP_UPSERT_SQL = (
+    "INSERT INTO AttendanceDaily (student_id, day, first_seen, last_seen, count) VALUES (%s, %s, %s, %s, %s) "
+    "ON DUPLICATE KEY UPDATE first_seen = LEAST(first_seen, VALUES(first_seen)), "
+    "last_seen = GREATEST(last_seen, VALUES(last_seen)), count = count + VALUES(count)"
+)
+
+def _upsert_daily_rollup(cursor, records):
+    """Fold new (student_id, timestamp) records into AttendanceDaily."""
+    days = {}
+    for student_id, ts in records:
+        if student_id is None:
+            continue
+        key = (student_id, ts.date())
+        first, last, count = days.get(key, (ts, ts, 0))
+        days[key] = (min(first, ts), max(last, ts), count + 1)
+    if days:
+        cursor.executemany(_ROLLUP_UPSERT_SQL, [
+            (student_id, day, first, last, count) for (student_id, day), (first, last, count) in days.items()
+        ])
+
+def _recompute_daily_rollup(cursor, student_id, day):
+    """Recompute one student's day from Attendance (used after deletions)."""
+    cursor.execute("DELETE FROM AttendanceDaily WHERE student_id = %s AND day = %s", (student_id, day))
+    cursor.execute(
+        "INSERT INTO AttendanceDaily (student_id, day, first_seen, last_seen, count) "
+        "SELECT student_id, DATE(timestamp), MIN(timestamp), MAX(timestamp), COUNT(*) FROM Attendance "
+        "WHERE student_id = %s AND timestamp >= %s AND timestamp < %s GROUP BY student_id, DATE(timestamp)",
+        (student_id, day, day + datetime.timedelta(days=1)))
+
+def rebuild_attendance_rollup(start_day=None, end_day=None, chunk_days=31):
+    """
+    Recompute AttendanceDaily from Attendance for days in [start_day, end_day]
+    (default: the whole history), one transaction per chunk_days so a backfill
+    of a large table never holds one huge transaction.
+    Returns the number of rollup rows written, or None on error.
+    """
+    try:
+        if start_day is None or end_day is None:
+            with transaction() as cursor:
+                cursor.execute("SELECT MIN(timestamp), MAX(timestamp) FROM Attendance")
+                first, last = cursor.fetchone()
+            if first is None:
+                return 0
+            start_day = start_day or first.date()
+            end_day = end_day or last.date()
+        written = 0
+        chunk_start = start_day
+        while chunk_start <= end_day:
+            chunk_end = min(chunk_start + datetime.timedelta(days=chunk_days - 1), end_day)
+            with transaction() as cursor:
+                cursor.execute("DELETE FROM AttendanceDaily WHERE day BETWEEN %s AND %s", (chunk_start, chunk_end))
+                cursor.execute(
+                    "INSERT INTO AttendanceDaily (student_id, day, first_seen, last_seen, count) "
+                    "SELECT student_id, DATE(timestamp), MIN(timestamp), MAX(timestamp), COUNT(*) FROM Attendance "
+                    "WHERE student_id IS NOT NULL AND timestamp >= %s AND timestamp < %s "
+                    "GROUP BY student_id, DATE(timestamp)",
+                    (chunk_start, chunk_end + datetime.timedelta(days=1)))
+                written += cursor.rowcount
+            chunk_start = chunk_end + datetime.timedelta(days=1)
+        return written
+    except Error as e:
+        print(f"Error rebuilding attendance rollup: {e}")
+        return None
+
+def get_daily_attendance(start_day, end_day, student_id=None):
+    """
+    Per-student daily rows (student_id, name, day, first_seen, last_seen, count)
+    for days in [start_day, end_day], read from AttendanceDaily.
+    """
+    conn = get_connection()
+    if conn is None:
+        return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        sql = ("SELECT d.student_id, s.name, d.day, d.first_seen, d.last_seen, d.count "
+               "FROM AttendanceDaily d JOIN Students s ON s.student_id = d.student_id "
+               "WHERE d.day BETWEEN %s AND %s")
+        params = [start_day, end_day]
+        if student_id:
+            sql += " AND d.student_id = %s"
+            params.append(student_id)
+        sql += " ORDER BY d.day, s.name"
+        cursor.execute(sql, tuple(params))
+        return cursor.fetchall()
+    except Error as e:
+        print(f"Error retrieving daily attendance: {e}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+
+def get_weekly_attendance(start_day, end_day, student_id=None):
+    """
+    Per-student ISO-week rows (student_id, name, week_start, days_present,
+    first_seen, last_seen, count) for days in [start_day, end_day], read from AttendanceDaily.
+    """
+    conn = get_connection()
+    if conn is None:
+        return None
+    try:
+        cursor = conn.cursor(dictionary=True)
+        sql = ("SELECT d.student_id, s.name, "
+               "DATE_SUB(d.day, INTERVAL WEEKDAY(d.day) DAY) AS week_start, "
+               "COUNT(*) AS days_present, MIN(d.first_seen) AS first_seen, "
+               "MAX(d.last_seen) AS last_seen, SUM(d.count) AS count "
+               "FROM AttendanceDaily d JOIN Students s ON s.student_id = d.student_id "
+               "WHERE d.day BETWEEN %s AND %s")
+        params = [start_day, end_day]
+        if student_id:
+            sql += " AND d.student_id = %s"
+            params.append(student_id)
+        sql += " GROUP BY d.student_id, s.name, week_start ORDER BY week_start, s.name"
+        cursor.execute(sql, tuple(params))
+        return cursor.fetchall()
+    except Error as e:
+        print(f"Error retrieving weekly attendance: {e}")
+        return None
+    finally:
+        if conn:
+            conn.close()
+
 def get_student_by_name(name):
     """Retrieve a student's details using their name."""
     conn = get_connection()
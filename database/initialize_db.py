@@ -1,46 +1,29 @@
-from database_module import get_connection
+import os
+import sys
 
-def create_tables():
-    conn = get_connection()
-    if conn is None:
-        print("Failed to connect to MySQL.")
-        return
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+from database.migrations import migrate, pending_migrations
 
-    try:
-        cursor = conn.cursor()
-        # Create Students table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Students (
-                student_id INT AUTO_INCREMENT PRIMARY KEY,
-                name VARCHAR(255) NOT NULL,
-                metadata TEXT
-            )
-        ''')
-        # Create Attendance table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS Attendance (
-                attendance_id INT AUTO_INCREMENT PRIMARY KEY,
-                student_id INT,
-                timestamp DATETIME NOT NULL,
-                status VARCHAR(50) DEFAULT 'present',
-                FOREIGN KEY (student_id) REFERENCES Students(student_id)
-            )
-        ''')
-        # Create student_images table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS student_images (
-                image_id INT AUTO_INCREMENT PRIMARY KEY,
-                student_id INT,
-                image_url VARCHAR(255) NOT NULL,
-                FOREIGN KEY (student_id) REFERENCES Students(student_id)
-            )
-        ''')
-        conn.commit()
-        print("Tables created successfully.")
-    except Exception as e:
-        print(f"Error creating tables: {e}")
-    finally:
-        conn.close()
+
+def create_tables():
+    """
+    Create the schema, or bring an existing database up to date, via the
+    migration runner. Returns the schema version, or None if any migration
+    could not be applied.
+    """
+    version = migrate()
+    if version is None:
+        print("Error: could not migrate the database.")
+        return None
+    pending = pending_migrations()
+    if pending is None or pending:
+        print(f"Error: the database schema is incomplete; migrations {pending} could not be applied "
+              "(see the errors above).")
+        return None
+    print("Tables created successfully.")
+    return version
 
 if __name__ == '__main__':
-    create_tables()
+    sys.exit(0 if create_tables() is not None else 1)
@@ -1,26 +1,22 @@
 import datetime
-from database.database_module import get_student_by_name, log_attendance_record, get_attendance_records
+from database.database_module import log_attendance_record, get_attendance_records
+from database.student_cache import student_cache
 
 def log_attendance(name, duplicate_threshold=3600):
     """
     Log attendance by inserting a new record into the MySQL Attendance table.
     This function:
-      - Retrieves the student record using the student's name.
+      - Looks up the student's id by name in the in-process student cache.
       - Checks if an attendance record exists within the last 'duplicate_threshold' seconds.
       - Inserts a new attendance record with the current timestamp and status "present"
         only if no recent record is found.
     """
     now = datetime.datetime.now()
 
-    # Retrieve the student's record from the database
-    student = get_student_by_name(name)
-    if student is None:
-        print(f"Student '{name}' not found in the database.")
-        return
-
-    student_id = student.get("student_id")
+    # Resolve the student's id (served from memory after the first bulk load)
+    student_id = student_cache.get_student_id(name)
     if student_id is None:
-        print(f"Student ID for '{name}' not found.")
+        print(f"Student '{name}' not found in the database.")
         return
 
     # Check for duplicate attendance entries within duplicate_threshold seconds
@@ -0,0 +1,217 @@
+import datetime
+
+from database.database_module import get_connection
+
+
+def _create_base_tables(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Students (
+            student_id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            metadata TEXT
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS Attendance (
+            attendance_id INT AUTO_INCREMENT PRIMARY KEY,
+            student_id INT,
+            timestamp DATETIME NOT NULL,
+            status VARCHAR(50) DEFAULT 'present',
+            FOREIGN KEY (student_id) REFERENCES Students(student_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS student_images (
+            image_id INT AUTO_INCREMENT PRIMARY KEY,
+            student_id INT,
+            image_url VARCHAR(255) NOT NULL,
+            FOREIGN KEY (student_id) REFERENCES Students(student_id)
+        )
+    ''')
+
+
+def _index_exists(cursor, table, index_name):
+    cursor.execute(
+        "SELECT 1 FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s LIMIT 1",
+        (table, index_name))
+    return cursor.fetchone() is not None
+
+
+def _leading_index_exists(cursor, table, column, skip_index=None):
+    """True if some index on `table` (other than skip_index) starts with `column`."""
+    cursor.execute(
+        "SELECT INDEX_NAME FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s AND SEQ_IN_INDEX = 1",
+        (table, column))
+    return any(row[0] != skip_index for row in cursor.fetchall())
+
+
+def _add_index(table, index_name, definition):
+    """Migration step that creates an index unless it already exists."""
+    def step(cursor):
+        if not _index_exists(cursor, table, index_name):
+            cursor.execute(f"ALTER TABLE {table} ADD {definition}")
+    return step
+
+
+def _add_student_images_fk_index(cursor):
+    # InnoDB creates an index for the foreign key on its own when the table is
+    # created; only add one for databases where it is missing.
+    if not _leading_index_exists(cursor, "student_images", "student_id"):
+        cursor.execute("ALTER TABLE student_images ADD INDEX idx_student_images_student (student_id)")
+
+
+class DuplicateStudentNames(Exception):
+    """Students share a name, so the unique name index cannot be created."""
+
+
+def _add_unique_student_name(cursor):
+    cursor.execute(
+        "SELECT name, GROUP_CONCAT(student_id ORDER BY student_id) FROM Students "
+        "GROUP BY name HAVING COUNT(*) > 1")
+    duplicates = cursor.fetchall()
+    if duplicates:
+        listed = "; ".join(f"'{name}' (student_id {ids})" for name, ids in duplicates[:20])
+        more = f" and {len(duplicates) - 20} more" if len(duplicates) > 20 else ""
+        raise DuplicateStudentNames(
+            f"{len(duplicates)} student name(s) are used more than once: {listed}{more}. "
+            f"Rename or merge these students (Admin/admin_module.py), then run initialize_db.py again.")
+    _add_index("Students", "uq_students_name", "UNIQUE INDEX uq_students_name (name)")(cursor)
+
+
+def _create_attendance_daily(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS AttendanceDaily (
+            student_id INT NOT NULL,
+            day DATE NOT NULL,
+            first_seen DATETIME NOT NULL,
+            last_seen DATETIME NOT NULL,
+            count INT NOT NULL,
+            PRIMARY KEY (student_id, day),
+            INDEX idx_attendance_daily_day (day)
+        )
+    ''')
+    # Backfill from existing history; later changes are maintained by database_module.
+    cursor.execute("DELETE FROM AttendanceDaily")
+    cursor.execute(
+        "INSERT INTO AttendanceDaily (student_id, day, first_seen, last_seen, count) "
+        "SELECT student_id, DATE(timestamp), MIN(timestamp), MAX(timestamp), COUNT(*) FROM Attendance "
+        "WHERE student_id IS NOT NULL GROUP BY student_id, DATE(timestamp)")
+
+
+# Ordered (version, description, [steps]) entries. A step is a SQL string or a
+# callable taking a cursor. Never edit an applied migration; append a new one.
+# Migrations in OPTIONAL_MIGRATIONS may fail on existing data without blocking
+# the ones after them; they stay pending and are retried on the next run.
+MIGRATIONS = [
+    (1, "Create Students, Attendance and student_images tables", [_create_base_tables]),
+    (2, "Index attendance by student and time for duplicate checks and range queries",
+     [_add_index("Attendance", "idx_attendance_student_time", "INDEX idx_attendance_student_time (student_id, timestamp)")]),
+    (3, "Index attendance by time for date-range reports",
+     [_add_index("Attendance", "idx_attendance_timestamp", "INDEX idx_attendance_timestamp (timestamp)")]),
+    (4, "Unique index on student names used by get_student_by_name",
+     [_add_unique_student_name]),
+    (5, "Index student_images by student", [_add_student_images_fk_index]),
+    (6, "Per-student daily attendance rollup, backfilled from Attendance", [_create_attendance_daily]),
+]
+OPTIONAL_MIGRATIONS = {4}
+
+
+def _ensure_version_table(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL
+        )
+    ''')
+
+
+def get_schema_version():
+    """Return the highest applied migration version (0 for an empty database), or None on error."""
+    conn = get_connection()
+    if conn is None:
+        return None
+    try:
+        cursor = conn.cursor()
+        _ensure_version_table(cursor)
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        version = cursor.fetchone()[0]
+        return version or 0
+    except Exception as e:
+        print(f"Error reading schema version: {e}")
+        return None
+    finally:
+        conn.close()
+
+
+def _applied_versions(cursor):
+    _ensure_version_table(cursor)
+    cursor.execute("SELECT version FROM schema_version")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def pending_migrations(target=None):
+    """Return the versions up to `target` (default: the latest) not applied yet, or None on error."""
+    conn = get_connection()
+    if conn is None:
+        return None
+    try:
+        applied = _applied_versions(conn.cursor())
+    except Exception as e:
+        print(f"Error reading schema version: {e}")
+        return None
+    finally:
+        conn.close()
+    return [version for version, _, _ in MIGRATIONS
+            if version not in applied and (target is None or version <= target)]
+
+
+def migrate(target=None):
+    """
+    Apply every pending migration up to `target` (default: the latest) in order,
+    recording each one in schema_version. MySQL commits DDL implicitly, so a
+    migration is recorded only after all of its steps succeeded. A failed
+    migration stops the run and leaves later migrations pending, unless it is
+    in OPTIONAL_MIGRATIONS: then it alone stays pending and the run goes on.
+    Returns the highest applied version afterwards, or None if it could not be
+    determined; use pending_migrations() to check that nothing was left out.
+    """
+    conn = get_connection()
+    if conn is None:
+        print("Failed to connect to MySQL.")
+        return None
+    try:
+        cursor = conn.cursor()
+        applied = _applied_versions(cursor)
+        current = max(applied, default=0)
+        skipped = []
+        for version, description, steps in MIGRATIONS:
+            if version in applied or (target is not None and version > target):
+                continue
+            print(f"Applying migration {version}: {description}")
+            try:
+                for step in steps:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, description, applied_at) VALUES (%s, %s, %s)",
+                    (version, description, datetime.datetime.now()))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error applying migration {version}: {e}")
+                if version not in OPTIONAL_MIGRATIONS:
+                    break
+                print(f"Migration {version} stays pending; continuing with the next migrations.")
+                skipped.append(version)
+                continue
+            current = max(current, version)
+        print(f"Database schema is at version {current}"
+              + (f" (migrations {skipped} still pending)." if skipped else "."))
+        return current
+    finally:
+        conn.close()
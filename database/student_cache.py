@@ -0,0 +1,121 @@
+import threading
+import time
+
+from database.database_module import (
+    get_student_by_name,
+    get_student_ids_by_name,
+    register_student_change_listener,
+)
+
+# Seconds before the whole cache is reloaded, to pick up changes made by
+# other processes (registration kiosks, admin tools).
+DEFAULT_TTL = 600
+# Seconds a name found in no student row is answered from memory. Kept short
+# because students registered by other processes (and lookups that failed on a
+# database error) only show up once it expires.
+DEFAULT_NEGATIVE_TTL = 60
+
+
+class StudentCache:
+    """
+    In-process name -> student_id cache for the attendance path.
+
+    warm() loads every student with one bulk query. Lookups are served from
+    memory; a miss falls back to get_student_by_name and caches the result,
+    including names with no student (for `negative_ttl` seconds), so faces
+    recognised for a gallery entry missing from the database do not query it
+    on every frame. Changes made through create_student/update_student/
+    delete_student in this process update the cache immediately, and the
+    whole cache is reloaded once it is older than `ttl` seconds.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self._ids = {}
+        self._missing = {}  # name -> time.monotonic() when the lookup found no student
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def warm(self):
+        """Reload the whole name -> student_id mapping. Returns False if the database was unreachable."""
+        ids = get_student_ids_by_name()
+        if ids is None:
+            return False
+        with self._lock:
+            self._ids = ids
+            self._missing = {}
+            self._loaded_at = time.monotonic()
+        return True
+
+    def _expired(self):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= self.ttl
+
+    def ensure_loaded(self):
+        """
+        Reload the cache if it has expired. Returns False only if it has never
+        been loaded because the database is unreachable; a stale cache is
+        kept when a reload fails.
+        """
+        if self._expired() and not self.warm():
+            return self._loaded_at is not None
+        return True
+
+    def get_student_id(self, name):
+        """Return the student_id for a name, or None if no such student exists."""
+        self.ensure_loaded()
+        with self._lock:
+            student_id = self._ids.get(name)
+            if student_id is not None:
+                self.hits += 1
+                return student_id
+            missing_since = self._missing.get(name)
+            if missing_since is not None and time.monotonic() - missing_since < self.negative_ttl:
+                self.negative_hits += 1
+                return None
+            self.misses += 1
+        student = get_student_by_name(name)
+        student_id = student.get("student_id") if student is not None else None
+        with self._lock:
+            if student_id is not None:
+                self._ids[name] = student_id
+                self._missing.pop(name, None)
+            else:
+                self._missing[name] = time.monotonic()
+        return student_id
+
+    def on_student_change(self, student_id, name=None):
+        """Listener for database_module student changes."""
+        with self._lock:
+            for cached_name, cached_id in list(self._ids.items()):
+                if cached_id == student_id:
+                    del self._ids[cached_name]
+            if name:
+                self._ids[name] = student_id
+                self._missing.pop(name, None)
+
+    def invalidate(self):
+        """Drop everything; the next lookup reloads the cache."""
+        with self._lock:
+            self._ids = {}
+            self._missing = {}
+            self._loaded_at = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._ids),
+                "missing": len(self._missing),
+                "hits": self.hits,
+                "misses": self.misses,
+                "negative_hits": self.negative_hits,
+                "age_seconds": None if self._loaded_at is None else time.monotonic() - self._loaded_at,
+            }
+
+
+# Shared by every attendance and registration caller in this process.
+student_cache = StudentCache()
+register_student_change_listener(student_cache.on_student_change)
@@ -0,0 +1,122 @@
+import numpy as np
+
+from face_encodings.matcher import GalleryMatcher
+
+# Probed lists per query; higher values trade latency for recall.
+DEFAULT_N_PROBE = 8
+# Lloyd iterations and training-set size used for the coarse k-means.
+KMEANS_ITERATIONS = 10
+KMEANS_POINTS_PER_LIST = 64
+
+
+def _sq_distances(queries, points, points_sq):
+    """Squared Euclidean distances between every query and every point."""
+    queries_sq = np.einsum("ij,ij->i", queries, queries)
+    sq_dist = queries_sq[:, None] + points_sq[None, :] - 2.0 * (queries @ points.T)
+    np.maximum(sq_dist, 0.0, out=sq_dist)
+    return sq_dist
+
+
+def _assign(points, centroids, batch_size=8192):
+    """Return the index of the closest centroid for every point, in batches."""
+    centroids_sq = np.einsum("ij,ij->i", centroids, centroids)
+    assignments = np.empty(len(points), dtype=np.int64)
+    for start in range(0, len(points), batch_size):
+        batch = points[start:start + batch_size]
+        assignments[start:start + batch_size] = np.argmin(
+            _sq_distances(batch, centroids, centroids_sq), axis=1)
+    return assignments
+
+
+def kmeans(points, n_clusters, n_iter=KMEANS_ITERATIONS, seed=0):
+    """Plain Lloyd's k-means on float32 points. Returns the (n_clusters, dim) centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = points[rng.choice(len(points), size=n_clusters, replace=False)].copy()
+    for _ in range(n_iter):
+        assignments = _assign(points, centroids)
+        counts = np.bincount(assignments, minlength=n_clusters)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, points)
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, None]
+        # Re-seed empty clusters with random points so every list stays usable.
+        empty = np.flatnonzero(~non_empty)
+        if len(empty):
+            centroids[empty] = points[rng.choice(len(points), size=len(empty), replace=False)]
+    return centroids
+
+
+class IVFIndex(GalleryMatcher):
+    """
+    Inverted-file approximate nearest-neighbour index (IVF-Flat).
+
+    Gallery rows are partitioned by a coarse k-means quantizer. A query is
+    compared only against the rows of its `n_probe` closest lists; distances
+    inside those lists are exact, so `match` returns the same (name, distance)
+    results as GalleryMatcher whenever the true nearest row was probed.
+    Probing every list (or calling `exact_nearest`) falls back to exact search.
+    """
+
+    def __init__(self, matrix, labels, names, n_lists=None, n_probe=DEFAULT_N_PROBE, seed=0):
+        super().__init__(matrix, labels, names)
+        num_rows = len(self)
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(num_rows))
+        self.n_lists = max(1, min(n_lists, num_rows))
+        self.n_probe = n_probe
+        self._train(seed)
+
+    @classmethod
+    def from_encodings_dict(cls, encodings_dict, n_lists=None, n_probe=DEFAULT_N_PROBE, seed=0):
+        flat = GalleryMatcher.from_encodings_dict(encodings_dict)
+        return cls(flat.matrix, flat.labels, flat.names, n_lists=n_lists, n_probe=n_probe, seed=seed)
+
+    def _train(self, seed):
+        if len(self) == 0:
+            self.centroids = np.empty((0, self.matrix.shape[1]), dtype=np.float32)
+            self.offsets = np.zeros(1, dtype=np.int64)
+            return
+        rng = np.random.default_rng(seed)
+        num_train = min(len(self), self.n_lists * KMEANS_POINTS_PER_LIST)
+        train = self.matrix[rng.choice(len(self), size=num_train, replace=False)]
+        self.centroids = kmeans(train, self.n_lists, seed=seed)
+        self.centroid_sq = np.einsum("ij,ij->i", self.centroids, self.centroids)
+
+        # Store each inverted list as a contiguous slice of the gallery matrix.
+        assignments = _assign(self.matrix, self.centroids)
+        order = np.argsort(assignments, kind="stable")
+        self.matrix = np.ascontiguousarray(self.matrix[order])
+        self.labels = self.labels[order]
+        self.sq_norms = self.sq_norms[order]
+        counts = np.bincount(assignments, minlength=self.n_lists)
+        self.offsets = np.concatenate(([0], np.cumsum(counts)))
+
+    def exact_nearest(self, face_encodings):
+        """Exhaustive search over every gallery row."""
+        return GalleryMatcher.nearest(self, face_encodings)
+
+    def nearest(self, face_encodings, n_probe=None):
+        n_probe = max(1, self.n_probe if n_probe is None else n_probe)
+        num_faces = len(face_encodings)
+        if num_faces == 0 or len(self) == 0 or n_probe >= self.n_lists:
+            return self.exact_nearest(face_encodings)
+
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(num_faces, -1)
+        centroid_dist = _sq_distances(queries, self.centroids, self.centroid_sq)
+        probes = np.argpartition(centroid_dist, n_probe - 1, axis=1)[:, :n_probe]
+
+        best_rows = np.full(num_faces, -1, dtype=np.int64)
+        best_distances = np.full(num_faces, np.inf, dtype=np.float32)
+        for i in range(num_faces):
+            rows = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in probes[i]])
+            if len(rows) == 0:
+                continue
+            distances = self.pairwise_distances(queries[i:i + 1], rows)[0]
+            best = np.argmin(distances)
+            best_rows[i] = rows[best]
+            best_distances[i] = distances[best]
+        return best_rows, best_distances
+
+    def list_sizes(self):
+        """Number of gallery rows in each inverted list."""
+        return np.diff(self.offsets)
@@ -0,0 +1,167 @@
+"""
+Gallery compaction: drop redundant encodings and keep a few diverse prototypes per student.
+
+Registration captures several near-identical frames per student and
+re-registrations append more, so galleries accumulate encodings that cost
+matching time and memory without adding accuracy. For each student,
+compact_student groups encodings that lie within dedup_distance of each other
+(one group per pose/lighting condition) and keeps one representative per
+group: the medoid, a real encoding, or the group centroid with centroids=True.
+If more than max_prototypes groups remain, a farthest-point selection keeps
+the most diverse ones, starting from the group nearest the student's mean.
+
+Compact a gallery file and compare size and matching latency from the
+repository root:
+    python -m face_encodings.compaction encodings/encodings.pickle [-o compacted.gallery]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from face_encodings.gallery_format import read_encodings_file, write_encodings_file
+from face_encodings.matcher import build_matcher
+
+# Encodings of the same face closer than this are treated as duplicates; well
+# below the 0.4 match tolerance, so no pose the gallery could match is lost.
+DEDUP_DISTANCE = 0.15
+# Upper bound on encodings kept per student.
+MAX_PROTOTYPES = 8
+
+
+def _group(encodings, dedup_distance):
+    """Greedy leader clustering: each encoding joins the first group whose leader is within dedup_distance."""
+    leaders = []
+    groups = []
+    for i, encoding in enumerate(encodings):
+        if leaders:
+            distances = np.linalg.norm(encodings[leaders] - encoding, axis=1)
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= dedup_distance:
+                groups[nearest].append(i)
+                continue
+        leaders.append(i)
+        groups.append([i])
+    return groups
+
+
+def _representative(encodings, group, centroids):
+    members = encodings[group]
+    if centroids:
+        return members.mean(axis=0)
+    # Medoid: the member with the smallest total distance to the others.
+    distances = np.linalg.norm(members[:, None, :] - members[None, :, :], axis=2)
+    return members[int(np.argmin(distances.sum(axis=1)))]
+
+
+def _farthest_point(points, k):
+    """Indices of k points chosen greedily to be far apart, starting from the one nearest the mean."""
+    chosen = [int(np.argmin(np.linalg.norm(points - points.mean(axis=0), axis=1)))]
+    min_distance = np.linalg.norm(points - points[chosen[0]], axis=1)
+    while len(chosen) < k:
+        next_index = int(np.argmax(min_distance))
+        chosen.append(next_index)
+        min_distance = np.minimum(min_distance, np.linalg.norm(points - points[next_index], axis=1))
+    return sorted(chosen)
+
+
+def compact_student(encodings, max_prototypes=MAX_PROTOTYPES, dedup_distance=DEDUP_DISTANCE, centroids=False):
+    """Return at most max_prototypes diverse encodings representing one student's encodings."""
+    if len(encodings) == 0:
+        return []
+    encodings = np.asarray(encodings, dtype=np.float64)
+    groups = _group(encodings, dedup_distance)
+    representatives = np.array([_representative(encodings, group, centroids) for group in groups])
+    if len(representatives) > max_prototypes:
+        representatives = representatives[_farthest_point(representatives, max_prototypes)]
+    return list(representatives)
+
+
+def compact_gallery(encodings_dict, max_prototypes=MAX_PROTOTYPES, dedup_distance=DEDUP_DISTANCE, centroids=False):
+    """
+    Compact every student of a {student_name: [encoding, ...]} gallery with
+    compact_student. Returns (compacted_dict, report) where report counts
+    students and encodings before and after.
+    """
+    start = time.perf_counter()
+    compacted = {
+        student_name: compact_student(encodings, max_prototypes, dedup_distance, centroids)
+        for student_name, encodings in encodings_dict.items()
+    }
+    before = sum(len(encodings) for encodings in encodings_dict.values())
+    after = sum(len(encodings) for encodings in compacted.values())
+    report = {
+        "students": sum(1 for encodings in compacted.values() if encodings),
+        "encodings_before": before,
+        "encodings_after": after,
+        "max_per_student_before": max((len(e) for e in encodings_dict.values()), default=0),
+        "max_per_student_after": max((len(e) for e in compacted.values()), default=0),
+        "seconds": time.perf_counter() - start,
+    }
+    return compacted, report
+
+
+def compare_matching(before_dict, after_dict, num_queries=1000, noise=0.05, tolerance=0.4, seed=0, index="auto"):
+    """
+    Time matching against both galleries with the same queries (gallery
+    encodings plus noise) and count how often they pick the same student.
+    Returns a dict of per-query latencies in milliseconds and the agreement.
+    """
+    rng = np.random.default_rng(seed)
+    before = build_matcher(before_dict, index=index)
+    after = build_matcher(after_dict, index=index)
+    if len(before) == 0:
+        return {"queries": 0}
+    rows = rng.integers(0, len(before), size=num_queries)
+    queries = np.asarray(before.matrix[rows], dtype=np.float32)
+    queries += rng.normal(0.0, noise / np.sqrt(queries.shape[1]), size=queries.shape).astype(np.float32)
+
+    results = {}
+    for label, matcher in (("before", before), ("after", after)):
+        matcher.match(queries[:10], tolerance)  # warm up
+        start = time.perf_counter()
+        results[label] = matcher.match(queries, tolerance)
+        results[f"{label}_ms_per_query"] = (time.perf_counter() - start) * 1000.0 / num_queries
+    agree = sum(a[0] == b[0] for a, b in zip(results["before"], results["after"]))
+    return {
+        "queries": num_queries,
+        "before_ms_per_query": results["before_ms_per_query"],
+        "after_ms_per_query": results["after_ms_per_query"],
+        "same_student": agree / num_queries,
+    }
+
+
+def format_report(report):
+    lines = [
+        f"Compacted {report['students']} students: {report['encodings_before']} -> {report['encodings_after']} "
+        f"encodings (at most {report['max_per_student_before']} -> {report['max_per_student_after']} per student) "
+        f"in {report['seconds']:.1f}s."
+    ]
+    if report.get("queries"):
+        lines.append(f"Matching: {report['before_ms_per_query']:.3f} -> {report['after_ms_per_query']:.3f} ms/query, "
+                     f"same student for {report['same_student']:.1%} of {report['queries']} queries.")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deduplicate a gallery and keep diverse prototypes per student.")
+    parser.add_argument("source", help="encodings.pickle or a .gallery file")
+    parser.add_argument("-o", "--output", help="Where to write the compacted gallery (default: report only).")
+    parser.add_argument("--max-prototypes", type=int, default=MAX_PROTOTYPES)
+    parser.add_argument("--dedup-distance", type=float, default=DEDUP_DISTANCE)
+    parser.add_argument("--centroids", action="store_true", help="Keep group centroids instead of medoids.")
+    parser.add_argument("--queries", type=int, default=1000, help="Queries for the latency comparison (0 to skip).")
+    args = parser.parse_args()
+
+    encodings_dict = read_encodings_file(args.source)
+    compacted, report = compact_gallery(encodings_dict, args.max_prototypes, args.dedup_distance, args.centroids)
+    if args.queries:
+        report.update(compare_matching(encodings_dict, compacted, num_queries=args.queries))
+    print(format_report(report))
+    if args.output:
+        write_encodings_file(args.output, compacted)
+        print(f"Wrote {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
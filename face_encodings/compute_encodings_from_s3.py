@@ -1,83 +1,229 @@
 import os
+import sys
 import io
 import pickle
-import boto3  # type: ignore
-import face_recognition
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from PIL import Image
 import numpy as np
 
+# Allow running this file directly from the face_encodings directory.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from face_encodings.face_store import FaceStore, content_id_for_bytes, encode_with_store
+from face_encodings.manifest import EncodingManifest, encoder_context
+from face_encodings.s3_utils import get_s3_client
+
 # Set these variables as needed.
 BUCKET_NAME = "attendance-images-upload"
 # Set the prefix for where your images are stored in S3.
 # For example, if your images are under a folder "images/", then:
 IMAGE_PREFIX = "images/"  # Use an empty string ("") if there's no prefix.
 
-def list_image_keys(bucket, prefix=""):
-    """Lists all image object keys in the given S3 bucket under the specified prefix."""
-    s3 = boto3.client("s3")
-    keys = []
+# Parallel builder defaults. Downloads are I/O bound and run on threads
+# sharing one S3 client; encoding is CPU bound and runs on a process pool.
+DOWNLOAD_WORKERS = 16
+# Images downloaded or being encoded at any moment; bounds memory held in
+# image bytes no matter how large the bucket is.
+MAX_IN_FLIGHT = 64
+PROGRESS_INTERVAL = 10.0  # seconds between progress lines
+# Per-image record of S3 keys, ETags and encodings (see face_encodings/manifest.py).
+MANIFEST_FILE = "../encodings/s3_encodings_manifest.json"
+# Aligned faces found on the first encode of each image (see face_store.py).
+FACE_STORE_DIR = "../encodings/face_chips"
+
+def list_image_objects(bucket, prefix=""):
+    """Returns {key: ETag} for all image objects in the given S3 bucket under the specified prefix."""
+    s3 = get_s3_client()
+    objects = {}
     paginator = s3.get_paginator("list_objects_v2")
     pages = paginator.paginate(Bucket=bucket, Prefix=prefix)
     for page in pages:
         for obj in page.get("Contents", []):
             key = obj["Key"]
             if key.lower().endswith((".jpg", ".jpeg", ".png")):
-                keys.append(key)
-    return keys
+                objects[key] = obj["ETag"]
+    return objects
+
+def list_image_keys(bucket, prefix=""):
+    """Lists all image object keys in the given S3 bucket under the specified prefix."""
+    return list(list_image_objects(bucket, prefix))
+
+def decode_image_bytes(image_bytes):
+    """Decode image bytes to an RGB array."""
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return np.array(image)
+
+def encode_image_bytes(image_bytes, face_store_dir=FACE_STORE_DIR):
+    """
+    Return the encoding of the first face in an image, or None if no face is found.
+    Faces are kept in the face store (see face_store.py) under the SHA-256 of
+    the bytes, so an image seen before (here or by a local build) is encoded
+    without decoding it or detecting the face again.
+    """
+    store = FaceStore(face_store_dir) if face_store_dir else None
+    content_id = content_id_for_bytes(image_bytes) if store is not None else None
+    return encode_with_store(store, content_id, lambda: decode_image_bytes(image_bytes))
+
+def download_image(bucket, key):
+    """Download an object's bytes with the shared S3 client."""
+    response = get_s3_client().get_object(Bucket=bucket, Key=key)
+    return response["Body"].read()
 
 def get_encoding_for_image(bucket, key):
     """Streams an image from S3, computes its face encoding, and returns the encoding."""
-    s3 = boto3.client("s3")
     try:
-        response = s3.get_object(Bucket=bucket, Key=key)
-        image_data = io.BytesIO(response["Body"].read())
-        image = Image.open(image_data)
-        if image.mode != "RGB":
-            image = image.convert("RGB")
-        np_image = np.array(image)
-        encodings = face_recognition.face_encodings(np_image)
-        if encodings:
-            return encodings[0]
-        else:
-            return None
+        return encode_image_bytes(download_image(bucket, key))
     except Exception as e:
         print(f"Error processing {key}: {e}")
         return None
 
-def compute_encodings():
+def student_name_for_key(key, prefix=IMAGE_PREFIX):
+    """
+    Return the student name for an image key, or None if the key does not match
+    the expected <prefix>StudentName/filename.jpg layout.
+    """
+    # Remove the prefix from the key if it exists.
+    if prefix and key.startswith(prefix):
+        key = key[len(prefix):]
+    parts = key.split("/")
+    if len(parts) < 2:
+        return None
+    return parts[0]
+
+def encode_keys(keys, bucket=BUCKET_NAME, download_workers=DOWNLOAD_WORKERS, encode_workers=None,
+                max_in_flight=MAX_IN_FLIGHT, progress_interval=PROGRESS_INTERVAL):
+    """
+    Download and encode many S3 images in parallel.
+
+    Up to download_workers threads fetch objects with the shared S3 client and
+    hand the bytes to encode_workers processes (default: one per CPU). At most
+    max_in_flight images are downloading or encoding at once. Returns
+    (results, errors): results maps each key to its encoding, or None if the
+    image has no face; errors maps keys that could not be downloaded or
+    decoded to the error.
+    """
+    total = len(keys)
+    results = {}
+    errors = {}
+    done = 0
+    start = last_report = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=download_workers) as downloads, \
+            ProcessPoolExecutor(max_workers=encode_workers, mp_context=encoder_context()) as encoders:
+        downloading = {}
+        encoding = {}
+        next_key = iter(keys)
+        exhausted = False
+        while True:
+            while not exhausted and len(downloading) + len(encoding) < max_in_flight:
+                key = next(next_key, None)
+                if key is None:
+                    exhausted = True
+                    break
+                downloading[downloads.submit(download_image, bucket, key)] = key
+            if not downloading and not encoding:
+                break
+            finished, _ = wait(list(downloading) + list(encoding), return_when=FIRST_COMPLETED)
+            for future in finished:
+                if future in downloading:
+                    key = downloading.pop(future)
+                    try:
+                        encoding[encoders.submit(encode_image_bytes, future.result())] = key
+                    except Exception as e:
+                        errors[key] = f"download failed: {e}"
+                        done += 1
+                    continue
+                key = encoding.pop(future)
+                done += 1
+                try:
+                    results[key] = future.result()
+                except Exception as e:
+                    errors[key] = f"encoding failed: {e}"
+            now = time.monotonic()
+            if now - last_report >= progress_interval:
+                rate = done / (now - start)
+                eta = (total - done) / rate if rate else float("inf")
+                print(f"Encoded {done}/{total} images ({rate:.1f}/s, ETA {eta:.0f}s, {len(errors)} errors).")
+                last_report = now
+
+    elapsed = time.monotonic() - start
+    print(f"Encoded {len(results)} of {total} images in {elapsed:.1f}s "
+          f"({total / elapsed if elapsed else 0:.1f} images/s, {len(errors)} errors).")
+    return results, errors
+
+def build_encodings(keys, bucket=BUCKET_NAME, prefix=IMAGE_PREFIX, **options):
+    """
+    Encode `keys` with encode_keys and group them by student. Returns
+    (encodings_dict, errors); keys that do not match <StudentName>/<filename>
+    or whose image has no face are reported in errors too. Encodings keep the
+    order of `keys` for each student.
+    """
+    work = []
+    errors = {}
+    for key in keys:
+        if student_name_for_key(key, prefix) is None:
+            errors[key] = "key does not match <StudentName>/<filename>"
+        else:
+            work.append(key)
+    results, encode_errors = encode_keys(work, bucket, **options)
+    errors.update(encode_errors)
+    encodings_dict = {}
+    for key in work:
+        if key not in results:
+            continue
+        if results[key] is None:
+            errors[key] = "no face found"
+        else:
+            encodings_dict.setdefault(student_name_for_key(key, prefix), []).append(results[key])
+    return encodings_dict, errors
+
+def update_manifest(manifest, bucket=BUCKET_NAME, prefix=IMAGE_PREFIX, **options):
+    """
+    Bring an EncodingManifest up to date with the images in S3, keyed by object
+    key and ETag: only new or changed objects are downloaded and encoded, and
+    deleted ones are dropped. Failed keys are left out of the manifest so the
+    next run retries them. Returns (changed, removed, errors).
+    """
+    current = {}
+    errors = {}
+    for key, etag in list_image_objects(bucket, prefix).items():
+        student_name = student_name_for_key(key, prefix)
+        if student_name is None:
+            errors[key] = "key does not match <StudentName>/<filename>"
+        else:
+            current[key] = (student_name, etag)
+    changed, removed = manifest.diff(current)
+    manifest.remove(removed)
+    print(f"{len(current)} images in S3: {len(changed)} new or changed, {len(removed)} deleted.")
+    results, encode_errors = encode_keys(changed, bucket, **options)
+    errors.update(encode_errors)
+    for key, encoding in results.items():
+        student_name, etag = current[key]
+        manifest.set(key, student_name, etag, encoding)
+    # Failed keys are neither recorded nor kept with stale content.
+    manifest.remove(encode_errors)
+    return changed, removed, errors
+
+def compute_encodings(manifest_path=MANIFEST_FILE):
     """
     Streams images from S3, computes face encodings, and builds a dictionary.
     The dictionary maps student names (derived from folder names) to a list of encodings.
-    
+
     If IMAGE_PREFIX is provided (e.g., "images/"), the code removes that prefix before splitting
     the key. For example, if an object key is "images/JohnDoe/img1.jpg", then after removing the prefix,
     it splits "JohnDoe/img1.jpg" and takes "JohnDoe" as the student name.
+    Only images whose ETag is not in the manifest at manifest_path are downloaded
+    and encoded (in parallel; see encode_keys).
     """
-    encodings_dict = {}
-    keys = list_image_keys(BUCKET_NAME, IMAGE_PREFIX)
-    print(f"Found {len(keys)} image keys in bucket '{BUCKET_NAME}' with prefix '{IMAGE_PREFIX}'.")
-    
-    for key in keys:
-        # Remove the prefix from the key if it exists.
-        if IMAGE_PREFIX and key.startswith(IMAGE_PREFIX):
-            key_without_prefix = key[len(IMAGE_PREFIX):]
-        else:
-            key_without_prefix = key
-
-        # Assume the key format is: StudentName/filename.jpg
-        parts = key_without_prefix.split("/")
-        if len(parts) < 2:
-            print(f"Skipping key {key} because it doesn't match expected format.")
-            continue
-        student_name = parts[0]
-        
-        encoding = get_encoding_for_image(BUCKET_NAME, key)
-        if encoding is not None:
-            encodings_dict.setdefault(student_name, []).append(encoding)
-            print(f"Processed encoding for {key}.")
-        else:
-            print(f"No encoding found for {key}.")
-    return encodings_dict
+    manifest = EncodingManifest.load(manifest_path)
+    changed, removed, errors = update_manifest(manifest)
+    for key, error in sorted(errors.items()):
+        print(f"Skipped {key}: {error}")
+    if changed or removed:
+        manifest.save(manifest_path)
+    return manifest.to_encodings_dict()
 
 def main():
     encodings_dict = compute_encodings()
@@ -2,12 +2,42 @@ import os
 import pickle
 import cv2
 import face_recognition
-import boto3 #type: ignore
-import pickle
-import io
+from botocore.exceptions import ClientError # type: ignore
+from face_encodings.face_store import FaceStore, encode_with_store
+from face_encodings.gallery_cache import GalleryCache
+from face_encodings.gallery_format import read_encodings_file, write_encodings_file
+from face_encodings.manifest import (
+    EncodingManifest,
+    ManifestJournal,
+    file_sha256,
+    journal_path_for,
+    manifest_path_for,
+    sync_local_manifest,
+)
+from face_encodings.matcher import build_matcher
+from face_encodings.s3_utils import get_s3_client
+from face_encodings.sharded_gallery import (
+    MANIFEST_KEY as SHARD_MANIFEST_KEY,
+    load_cached_sharded_gallery,
+    sync_sharded_gallery,
+)
 
 BUCKET_NAME = "attendance-images-upload"
 PICKLE_S3_KEY = "pickle/encodings.pickle"
+# Load PICKLE_S3_KEY when S3 has no newer gallery. Unpickling can run arbitrary
+# code, so this is off; convert a remaining pickle once with
+# `python face_encodings/upload_encodings_to_s3.py --convert-s3-pickle`, or set
+# this to True only while older writers still publish nothing but the pickle.
+ALLOW_LEGACY_PICKLE = False
+# Binary gallery (see gallery_format.py); preferred over the pickle when both exist.
+GALLERY_S3_KEY = "pickle/encodings.gallery"
+# Local cache of the sharded gallery (see sharded_gallery.py), which is
+# preferred over both single-object formats when its manifest exists.
+SHARD_CACHE_DIR = '../encodings/shards'
+# Local cache of the single-object gallery and its ETag (see gallery_cache.py).
+GALLERY_CACHE_DIR = '../encodings/cache'
+# Aligned faces found on the first encode of each image (see face_store.py).
+FACE_STORE_DIR = '../encodings/face_chips'
 
 def get_latest_modification_time(directory):
     """
@@ -22,78 +52,204 @@ def get_latest_modification_time(directory):
                 latest_time = file_time
     return latest_time
 
-def compute_face_encodings(known_faces_dir):
-    """
-    Iterate through the known_faces directory, compute face encodings for each student,
-    and store them in a dictionary where each key is the student's name and the value
-    is a list of their face encodings.
-    """
-    encodings = {}  # {student_name: [encoding1, encoding2, ...]}
-    
-    for student_name in os.listdir(known_faces_dir):
-        student_folder = os.path.join(known_faces_dir, student_name)
-        if not os.path.isdir(student_folder):
-            continue  # Skip non-directory files
-        encodings[student_name] = []
-        
-        for image_file in os.listdir(student_folder):
-            image_path = os.path.join(student_folder, image_file)
-            image = cv2.imread(image_path)
-            if image is None:
-                continue  # Skip unreadable images
-            # Convert the image from BGR (OpenCV format) to RGB (face_recognition format)
-            rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            face_encs = face_recognition.face_encodings(rgb_image)
-            if face_encs:
-                encodings[student_name].append(face_encs[0])
-    
-    return encodings
+def read_rgb_image(image_path):
+    """Read an image file as RGB, or None if it cannot be read."""
+    image = cv2.imread(image_path)
+    if image is None:
+        return None  # Unreadable image
+    # Convert the image from BGR (OpenCV format) to RGB (face_recognition format)
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+def encode_image_file(image_path, face_store_dir=FACE_STORE_DIR):
+    """
+    Return the encoding of the first face in an image file, or None if there is none.
+    The aligned face found the first time is kept in the face store (see
+    face_store.py) under the file's SHA-256, so re-encoding the same photo
+    skips decoding it and detecting the face. face_store_dir=None disables the store.
+    """
+    if face_store_dir is None:
+        return encode_with_store(None, None, lambda: read_rgb_image(image_path))
+    return encode_with_store(FaceStore(face_store_dir), file_sha256(image_path), lambda: read_rgb_image(image_path))
+
+def update_local_manifest(known_faces_dir, manifest_path, workers=None):
+    """
+    Bring the manifest at manifest_path up to date with known_faces_dir and save it.
+    New or changed images are encoded on `workers` processes (default: one per
+    CPU) and each finished image is checkpointed to a journal next to the
+    manifest, so a build that crashes or is interrupted resumes where it
+    stopped. Returns (manifest, changed, removed, resumed).
+    """
+    manifest = EncodingManifest.load(manifest_path)
+    journal = ManifestJournal(journal_path_for(manifest_path))
+    resumed = journal.replay(manifest)
+    if resumed:
+        print(f"Resuming an interrupted build: {resumed} image(s) already encoded.")
+    elif not len(manifest):
+        print("No encoding manifest found; encoding every image once.")
+    try:
+        changed, removed, touched = sync_local_manifest(manifest, known_faces_dir, encode_image_file,
+                                                        workers, journal)
+    finally:
+        journal.close()
+    if changed or removed or touched or resumed:
+        manifest.save(manifest_path)
+    journal.discard()
+    return manifest, changed, removed, resumed
+
+def compute_face_encodings(known_faces_dir, workers=None, checkpoint_path=None):
+    """
+    Compute face encodings for every image in known_faces_dir/<student>/ on a
+    process pool and return {student_name: [encoding1, encoding2, ...]}.
+    Results are streamed back one encoding at a time; decoded images never
+    leave the workers. With checkpoint_path, a manifest is kept there (see
+    update_local_manifest) so an interrupted build resumes where it stopped.
+    """
+    if checkpoint_path is None:
+        manifest = EncodingManifest()
+        sync_local_manifest(manifest, known_faces_dir, encode_image_file, workers)
+    else:
+        manifest = update_local_manifest(known_faces_dir, checkpoint_path, workers)[0]
+    return manifest.to_encodings_dict()
 
-def load_or_compute_encodings(known_faces_dir='../known_faces', pickle_path='../encodings/encodings.pickle'):
+def load_or_compute_encodings(known_faces_dir='../known_faces', pickle_path='../encodings/encodings.pickle',
+                              workers=None):
     """
-    Load precomputed face encodings from a pickle file if available and up-to-date.
-    Otherwise, compute the encodings and save them to the pickle file.
+    Load face encodings, re-encoding only the images that changed.
+
+    A per-image manifest next to the pickle (see face_encodings/manifest.py)
+    records each image's SHA-256 and encoding. Images that were added or whose
+    content changed are encoded on `workers` processes, deleted images are
+    dropped, and the pickle is rewritten from the manifest. When nothing
+    changed, the pickle is loaded as is. An interrupted build resumes from its
+    checkpoint journal (see update_local_manifest).
+    A pickle_path ending in .gallery uses the binary gallery format instead.
     """
-    recompute = False
-    if os.path.exists(pickle_path):
+    manifest, changed, removed, resumed = update_local_manifest(known_faces_dir, manifest_path_for(pickle_path),
+                                                                workers)
+
+    if not changed and not removed and not resumed and os.path.exists(pickle_path):
         try:
-            with open(pickle_path, 'rb') as f:
-                encodings = pickle.load(f)
+            encodings = read_encodings_file(pickle_path)
             print("Encodings loaded from pickle file.")
-
-            # Check modification times
-            pickle_mod_time = os.path.getmtime(pickle_path)
-            faces_mod_time = get_latest_modification_time(known_faces_dir)
-            if faces_mod_time > pickle_mod_time:
-                print("New images detected. Recomputing encodings...")
-                recompute = True
+            return encodings
         except (EOFError, pickle.UnpicklingError, Exception) as e:
             print(f"Error loading pickle file: {e}")
-            recompute = True
-    else:
-        recompute = True
-
-    if recompute:
-        print("Computing face encodings from images...")
-        encodings = compute_face_encodings(known_faces_dir)
-        os.makedirs(os.path.dirname(pickle_path), exist_ok=True)
-        with open(pickle_path, 'wb') as f:
-            pickle.dump(encodings, f)
-        print("Encodings computed and saved to pickle file.")
-    
+
+    print(f"Encoded {len(changed)} new or changed image(s), dropped {len(removed)} deleted image(s).")
+    encodings = manifest.to_encodings_dict()
+    os.makedirs(os.path.dirname(pickle_path), exist_ok=True)
+    write_encodings_file(pickle_path, encodings)
+    print("Encodings saved to pickle file.")
     return encodings
 
-def load_known_encodings():
-    """Load face encodings from a pickle file stored in S3."""
-    s3_client = boto3.client('s3')
+def _gallery_s3_keys():
+    return (GALLERY_S3_KEY, PICKLE_S3_KEY) if ALLOW_LEGACY_PICKLE else (GALLERY_S3_KEY,)
+
+def _gallery_cache(cache_dir):
+    return GalleryCache(BUCKET_NAME, _gallery_s3_keys(), cache_dir, allow_pickle=ALLOW_LEGACY_PICKLE)
+
+def load_known_gallery_with_version(shard_cache_dir=SHARD_CACHE_DIR, cache_dir=GALLERY_CACHE_DIR):
+    """
+    Load the gallery stored in S3 as a gallery_format.Gallery. Returns
+    (Gallery, version), where version is the ETag get_s3_gallery_version
+    reports for the copy actually loaded (an older one when S3 could not be
+    reached and a cached copy was used), or (None, None) if neither S3 nor the
+    local caches have a gallery.
+    A sharded gallery (see sharded_gallery.py) is preferred and synced into
+    shard_cache_dir, downloading only shards that changed since the last sync.
+    Otherwise the binary gallery (or, with ALLOW_LEGACY_PICKLE, the legacy
+    pickle) is kept in cache_dir with its ETag and only re-downloaded when it
+    changed (see gallery_cache.py). When S3 cannot be reached, the cached copy
+    is used.
+    """
     try:
-        # Download the pickle file as a byte stream
-        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=PICKLE_S3_KEY)
-        pickle_data = response['Body'].read()
-        # Deserialize the pickle data into a dictionary
-        encodings_dict = pickle.loads(pickle_data)
-        print("Loaded encodings from S3 successfully.")
-        return encodings_dict
+        gallery, stats = sync_sharded_gallery(shard_cache_dir, bucket=BUCKET_NAME)
+        if gallery is not None:
+            print("Loaded encodings from S3 successfully.")
+            return gallery, stats["manifest_etag"]
+        reachable = True
     except Exception as e:
-        print(f"Error loading encodings from S3: {e}")
+        print(f"Error syncing encodings from S3: {e}")
+        gallery, version = load_cached_sharded_gallery(shard_cache_dir)
+        if gallery is not None:
+            print("Loaded encodings from the local shard cache.")
+            return gallery, version
+        reachable = False
+    # Offline, skip a second round of connection retries and use the cache directly.
+    gallery, version = _gallery_cache(cache_dir).load(refresh=reachable)
+    if gallery is None:
+        print("No encodings available from S3 or the local cache.")
+        if not ALLOW_LEGACY_PICKLE:
+            print(f"If S3 only has the legacy {PICKLE_S3_KEY}, convert it once with "
+                  "`python face_encodings/upload_encodings_to_s3.py --convert-s3-pickle`.")
+        return None, None
+    print("Loaded encodings successfully.")
+    return gallery, version
+
+def load_known_gallery(shard_cache_dir=SHARD_CACHE_DIR, cache_dir=GALLERY_CACHE_DIR):
+    """Load the gallery stored in S3 (see load_known_gallery_with_version), or None if there is none."""
+    return load_known_gallery_with_version(shard_cache_dir, cache_dir)[0]
+
+def load_cached_gallery(shard_cache_dir=SHARD_CACHE_DIR, cache_dir=GALLERY_CACHE_DIR):
+    """
+    Load the last gallery synced from S3 without contacting S3, for a fast
+    start. Returns (Gallery, version) where version is the ETag
+    get_s3_gallery_version reports for that copy, or (None, None).
+    """
+    gallery, version = load_cached_sharded_gallery(shard_cache_dir)
+    if gallery is None:
+        gallery, version = _gallery_cache(cache_dir).load_cached()
+    return gallery, version
+
+def load_known_encodings():
+    """Load face encodings from the gallery (binary format or pickle) stored in S3."""
+    gallery = load_known_gallery()
+    if gallery is None:
         return {}
+    return gallery.to_encodings_dict()
+
+def get_s3_gallery_version():
+    """
+    Return the ETag of the S3 gallery (shard manifest, else the binary
+    gallery, else with ALLOW_LEGACY_PICKLE the pickle) without downloading it,
+    or None if it cannot be determined.
+    """
+    s3_client = get_s3_client()
+    for key in (SHARD_MANIFEST_KEY,) + _gallery_s3_keys():
+        try:
+            response = s3_client.head_object(Bucket=BUCKET_NAME, Key=key)
+            return response['ETag']
+        except ClientError as e:
+            if e.response['Error']['Code'] in ("404", "NoSuchKey"):
+                continue
+            print(f"Error checking encodings in S3: {e}")
+            return None
+        except Exception as e:
+            print(f"Error checking encodings in S3: {e}")
+            return None
+    return None
+
+def get_local_gallery_version(pickle_path='../encodings/encodings.pickle'):
+    """Return the modification time of a local gallery pickle, or None if it is missing."""
+    try:
+        return os.path.getmtime(pickle_path)
+    except OSError:
+        return None
+
+def load_known_matcher(index="auto", **index_options):
+    """
+    Load face encodings from S3 and build the matching index over them.
+    Returns None if no encodings could be loaded.
+    """
+    gallery = load_known_gallery()
+    if not gallery:
+        return None
+    return build_matcher(gallery, index=index, **index_options)
+
+def load_or_compute_matcher(known_faces_dir='../known_faces', pickle_path='../encodings/encodings.pickle',
+                            index="auto", **index_options):
+    """Local counterpart of load_known_matcher built on load_or_compute_encodings."""
+    encodings_dict = load_or_compute_encodings(known_faces_dir, pickle_path)
+    if not encodings_dict:
+        return None
+    return build_matcher(encodings_dict, index=index, **index_options)
@@ -0,0 +1,84 @@
+"""
+Incremental enrollment: add newly captured images to the galleries without a rebuild.
+
+The local gallery (the per-image manifest and encodings.pickle written by
+data_preparation.load_or_compute_encodings) gets the new entries first, then
+the S3 sharded gallery gets the new encodings appended to the shards of the
+students concerned (see sharded_gallery.add_to_sharded_gallery). Running
+refreshers pick both up on their next version check.
+"""
+import os
+import time
+
+from face_encodings.face_store import FaceStore, detect_face_chip, encode_face_chip
+from face_encodings.gallery_format import write_encodings_file
+from face_encodings.manifest import EncodingManifest, file_sha256, manifest_path_for
+from face_encodings.sharded_gallery import BUCKET_NAME, add_to_sharded_gallery
+
+KNOWN_FACES_DIR = '../known_faces'
+PICKLE_PATH = '../encodings/encodings.pickle'
+FACE_STORE_DIR = '../encodings/face_chips'
+
+
+def encode_capture(image_path, rgb_image, face_location, face_store_dir=FACE_STORE_DIR):
+    """
+    Encode the face at face_location (found when the image was captured) without
+    detecting it again, and keep its chip in the face store under the saved
+    file's SHA-256 so later rebuilds reuse it.
+    """
+    chip, landmarks = detect_face_chip(rgb_image, face_location)
+    if face_store_dir:
+        FaceStore(face_store_dir).put(file_sha256(image_path), chip, landmarks)
+    return encode_face_chip(chip)
+
+
+def enroll_local(images, known_faces_dir=KNOWN_FACES_DIR, pickle_path=PICKLE_PATH):
+    """
+    Record images [(image_id, student_name, encoding), ...] saved under
+    known_faces_dir in the local manifest and rewrite the gallery file from it.
+    Returns False (and leaves both alone) if the local gallery has never been
+    built; the next load_or_compute_encodings encodes everything anyway.
+    """
+    manifest_path = manifest_path_for(pickle_path)
+    manifest = EncodingManifest.load(manifest_path)
+    if not len(manifest):
+        return False
+    for image_id, student_name, encoding in images:
+        image_path = os.path.join(known_faces_dir, image_id)
+        st = os.stat(image_path)
+        manifest.set(image_id, student_name, file_sha256(image_path), encoding, size=st.st_size, mtime=st.st_mtime)
+    manifest.save(manifest_path)
+    write_encodings_file(pickle_path, manifest.to_encodings_dict())
+    return True
+
+
+def enroll_images(images, known_faces_dir=KNOWN_FACES_DIR, pickle_path=PICKLE_PATH, upload=True,
+                  bucket=BUCKET_NAME):
+    """
+    Add images [(image_id, student_name, encoding), ...] to the local gallery
+    and then, with upload=True, to the S3 sharded gallery. Returns a stats dict;
+    a gallery that was not updated is reported in it rather than raised, since
+    the images are picked up by the next src/recomputation.py run anyway:
+    "local" is False with the reason in "local_skipped", and "s3_shards" is
+    None with the reason in "s3_skipped" or the failure in "s3_error".
+    """
+    start = time.perf_counter()
+    stats = {"images": len(images), "local": enroll_local(images, known_faces_dir, pickle_path),
+             "local_skipped": None, "s3_shards": None, "s3_skipped": None, "s3_error": None}
+    if not stats["local"]:
+        stats["local_skipped"] = f"the local gallery ({pickle_path}) has not been built yet"
+    if not upload:
+        stats["s3_skipped"] = "S3 upload is disabled"
+    else:
+        new_encodings = {}
+        for _, student_name, encoding in images:
+            new_encodings.setdefault(student_name, []).append(encoding)
+        try:
+            stats["s3_shards"] = add_to_sharded_gallery(new_encodings, bucket=bucket)
+        except Exception as e:
+            stats["s3_error"] = str(e)
+        else:
+            if stats["s3_shards"] is None:
+                stats["s3_skipped"] = f"s3://{bucket} has no sharded gallery yet"
+    stats["seconds"] = time.perf_counter() - start
+    return stats
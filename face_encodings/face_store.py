@@ -0,0 +1,188 @@
+"""
+Detect-once store of enrollment faces.
+
+Locating the face (HOG over the full-resolution photo) is most of the cost of
+encoding an enrollment image, and every gallery rebuild used to repeat it. The
+first time an image is encoded, its first face is located, its 5-point
+landmarks are found and the face is aligned into the 150x150 chip dlib's
+encoder works on. The chip and landmarks are stored under the SHA-256 of the
+image bytes, so later rebuilds of the same photo (local, S3 or recomputation)
+encode the stored chip directly, without decoding the photo or detecting the
+face again. Images without a face are remembered as such.
+
+A stored chip encodes to the same descriptor face_recognition.face_encodings
+computes from the full image with its default ("small") landmark model.
+
+Pre-populate the store from the repository root:
+    python -m face_encodings.face_store known_faces [--workers N]
+"""
+import argparse
+import hashlib
+import io
+import os
+import time
+import zipfile
+from functools import partial
+
+import cv2
+import dlib  # type: ignore
+import face_recognition
+import face_recognition.api as face_recognition_api
+import numpy as np
+
+from face_encodings.manifest import file_sha256, iter_encoded, scan_local_images
+
+CHIP_SIZE = 150
+CHIP_PADDING = 0.25  # what dlib's descriptor uses internally
+NUM_JITTERS = 1  # face_recognition.face_encodings default
+DEFAULT_STORE_DIR = "../encodings/face_chips"
+
+
+def content_id_for_bytes(data):
+    """Store key of an image given its bytes (matches file_sha256 of the same file)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class FaceStore:
+    """
+    Directory of compressed .npz entries, one per image content id:
+    store_dir/<first two hex digits>/<content id>.npz holding the uint8 RGB
+    chip and the landmarks in image coordinates (both empty for no face).
+    Entries are written atomically, so processes can share a store.
+    """
+
+    def __init__(self, store_dir=DEFAULT_STORE_DIR):
+        self.store_dir = store_dir
+
+    def _path(self, content_id):
+        return os.path.join(self.store_dir, content_id[:2], content_id + ".npz")
+
+    def __contains__(self, content_id):
+        return os.path.exists(self._path(content_id))
+
+    def get(self, content_id):
+        """
+        Return (chip, landmarks) for a stored image, (None, None) for an image
+        stored as having no face, or None if the image is not in the store.
+        """
+        try:
+            with np.load(self._path(content_id)) as entry:
+                chip, landmarks = entry["chip"], entry["landmarks"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print(f"Ignoring unreadable face store entry {content_id}: {e}")
+            return None
+        if chip.size == 0:
+            return None, None
+        return chip, landmarks
+
+    def put(self, content_id, chip, landmarks):
+        """Store an image's chip and landmarks; pass None for both if it has no face."""
+        if chip is None:
+            chip = np.empty((0, 0, 3), dtype=np.uint8)
+            landmarks = np.empty((0, 2), dtype=np.int32)
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, chip=chip, landmarks=landmarks)
+        path = self._path(content_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(buffer.getvalue())
+        os.replace(tmp_path, path)
+
+
+def detect_face_chip(rgb_image, face_location=None):
+    """
+    Align the first face in an RGB image (or the face at face_location, a
+    (top, right, bottom, left) box found earlier, skipping detection).
+    Returns (chip, landmarks), or (None, None) if there is no face.
+    """
+    if face_location is None:
+        face_locations = face_recognition.face_locations(rgb_image)
+        if not face_locations:
+            return None, None
+        face_location = face_locations[0]
+    top, right, bottom, left = face_location
+    shape = face_recognition_api.pose_predictor_5_point(rgb_image, dlib.rectangle(left, top, right, bottom))
+    chip = dlib.get_face_chip(rgb_image, shape, size=CHIP_SIZE, padding=CHIP_PADDING)
+    landmarks = np.array([(point.x, point.y) for point in shape.parts()], dtype=np.int32)
+    return chip, landmarks
+
+
+def encode_face_chip(chip, num_jitters=NUM_JITTERS):
+    """128-d encoding of an aligned face chip."""
+    return np.array(face_recognition_api.face_encoder.compute_face_descriptor(chip, num_jitters))
+
+
+def encode_with_store(store, content_id, load_rgb_image, num_jitters=NUM_JITTERS):
+    """
+    Return the encoding of an image's first face, or None if it has none.
+    load_rgb_image() is only called when the image is not in `store` yet (or
+    store is None); unreadable images (load_rgb_image() returns None) are not stored.
+    """
+    entry = store.get(content_id) if store is not None else None
+    if entry is None:
+        rgb_image = load_rgb_image()
+        if rgb_image is None:
+            return None
+        entry = detect_face_chip(rgb_image)
+        if store is not None:
+            store.put(content_id, *entry)
+    chip, _ = entry
+    if chip is None:
+        return None
+    return encode_face_chip(chip, num_jitters)
+
+
+def preprocess_image_file(image_path, store_dir=DEFAULT_STORE_DIR):
+    """Add one image file to the store unless it is already there. Returns True if it has a face."""
+    store = FaceStore(store_dir)
+    content_id = file_sha256(image_path)
+    entry = store.get(content_id)
+    if entry is None:
+        image = cv2.imread(image_path)
+        if image is None:
+            return False  # Unreadable image
+        entry = detect_face_chip(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        store.put(content_id, *entry)
+    return entry[0] is not None
+
+
+def preprocess_faces_dir(known_faces_dir, store_dir=DEFAULT_STORE_DIR, workers=None):
+    """
+    Detect faces once for every image in known_faces_dir/<student>/ that is not
+    in the store yet, on `workers` processes. Returns (added, no_face, errors).
+    """
+    store = FaceStore(store_dir)
+    current, _ = scan_local_images(known_faces_dir)
+    paths = [os.path.join(known_faces_dir, image_id)
+             for image_id, (_, content_id) in current.items() if content_id not in store]
+    print(f"{len(current)} images, {len(current) - len(paths)} already in the face store.")
+    added = no_face = errors = 0
+    start = time.perf_counter()
+    worker = partial(preprocess_image_file, store_dir=store_dir)
+    for path, has_face, error in iter_encoded(paths, worker, workers):
+        if error is not None:
+            print(f"Error preprocessing {path}: {error}")
+            errors += 1
+        elif has_face:
+            added += 1
+        else:
+            no_face += 1
+    print(f"Stored {added} faces ({no_face} images without a face, {errors} errors) "
+          f"in {time.perf_counter() - start:.1f}s.")
+    return added, no_face, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detect faces once and store aligned chips for later encoding.")
+    parser.add_argument("known_faces_dir")
+    parser.add_argument("--store-dir", default=DEFAULT_STORE_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="Processes to use (default: one per CPU).")
+    args = parser.parse_args()
+    preprocess_faces_dir(args.known_faces_dir, args.store_dir, args.workers)
+
+
+if __name__ == "__main__":
+    main()
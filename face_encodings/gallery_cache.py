@@ -0,0 +1,128 @@
+"""
+On-disk cache of the single-object S3 gallery (encodings.gallery, or the legacy
+encodings.pickle where explicitly allowed) together with the ETag it was
+downloaded with.
+
+refresh() asks S3 for the object with If-None-Match, so an unchanged gallery
+costs one 304 response instead of a full download. The cache always holds the
+binary gallery format, so every start is a memory-mapped load. A pickle is
+unpickled (which can run arbitrary code) only with allow_pickle=True; convert
+it in S3 once instead (upload_encodings_to_s3.py --convert-s3-pickle). load()
+falls back to the cached copy when S3 cannot be reached.
+"""
+import json
+import os
+import pickle
+import time
+
+from botocore.exceptions import ClientError  # type: ignore
+
+from face_encodings.gallery_format import (
+    GalleryFormatError,
+    gallery_from_bytes,
+    gallery_to_bytes,
+    is_gallery_data,
+    load_gallery,
+)
+from face_encodings.s3_utils import get_s3_client, is_not_modified
+
+DEFAULT_CACHE_DIR = "../encodings/cache"
+CACHE_GALLERY_FILE = "encodings.gallery"
+CACHE_META_FILE = "encodings_meta.json"
+
+
+def _write_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class GalleryCache:
+    """
+    Local copy of the first of `keys` that exists in `bucket`. The metadata
+    file records the bucket, key and ETag the cached gallery came from.
+    Objects that are not binary galleries are rejected unless allow_pickle.
+    """
+
+    def __init__(self, bucket, keys, cache_dir=DEFAULT_CACHE_DIR, allow_pickle=False):
+        self.bucket = bucket
+        self.keys = tuple(keys)
+        self.cache_dir = cache_dir
+        self.allow_pickle = allow_pickle
+        self.gallery_path = os.path.join(cache_dir, CACHE_GALLERY_FILE)
+        self.meta_path = os.path.join(cache_dir, CACHE_META_FILE)
+
+    def read_meta(self):
+        """Metadata of the cached gallery, or None if there is no usable cached copy."""
+        if not os.path.exists(self.gallery_path):
+            return None
+        try:
+            with open(self.meta_path, "r") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return meta if meta.get("bucket") == self.bucket else None
+
+    def load_cached(self):
+        """Return (Gallery, ETag) from the cache without contacting S3, or (None, None)."""
+        meta = self.read_meta()
+        if meta is None:
+            return None, None
+        try:
+            return load_gallery(self.gallery_path), meta["etag"]
+        except (OSError, GalleryFormatError) as e:
+            print(f"Ignoring unreadable cached gallery {self.gallery_path}: {e}")
+            return None, None
+
+    def refresh(self):
+        """
+        Bring the cache up to date with S3. Returns True if a new gallery was
+        downloaded and False if the cached copy is current. Raises
+        FileNotFoundError if none of the keys exist, and S3 errors as they are.
+        """
+        s3_client = get_s3_client()
+        meta = self.read_meta()
+        for key in self.keys:
+            conditions = {}
+            if meta is not None and meta.get("key") == key:
+                conditions["IfNoneMatch"] = meta["etag"]
+            try:
+                response = s3_client.get_object(Bucket=self.bucket, Key=key, **conditions)
+            except s3_client.exceptions.NoSuchKey:
+                continue
+            except ClientError as e:
+                if is_not_modified(e):
+                    return False
+                raise
+            data = response["Body"].read()
+            if is_gallery_data(data):
+                gallery_from_bytes(data)  # verify the checksum before caching
+            elif self.allow_pickle:
+                data = gallery_to_bytes(pickle.loads(data))
+            else:
+                raise GalleryFormatError(f"s3://{self.bucket}/{key} is not a binary gallery; legacy pickles "
+                                         f"are not loaded unless explicitly allowed")
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Gallery first: a crash in between leaves a stale ETag, which only
+            # costs a re-download on the next refresh.
+            _write_atomic(self.gallery_path, data)
+            meta = {"bucket": self.bucket, "key": key, "etag": response["ETag"], "fetched_at": time.time()}
+            _write_atomic(self.meta_path, json.dumps(meta).encode("utf-8"))
+            return True
+        raise FileNotFoundError(f"No gallery object {' or '.join(self.keys)} in s3://{self.bucket}")
+
+    def load(self, refresh=True):
+        """
+        Refresh from S3 (unless refresh=False) and return (Gallery, ETag) from
+        the cache. If S3 cannot be reached the cached copy is returned as is;
+        (None, None) means there is neither.
+        """
+        if refresh:
+            start = time.perf_counter()
+            try:
+                updated = self.refresh()
+                print(f"Gallery {'downloaded' if updated else 'unchanged'} in {time.perf_counter() - start:.2f}s.")
+            except Exception as e:
+                print(f"Could not refresh the gallery from S3 ({e}); using the cached copy.")
+        return self.load_cached()
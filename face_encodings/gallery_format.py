@@ -0,0 +1,235 @@
+"""
+Binary gallery format, a safe and memory-mappable replacement for encodings.pickle.
+
+Layout (little endian):
+    header   magic b"FGAL", format version, dtype code, embedding dim, row
+             count, student count, table offset/length, matrix offset and a
+             SHA-256 of the table and matrix bytes
+    table    UTF-8 JSON {"names": [...], "offsets": [...]}: student i owns
+             matrix rows offsets[i]:offsets[i + 1]
+    matrix   row-major float32 or float16 embeddings, 64-byte aligned
+
+Convert an existing pickle (and back) from the repository root:
+    python -m face_encodings.gallery_format to-gallery encodings/encodings.pickle [--float16]
+    python -m face_encodings.gallery_format to-pickle encodings/encodings.gallery
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import struct
+
+import numpy as np
+
+MAGIC = b"FGAL"
+FORMAT_VERSION = 1
+GALLERY_EXTENSION = ".gallery"
+_HEADER = struct.Struct("<4sHBBIQIQQQ32s")
+_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2")}
+_DTYPE_CODES = {dtype: code for code, dtype in _DTYPES.items()}
+_ALIGNMENT = 64
+
+
+class GalleryFormatError(ValueError):
+    """Raised for data that is not a valid gallery file (bad magic, version or checksum)."""
+
+
+class Gallery:
+    """
+    Flattened face gallery: an (N, dim) embedding matrix whose rows are grouped
+    by student, the student names, and row offsets (len(names) + 1 entries).
+    Accepted by build_matcher in place of an encodings dictionary.
+    """
+
+    def __init__(self, matrix, names, offsets):
+        self.matrix = matrix
+        self.names = list(names)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def num_students(self):
+        return len(self.names)
+
+    @property
+    def labels(self):
+        """Row -> index into names."""
+        return np.repeat(np.arange(len(self.names), dtype=np.int32), np.diff(self.offsets))
+
+    @classmethod
+    def from_encodings_dict(cls, encodings_dict, dtype=np.float32, dim=128):
+        names = []
+        offsets = [0]
+        rows = []
+        for student_name, student_encodings in encodings_dict.items():
+            if len(student_encodings) == 0:
+                continue
+            names.append(student_name)
+            rows.extend(student_encodings)
+            offsets.append(len(rows))
+        if rows:
+            matrix = np.asarray(rows, dtype=dtype)
+        else:
+            matrix = np.empty((0, dim), dtype=dtype)
+        return cls(matrix, names, offsets)
+
+    def to_encodings_dict(self):
+        """The {student_name: [float64 encoding, ...]} dictionary the pickle held."""
+        return {
+            name: [np.asarray(row, dtype=np.float64) for row in self.matrix[self.offsets[i]:self.offsets[i + 1]]]
+            for i, name in enumerate(self.names)
+        }
+
+
+def _align(offset):
+    return (offset + _ALIGNMENT - 1) // _ALIGNMENT * _ALIGNMENT
+
+
+def _checksum(table, matrix):
+    digest = hashlib.sha256(table)
+    digest.update(np.ascontiguousarray(matrix).reshape(-1).view(np.uint8))
+    return digest.digest()
+
+
+def gallery_to_bytes(gallery, dtype=None):
+    """Serialize a Gallery (or an encodings dictionary) to the binary format."""
+    if not isinstance(gallery, Gallery):
+        gallery = Gallery.from_encodings_dict(gallery)
+    dtype = np.dtype(dtype or gallery.matrix.dtype).newbyteorder("<")
+    if dtype not in _DTYPE_CODES:
+        raise GalleryFormatError(f"Unsupported gallery dtype {dtype}; use float32 or float16.")
+    matrix = np.ascontiguousarray(gallery.matrix, dtype=dtype)
+    table = json.dumps({"names": gallery.names, "offsets": gallery.offsets.tolist()}).encode("utf-8")
+    table_offset = _HEADER.size
+    matrix_offset = _align(table_offset + len(table))
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, _DTYPE_CODES[dtype], 0, matrix.shape[1], matrix.shape[0],
+                          len(gallery.names), table_offset, len(table), matrix_offset, _checksum(table, matrix))
+    padding = b"\0" * (matrix_offset - table_offset - len(table))
+    return header + table + padding + matrix.tobytes()
+
+
+def is_gallery_data(data):
+    """True if `data` (the first bytes of a file or object) is in the binary gallery format."""
+    return bytes(data[:len(MAGIC)]) == MAGIC
+
+
+def _parse_header(data):
+    if len(data) < _HEADER.size or not is_gallery_data(data):
+        raise GalleryFormatError("Not a gallery file (bad magic).")
+    (_, version, dtype_code, _, dim, num_rows, num_students,
+     table_offset, table_length, matrix_offset, checksum) = _HEADER.unpack_from(data)
+    if version != FORMAT_VERSION:
+        raise GalleryFormatError(f"Unsupported gallery format version {version}.")
+    if dtype_code not in _DTYPES:
+        raise GalleryFormatError(f"Unknown gallery dtype code {dtype_code}.")
+    return _DTYPES[dtype_code], dim, num_rows, num_students, table_offset, table_length, matrix_offset, checksum
+
+
+def _build(matrix, table, num_students, checksum, verify):
+    if verify and _checksum(table, matrix) != checksum:
+        raise GalleryFormatError("Gallery checksum mismatch; the file is corrupt or truncated.")
+    payload = json.loads(table)
+    if len(payload["names"]) != num_students or payload["offsets"][-1] != matrix.shape[0]:
+        raise GalleryFormatError("Gallery label table does not match the matrix.")
+    return Gallery(matrix, payload["names"], payload["offsets"])
+
+
+def gallery_from_bytes(data, verify=True):
+    """Parse an in-memory gallery (e.g. an S3 object body) without copying the matrix."""
+    dtype, dim, num_rows, num_students, table_offset, table_length, matrix_offset, checksum = _parse_header(data)
+    table = bytes(data[table_offset:table_offset + table_length])
+    if len(data) < matrix_offset + num_rows * dim * dtype.itemsize:
+        raise GalleryFormatError("Gallery data is truncated.")
+    matrix = np.frombuffer(data, dtype=dtype, count=num_rows * dim, offset=matrix_offset).reshape(num_rows, dim)
+    return _build(matrix, table, num_students, checksum, verify)
+
+
+def load_gallery(path, mmap=True, verify=True):
+    """
+    Load a gallery file. With mmap=True the matrix is an np.memmap, so loading
+    costs a header read (plus one sequential pass if verify=True) and pages are
+    shared between processes mapping the same file.
+    """
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+        dtype, dim, num_rows, num_students, table_offset, table_length, matrix_offset, checksum = \
+            _parse_header(header)
+        f.seek(table_offset)
+        table = f.read(table_length)
+        if not mmap or num_rows == 0:
+            f.seek(matrix_offset)
+            matrix = np.fromfile(f, dtype=dtype, count=num_rows * dim)
+            if matrix.size != num_rows * dim:
+                raise GalleryFormatError("Gallery file is truncated.")
+            return _build(matrix.reshape(num_rows, dim), table, num_students, checksum, verify)
+    if os.path.getsize(path) < matrix_offset + num_rows * dim * dtype.itemsize:
+        raise GalleryFormatError("Gallery file is truncated.")
+    matrix = np.memmap(path, dtype=dtype, mode="r", offset=matrix_offset, shape=(num_rows, dim))
+    return _build(matrix, table, num_students, checksum, verify)
+
+
+def save_gallery(path, gallery, dtype=None):
+    """Write a Gallery (or an encodings dictionary) atomically."""
+    data = gallery_to_bytes(gallery, dtype)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def read_encodings_file(path):
+    """Read an encodings dictionary from a gallery file or a legacy pickle."""
+    with open(path, "rb") as f:
+        is_gallery = is_gallery_data(f.read(len(MAGIC)))
+    if is_gallery:
+        return load_gallery(path).to_encodings_dict()
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def write_encodings_file(path, encodings_dict):
+    """Write an encodings dictionary as a gallery file (.gallery) or a pickle (any other extension)."""
+    if path.endswith(GALLERY_EXTENSION):
+        save_gallery(path, encodings_dict)
+    else:
+        with open(path, "wb") as f:
+            pickle.dump(encodings_dict, f)
+
+
+def pickle_to_gallery(pickle_path, gallery_path=None, dtype=np.float32):
+    """Convert encodings.pickle to the binary format. Returns the gallery path."""
+    gallery_path = gallery_path or os.path.splitext(pickle_path)[0] + GALLERY_EXTENSION
+    with open(pickle_path, "rb") as f:
+        encodings_dict = pickle.load(f)
+    save_gallery(gallery_path, Gallery.from_encodings_dict(encodings_dict, dtype=dtype))
+    return gallery_path
+
+
+def gallery_to_pickle(gallery_path, pickle_path=None):
+    """Convert a gallery file back to an encodings pickle. Returns the pickle path."""
+    pickle_path = pickle_path or os.path.splitext(gallery_path)[0] + ".pickle"
+    with open(pickle_path, "wb") as f:
+        pickle.dump(load_gallery(gallery_path).to_encodings_dict(), f)
+    return pickle_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert between encodings.pickle and the binary gallery format.")
+    parser.add_argument("direction", choices=["to-gallery", "to-pickle"])
+    parser.add_argument("source")
+    parser.add_argument("destination", nargs="?")
+    parser.add_argument("--float16", action="store_true", help="Store embeddings as float16 (half the size).")
+    args = parser.parse_args()
+    if args.direction == "to-gallery":
+        path = pickle_to_gallery(args.source, args.destination, np.float16 if args.float16 else np.float32)
+    else:
+        path = gallery_to_pickle(args.source, args.destination)
+    print(f"Wrote {path}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import threading
+import time
+
+from face_encodings.data_preparation import (
+    get_local_gallery_version,
+    get_s3_gallery_version,
+    load_cached_gallery,
+    load_known_gallery_with_version,
+    load_or_compute_encodings,
+)
+from face_encodings.matcher import build_matcher
+
+# Seconds between gallery version checks (one HEAD request each), short enough
+# for students enrolled at registration to be recognized within seconds.
+DEFAULT_CHECK_INTERVAL = 10
+
+
+class GalleryRefresher(threading.Thread):
+    """
+    Background thread that keeps the recognition loop's matcher up to date.
+
+    Every `interval` seconds it calls get_version(), a cheap check such as an
+    S3 ETag or a file mtime. When the version changes it loads the gallery
+    with load_encodings() (an encodings dictionary or a Gallery), builds the
+    matcher off the hot path and swaps it in by rebinding `self.matcher`.
+    Readers take `refresher.matcher` once per frame, so frames in flight
+    finish on the old gallery and the next frame uses the new one without
+    any pause.
+
+    With versioned=True, load_encodings returns (gallery, version) and the
+    gallery is recorded under the version it was actually loaded at, not the
+    one just checked: a loader that fell back to an older local copy is then
+    retried on the next check instead of being taken as current.
+
+    With load_cached (returning (gallery, version) from local disk),
+    reload_from_cache() starts on the cached gallery without waiting for the
+    network, and the thread checks for a newer version as soon as it starts.
+    """
+
+    def __init__(self, load_encodings, get_version, interval=DEFAULT_CHECK_INTERVAL, load_cached=None,
+                 source_name="source", versioned=False, **index_options):
+        super().__init__(name="gallery-refresher", daemon=True)
+        self.load_encodings = load_encodings
+        self.versioned = versioned
+        self.get_version = get_version
+        self.load_cached = load_cached
+        self.source_name = source_name
+        self.interval = interval
+        self.index_options = index_options
+        self.matcher = None
+        self.version = None
+        self.source = None
+        self.reloads = 0
+        self.last_reload_seconds = None
+        self.last_reload_at = None
+        self._check_on_start = False
+        self._stop_event = threading.Event()
+
+    def _swap(self, encodings, version, source, start):
+        matcher = build_matcher(encodings, **self.index_options)
+        # A single attribute rebind is atomic, so readers see either matcher.
+        self.matcher = matcher
+        self.version = version
+        self.source = source
+        self.reloads += 1
+        self.last_reload_seconds = time.perf_counter() - start
+        self.last_reload_at = time.time()
+        print(f"Gallery version {version} loaded from {source}: {len(matcher)} encodings for "
+              f"{matcher.num_students} students in {self.last_reload_seconds:.2f}s.")
+
+    def reload(self, version=None):
+        """Load and index the gallery now. Returns True if a new matcher was swapped in."""
+        if version is None:
+            version = self.get_version()
+        start = time.perf_counter()
+        encodings = self.load_encodings()
+        if self.versioned:
+            encodings, loaded_version = encodings
+            if loaded_version != version:
+                print(f"Gallery version {version} could not be loaded; using version {loaded_version}.")
+            version = loaded_version
+        if not encodings:
+            print("Gallery reload produced no encodings; keeping the current gallery.")
+            return False
+        if self.matcher is not None and version is not None and version == self.version:
+            return False
+        self._swap(encodings, version, self.source_name, start)
+        return True
+
+    def reload_from_cache(self):
+        """
+        Swap in the locally cached gallery without contacting the source.
+        Returns False if there is no cached gallery (call reload() instead).
+        """
+        if self.load_cached is None:
+            return False
+        start = time.perf_counter()
+        encodings, version = self.load_cached()
+        if not encodings:
+            return False
+        self._swap(encodings, version, "cache", start)
+        self._check_on_start = True
+        return True
+
+    def run(self):
+        # After a cached start, check for a newer gallery now rather than after one interval.
+        wait = 0 if self._check_on_start else self.interval
+        while not self._stop_event.wait(wait):
+            wait = self.interval
+            try:
+                version = self.get_version()
+                if version is not None and version != self.version:
+                    self.reload(version)
+            except Exception as e:
+                print(f"Error refreshing gallery: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self):
+        matcher = self.matcher
+        return {
+            "gallery_version": self.version,
+            "gallery_size": len(matcher) if matcher is not None else 0,
+            "gallery_source": self.source,
+            "reloads": self.reloads,
+            "last_reload_seconds": self.last_reload_seconds,
+            "last_reload_at": self.last_reload_at,
+        }
+
+
+def create_s3_refresher(interval=DEFAULT_CHECK_INTERVAL, **index_options):
+    """
+    Refresher for the S3 gallery, versioned by the gallery object's ETag.
+    It can start from the local copy the last sync left on disk.
+    """
+    return GalleryRefresher(load_known_gallery_with_version, get_s3_gallery_version, interval,
+                            load_cached=load_cached_gallery, source_name="S3", versioned=True,
+                            **index_options)
+
+
+def create_local_refresher(known_faces_dir='../known_faces', pickle_path='../encodings/encodings.pickle',
+                           interval=DEFAULT_CHECK_INTERVAL, **index_options):
+    """Refresher for a local gallery pickle, versioned by its modification time."""
+    return GalleryRefresher(lambda: load_or_compute_encodings(known_faces_dir, pickle_path),
+                            lambda: get_local_gallery_version(pickle_path), interval,
+                            source_name=pickle_path, **index_options)
@@ -0,0 +1,310 @@
+import base64
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+MANIFEST_VERSION = 1
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+PROGRESS_INTERVAL = 10.0  # seconds between progress lines
+# Fewer changed images than this are encoded in-process; starting a pool
+# (and importing dlib in every worker) would cost more than it saves.
+MIN_PARALLEL_IMAGES = 8
+
+
+def manifest_path_for(pickle_path):
+    """Manifest file kept next to a gallery pickle: encodings.pickle -> encodings_manifest.json."""
+    return os.path.splitext(pickle_path)[0] + "_manifest.json"
+
+
+def journal_path_for(manifest_path):
+    """Checkpoint journal kept next to a manifest: encodings_manifest.json -> encodings_manifest.journal."""
+    return os.path.splitext(manifest_path)[0] + ".journal"
+
+
+def encoder_context():
+    """
+    Multiprocessing context for encoder pools. Threads (S3 downloads, a GUI)
+    may already be running when the pool starts, so avoid plain fork;
+    forkserver children start from a clean process.
+    """
+    methods = mp.get_all_start_methods()
+    return mp.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _encode_array(encoding):
+    if encoding is None:
+        return None
+    return base64.b64encode(np.asarray(encoding, dtype=np.float64).tobytes()).decode('ascii')
+
+
+def _decode_array(data):
+    if data is None:
+        return None
+    return np.frombuffer(base64.b64decode(data), dtype=np.float64).copy()
+
+
+class EncodingManifest:
+    """
+    Per-image record of the gallery: image id (a path relative to the faces
+    folder, or an S3 key) -> student, content id (SHA-256 of the file, or the
+    S3 ETag) and the face encoding computed from that content (None when no
+    face was found, so the image is not retried until it changes).
+
+    Builders diff the current images against the manifest, encode only images
+    that are new or whose content id changed, drop images that disappeared, and
+    derive the {student: [encodings]} gallery from the manifest. `published`
+    optionally records the settings the gallery was last published with, so a
+    builder can tell when a settings change alone calls for a republish.
+    """
+
+    def __init__(self, entries=None, published=None):
+        self.entries = entries or {}
+        self.published = published
+
+    def __len__(self):
+        return len(self.entries)
+
+    @classmethod
+    def from_json(cls, data):
+        payload = json.loads(data)
+        if payload.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported manifest version {payload.get('version')}")
+        return cls(payload["images"], payload.get("published"))
+
+    def to_json(self):
+        payload = {"version": MANIFEST_VERSION, "images": self.entries}
+        if self.published is not None:
+            payload["published"] = self.published
+        return json.dumps(payload, sort_keys=True)
+
+    @classmethod
+    def load(cls, path):
+        """Load a manifest file; a missing or unreadable file gives an empty manifest."""
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path, 'r') as f:
+                return cls.from_json(f.read())
+        except (ValueError, KeyError, OSError) as e:
+            print(f"Ignoring unreadable manifest {path}: {e}")
+            return cls()
+
+    def save(self, path):
+        """Write the manifest atomically (a crash never leaves a truncated file)."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_json())
+        os.replace(tmp_path, path)
+
+    def get(self, image_id):
+        return self.entries.get(image_id)
+
+    def diff(self, current):
+        """
+        Compare current images {image_id: (student, content_id)} with the manifest.
+        Returns (changed, removed): ids to (re-)encode and ids no longer present.
+        """
+        changed = [
+            image_id for image_id, (student, content_id) in current.items()
+            if image_id not in self.entries
+            or self.entries[image_id]["content_id"] != content_id
+            or self.entries[image_id]["student"] != student
+        ]
+        removed = [image_id for image_id in self.entries if image_id not in current]
+        return sorted(changed), sorted(removed)
+
+    def set(self, image_id, student, content_id, encoding, **extra):
+        """Record the encoding (or None for no face) computed from an image's content."""
+        self.entries[image_id] = dict(student=student, content_id=content_id,
+                                      encoding=_encode_array(encoding), **extra)
+
+    def remove(self, image_ids):
+        for image_id in image_ids:
+            self.entries.pop(image_id, None)
+
+    def to_encodings_dict(self):
+        """Build the {student: [encoding, ...]} gallery, in image id order."""
+        encodings = {}
+        for image_id in sorted(self.entries):
+            entry = self.entries[image_id]
+            if entry["encoding"] is not None:
+                encodings.setdefault(entry["student"], []).append(_decode_array(entry["encoding"]))
+        return encodings
+
+
+def scan_local_images(known_faces_dir, manifest=None):
+    """
+    Return {image_id: (student, sha256)} for every image in
+    known_faces_dir/<student>/. Files whose size and mtime match the manifest
+    reuse the recorded hash, so unchanged folders are scanned with stat() only.
+    Also returns {image_id: (size, mtime)} for recording in the manifest.
+    """
+    current = {}
+    stats = {}
+    for student_name in sorted(os.listdir(known_faces_dir)):
+        student_folder = os.path.join(known_faces_dir, student_name)
+        if not os.path.isdir(student_folder):
+            continue
+        for image_file in sorted(os.listdir(student_folder)):
+            if not image_file.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            image_path = os.path.join(student_folder, image_file)
+            image_id = f"{student_name}/{image_file}"
+            st = os.stat(image_path)
+            entry = manifest.get(image_id) if manifest is not None else None
+            if entry is not None and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime:
+                content_id = entry["content_id"]
+            else:
+                content_id = file_sha256(image_path)
+            current[image_id] = (student_name, content_id)
+            stats[image_id] = (st.st_size, st.st_mtime)
+    return current, stats
+
+
+class ManifestJournal:
+    """
+    Append-only checkpoint of manifest entries recorded since the manifest was
+    last saved, one JSON line per finished image. A build that crashes or is
+    interrupted replays the journal on restart and only encodes what is left;
+    after the manifest is saved the journal is discarded.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def replay(self, manifest):
+        """Apply journaled entries to `manifest`. Returns the number applied."""
+        if not os.path.exists(self.path):
+            return 0
+        applied = 0
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # Line cut short by the crash
+                manifest.entries[record["image_id"]] = record["entry"]
+                applied += 1
+        return applied
+
+    def record(self, image_id, entry):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._file = open(self.path, 'a')
+        self._file.write(json.dumps({"image_id": image_id, "entry": entry}) + "\n")
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        """Delete the journal once its entries are saved in the manifest."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def iter_encoded(paths, encode_file, workers=None, max_in_flight=None):
+    """
+    Yield (path, encoding, error) for each path as soon as it is encoded, in
+    completion order. With workers == 1 images are encoded in this process;
+    otherwise on a process pool (default: one worker per CPU), so encode_file
+    must be a module-level function. Workers return only the encoding, and at
+    most max_in_flight images (default: 4 per worker) are queued at once.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for path in paths:
+            try:
+                yield path, encode_file(path), None
+            except Exception as e:
+                yield path, None, e
+        return
+    max_in_flight = max_in_flight or workers * 4
+    with ProcessPoolExecutor(max_workers=workers, mp_context=encoder_context()) as pool:
+        pending = {}
+        next_path = iter(paths)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_in_flight:
+                path = next(next_path, None)
+                if path is None:
+                    exhausted = True
+                    break
+                pending[pool.submit(encode_file, path)] = path
+            if not pending:
+                break
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                path = pending.pop(future)
+                try:
+                    yield path, future.result(), None
+                except Exception as e:
+                    yield path, None, e
+
+
+def sync_local_manifest(manifest, known_faces_dir, encode_file, workers=1, journal=None,
+                        progress_interval=PROGRESS_INTERVAL):
+    """
+    Bring `manifest` up to date with known_faces_dir, calling
+    encode_file(image_path) -> encoding or None for new or changed images only,
+    on `workers` processes (see iter_encoded). Each finished image is recorded
+    in `journal` (a ManifestJournal) if one is given. Images whose encoding
+    raised are left out of the manifest so the next run retries them.
+    Returns (changed, removed, touched): ids re-encoded, ids dropped, and the
+    number of unchanged images whose size/mtime were refreshed. The manifest
+    needs saving if any of them is non-empty.
+    """
+    current, stats = scan_local_images(known_faces_dir, manifest)
+    changed, removed = manifest.diff(current)
+    manifest.remove(removed)
+    paths = {os.path.join(known_faces_dir, image_id): image_id for image_id in changed}
+    failed = set()
+    start = last_report = time.monotonic()
+    if len(paths) < MIN_PARALLEL_IMAGES:
+        workers = 1
+    for done, (path, encoding, error) in enumerate(iter_encoded(list(paths), encode_file, workers), 1):
+        image_id = paths[path]
+        if error is not None:
+            print(f"Error encoding {path}: {error}")
+            failed.add(image_id)
+            continue
+        student, content_id = current[image_id]
+        size, mtime = stats[image_id]
+        manifest.set(image_id, student, content_id, encoding, size=size, mtime=mtime)
+        if journal is not None:
+            journal.record(image_id, manifest.entries[image_id])
+        now = time.monotonic()
+        if now - last_report >= progress_interval:
+            print(f"Encoded {done}/{len(paths)} images ({done / (now - start):.1f}/s).")
+            last_report = now
+    # Failed images are neither recorded nor kept with stale content.
+    manifest.remove(failed)
+    touched = 0
+    for image_id, (size, mtime) in stats.items():
+        entry = manifest.entries.get(image_id)
+        if entry is None:
+            continue
+        if entry.get("size") != size or entry.get("mtime") != mtime:
+            # Same content with a new mtime (touched, copied): remember the new stat.
+            entry["size"] = size
+            entry["mtime"] = mtime
+            touched += 1
+    return [image_id for image_id in changed if image_id not in failed], removed, touched
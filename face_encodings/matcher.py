@@ -0,0 +1,118 @@
+import numpy as np
+
+UNKNOWN_NAME = "Unknown"
+# Galleries with at least this many encodings get an approximate (IVF) index.
+ANN_MIN_GALLERY_SIZE = 20000
+
+
+class GalleryMatcher:
+    """
+    Exact nearest-neighbour matcher over a flattened face gallery.
+
+    The {student_name: [encoding, ...]} dictionary is flattened once into a
+    contiguous float32 matrix (one row per encoding) plus an int32 label array
+    that maps each row back to an index into `names`. All faces in a frame are
+    then scored against every gallery row in a single batched computation.
+    """
+
+    def __init__(self, matrix, labels, names):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.labels = np.asarray(labels, dtype=np.int32)
+        self.names = list(names)
+        # Squared row norms are reused for every query batch.
+        self.sq_norms = np.einsum("ij,ij->i", self.matrix, self.matrix)
+
+    @classmethod
+    def from_encodings_dict(cls, encodings_dict):
+        """Build a matcher from a {student_name: [encoding, ...]} dictionary."""
+        names = []
+        rows = []
+        labels = []
+        for student_name, student_encodings in encodings_dict.items():
+            if len(student_encodings) == 0:
+                continue
+            label = len(names)
+            names.append(student_name)
+            for encoding in student_encodings:
+                rows.append(encoding)
+                labels.append(label)
+        if rows:
+            matrix = np.asarray(rows, dtype=np.float32)
+        else:
+            matrix = np.empty((0, 128), dtype=np.float32)
+        return cls(matrix, labels, names)
+
+    @classmethod
+    def from_gallery(cls, gallery):
+        """Build a matcher from a gallery_format.Gallery; a float32 memmap is used without copying."""
+        return cls(gallery.matrix, gallery.labels, gallery.names)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def num_students(self):
+        return len(self.names)
+
+    def pairwise_distances(self, face_encodings, rows=None):
+        """
+        Return the (num_faces, num_rows) Euclidean distance matrix between the
+        query encodings and the gallery (or the subset of gallery `rows`).
+        """
+        queries = np.asarray(face_encodings, dtype=np.float32).reshape(-1, self.matrix.shape[1])
+        if rows is None:
+            gallery, gallery_sq = self.matrix, self.sq_norms
+        else:
+            gallery, gallery_sq = self.matrix[rows], self.sq_norms[rows]
+        query_sq = np.einsum("ij,ij->i", queries, queries)
+        # ||q - g||^2 = ||q||^2 + ||g||^2 - 2 q.g, evaluated as one GEMM.
+        sq_dist = query_sq[:, None] + gallery_sq[None, :] - 2.0 * (queries @ gallery.T)
+        np.maximum(sq_dist, 0.0, out=sq_dist)
+        return np.sqrt(sq_dist, out=sq_dist)
+
+    def nearest(self, face_encodings):
+        """
+        Return (row_indices, distances) of the closest gallery row for each
+        query encoding. Rows are -1 and distances inf for an empty gallery.
+        """
+        num_faces = len(face_encodings)
+        if num_faces == 0 or len(self) == 0:
+            return (np.full(num_faces, -1, dtype=np.int64),
+                    np.full(num_faces, np.inf, dtype=np.float32))
+        distances = self.pairwise_distances(face_encodings)
+        best_rows = np.argmin(distances, axis=1)
+        best_distances = distances[np.arange(num_faces), best_rows]
+        return best_rows, best_distances
+
+    def match(self, face_encodings, tolerance=0.4):
+        """
+        Match every face in a frame against the gallery.
+        Returns a list of (name, distance) tuples, one per input encoding. The
+        name is UNKNOWN_NAME when the nearest student is farther than tolerance.
+        """
+        best_rows, best_distances = self.nearest(face_encodings)
+        results = []
+        for row, distance in zip(best_rows, best_distances):
+            if row >= 0 and distance <= tolerance:
+                results.append((self.names[self.labels[row]], float(distance)))
+            else:
+                results.append((UNKNOWN_NAME, float(distance)))
+        return results
+
+
+def build_matcher(encodings_dict, index="auto", **index_options):
+    """
+    Build the matcher used by the recognition loop.
+    index="exact" always uses GalleryMatcher, index="ivf" always builds an
+    IVFIndex, and index="auto" switches to IVF once the gallery holds
+    ANN_MIN_GALLERY_SIZE encodings. Extra options (n_lists, n_probe, seed)
+    are passed to IVFIndex. encodings_dict may also be a gallery_format.Gallery.
+    """
+    if isinstance(encodings_dict, dict):
+        matcher = GalleryMatcher.from_encodings_dict(encodings_dict)
+    else:
+        matcher = GalleryMatcher.from_gallery(encodings_dict)
+    if index == "exact" or (index == "auto" and len(matcher) < ANN_MIN_GALLERY_SIZE):
+        return matcher
+    from face_encodings.ann_index import IVFIndex
+    return IVFIndex(matcher.matrix, matcher.labels, matcher.names, **index_options)
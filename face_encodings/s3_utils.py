@@ -0,0 +1,58 @@
+import os
+import threading
+
+import boto3  # type: ignore
+from botocore.config import Config  # type: ignore
+
+# Point every S3 call at a local stand-in (MinIO, moto server, LocalStack) by
+# setting S3_ENDPOINT_URL, e.g. S3_ENDPOINT_URL=http://localhost:9000.
+S3_ENDPOINT_ENV = "S3_ENDPOINT_URL"
+
+# HTTP connections kept open by the shared client; sized for the parallel
+# download and upload pools.
+MAX_POOL_CONNECTIONS = 32
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def create_s3_client(max_pool_connections=MAX_POOL_CONNECTIONS):
+    """Create a new S3 client honouring S3_ENDPOINT_URL."""
+    return boto3.client(
+        "s3",
+        endpoint_url=os.environ.get(S3_ENDPOINT_ENV) or None,
+        config=Config(max_pool_connections=max_pool_connections, retries={"max_attempts": 5, "mode": "adaptive"}),
+    )
+
+
+def get_s3_client():
+    """
+    Return the S3 client shared by this process. boto3 clients are thread-safe,
+    so one client (and its connection pool) serves every thread instead of a
+    new client, credential lookup and TLS handshake per call.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = create_s3_client()
+        return _client
+
+
+def reset_s3_client():
+    """Drop the shared client, e.g. after changing S3_ENDPOINT_URL or in a forked child."""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def is_not_modified(error):
+    """True if a ClientError is S3's 304 answer to a conditional (If-None-Match) GET."""
+    response = getattr(error, "response", {})
+    return (response.get("Error", {}).get("Code") in ("304", "NotModified")
+            or response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 304)
+
+
+def is_conflict(error):
+    """True if a ClientError means a conditional (If-Match/If-None-Match) write lost to another writer."""
+    code = getattr(error, "response", {}).get("Error", {}).get("Code")
+    return code in ("PreconditionFailed", "ConditionalRequestConflict", "412", "409")
@@ -0,0 +1,369 @@
+"""
+Gallery stored in S3 as hash-bucketed shards plus a small manifest.
+
+Each student is assigned to one of num_shards buckets by a hash of their name.
+Every non-empty bucket is one binary gallery object (see gallery_format.py)
+under SHARD_PREFIX, and MANIFEST_KEY lists each shard's key, ETag and SHA-256.
+
+Shard objects are immutable: their key includes a prefix of their SHA-256.
+Writers rebuild all shards locally, upload only those whose SHA-256 changed,
+replace the manifest (conditionally on its ETag, retrying on a concurrent
+change) and only then delete the shards it no longer lists, so readers never
+see a manifest that points at shards that are not uploaded yet.
+add_to_sharded_gallery appends a few students (e.g. at registration) by
+rewriting just their shards, replacing the manifest with a conditional put.
+A publish can be limited to the students its caller owns (replace_only), so
+students appended from other machines survive it. Readers keep the
+shards and the last manifest they synced in a local directory, fetch the
+manifest with If-None-Match and download only shards whose ETag changed. The
+local copy can be loaded without S3 (load_cached_sharded_gallery), e.g. when
+offline. Both directions transfer shards concurrently over the shared S3 client.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from botocore.exceptions import ClientError  # type: ignore
+
+from face_encodings.gallery_format import Gallery, gallery_from_bytes, gallery_to_bytes, load_gallery
+from face_encodings.s3_utils import get_s3_client, is_conflict, is_not_modified
+
+BUCKET_NAME = "attendance-images-upload"
+SHARD_PREFIX = "gallery/shards/"
+MANIFEST_KEY = "gallery/manifest.json"
+MANIFEST_VERSION = 1
+DEFAULT_NUM_SHARDS = 64
+TRANSFER_WORKERS = 16
+# Local copy of the shards and of the manifest they were synced from.
+DEFAULT_CACHE_DIR = "../encodings/shards"
+LOCAL_MANIFEST_FILE = "manifest.json"
+
+
+def shard_for(student_name, num_shards):
+    """Stable bucket of a student (independent of Python's hash randomisation)."""
+    digest = hashlib.md5(student_name.encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "little") % num_shards
+
+
+def shard_key(shard_id, sha256, prefix=SHARD_PREFIX):
+    return f"{prefix}shard-{shard_id:04d}-{sha256[:16]}.gallery"
+
+
+def build_shards(encodings_dict, num_shards=DEFAULT_NUM_SHARDS):
+    """Return {shard_id: gallery bytes} for every non-empty bucket, with students in name order."""
+    buckets = {}
+    for student_name in sorted(encodings_dict):
+        if len(encodings_dict[student_name]) == 0:
+            continue
+        buckets.setdefault(shard_for(student_name, num_shards), {})[student_name] = encodings_dict[student_name]
+    return {shard_id: gallery_to_bytes(Gallery.from_encodings_dict(bucket)) for shard_id, bucket in buckets.items()}
+
+
+def fetch_manifest(s3_client=None, bucket=BUCKET_NAME, key=MANIFEST_KEY, if_none_match=None):
+    """
+    Return (manifest dict, ETag) from S3, or (None, None) if there is no sharded
+    gallery. With if_none_match, an unchanged manifest raises S3's 304 ClientError.
+    """
+    s3_client = s3_client or get_s3_client()
+    conditions = {"IfNoneMatch": if_none_match} if if_none_match else {}
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key, **conditions)
+    except s3_client.exceptions.NoSuchKey:
+        return None, None
+    manifest = json.loads(response["Body"].read())
+    if manifest.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported shard manifest version {manifest.get('version')}")
+    return manifest, response["ETag"]
+
+
+def _download_students(s3_client, bucket, shards, max_workers=TRANSFER_WORKERS):
+    """Download the shards listed in a manifest and return their {student_name: [encoding, ...]}."""
+    def download(entry):
+        response = s3_client.get_object(Bucket=bucket, Key=entry["key"])
+        return gallery_from_bytes(response["Body"].read()).to_encodings_dict()
+
+    students = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for shard in pool.map(download, shards.values()):
+            students.update(shard)
+    return students
+
+
+def publish_sharded_gallery(encodings_dict, num_shards=None, bucket=BUCKET_NAME, max_workers=TRANSFER_WORKERS,
+                            replace_only=None, max_attempts=5):
+    """
+    Upload the gallery as shards, transferring only shards whose content changed.
+    num_shards defaults to the current manifest's (or DEFAULT_NUM_SHARDS);
+    changing it re-shards the whole gallery. By default encodings_dict replaces
+    the whole gallery. With replace_only (student names), only those students
+    are replaced, or removed when encodings_dict has none for them; every other
+    student already in the gallery (e.g. one added with add_to_sharded_gallery
+    on another machine) is kept as it is. Like add_to_sharded_gallery, the
+    manifest is replaced only if nobody else changed it meanwhile (If-Match on
+    its ETag, or If-None-Match when there is none yet); otherwise the publish
+    is redone on the newer manifest. Returns a stats dict.
+    """
+    s3_client = get_s3_client()
+    start = time.perf_counter()
+    for _ in range(max_attempts):
+        current, manifest_etag = fetch_manifest(s3_client, bucket)
+        if current is None or (num_shards is not None and num_shards != current["num_shards"]):
+            previous_shards = current["shards"] if current else {}
+            target = {"num_shards": num_shards or DEFAULT_NUM_SHARDS, "shards": {}}
+        else:
+            previous_shards = current["shards"]
+            target = current
+        shard_count = target["num_shards"]
+
+        gallery = encodings_dict
+        kept = 0
+        if replace_only is not None and previous_shards:
+            replaced = set(replace_only) | set(encodings_dict)
+            remote = _download_students(s3_client, bucket, previous_shards, max_workers)
+            others = {name: encodings for name, encodings in remote.items() if name not in replaced}
+            kept = len(others)
+            gallery = {**encodings_dict, **others}
+
+        shards = build_shards(gallery, shard_count)
+        entries = {}
+        to_upload = []
+        for shard_id, data in shards.items():
+            name = f"{shard_id:04d}"
+            sha256 = hashlib.sha256(data).hexdigest()
+            previous = target["shards"].get(name)
+            if previous is not None and previous["sha256"] == sha256:
+                entries[name] = previous
+            else:
+                to_upload.append((name, shard_key(shard_id, sha256), data, sha256))
+
+        def upload(item):
+            name, key, data, sha256 = item
+            response = s3_client.put_object(Bucket=bucket, Key=key, Body=data)
+            return name, {"key": key, "etag": response["ETag"], "sha256": sha256, "size": len(data)}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            for name, entry in pool.map(upload, to_upload):
+                entries[name] = entry
+
+        manifest = {"version": MANIFEST_VERSION, "num_shards": shard_count, "shards": entries,
+                    "students": sum(1 for encodings in gallery.values() if len(encodings)),
+                    "updated_at": time.time()}
+        condition = {"IfMatch": manifest_etag} if manifest_etag else {"IfNoneMatch": "*"}
+        try:
+            s3_client.put_object(Bucket=bucket, Key=MANIFEST_KEY, **condition,
+                                 Body=json.dumps(manifest, sort_keys=True).encode("utf-8"))
+        except ClientError as e:
+            if not is_conflict(e):
+                raise
+            # Another writer replaced the manifest first: drop the shards we
+            # uploaded that its manifest does not use, and redo on top of it.
+            newer, _ = fetch_manifest(s3_client, bucket)
+            in_use = {entry["key"] for entry in (newer or {"shards": {}})["shards"].values()}
+            for _, key, _, _ in to_upload:
+                if key not in in_use:
+                    s3_client.delete_object(Bucket=bucket, Key=key)
+            continue
+
+        # Shards no longer listed are deleted only after the new manifest is live.
+        live_keys = {entry["key"] for entry in entries.values()}
+        stale = sorted({entry["key"] for entry in previous_shards.values()} - live_keys)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            list(pool.map(lambda key: s3_client.delete_object(Bucket=bucket, Key=key), stale))
+
+        stats = {
+            "shards": len(entries),
+            "uploaded": len(to_upload),
+            "unchanged": len(entries) - len(to_upload),
+            "deleted": len(stale),
+            "students_kept": kept,
+            "bytes_uploaded": sum(len(item[2]) for item in to_upload),
+            "seconds": time.perf_counter() - start,
+        }
+        print(f"Published sharded gallery: {stats['uploaded']} of {stats['shards']} shards uploaded "
+              f"({stats['bytes_uploaded'] / 1e6:.1f} MB), {stats['deleted']} deleted in {stats['seconds']:.1f}s.")
+        return stats
+    raise RuntimeError(f"Sharded gallery manifest kept changing; gave up after {max_attempts} attempts.")
+
+
+def add_to_sharded_gallery(new_encodings, bucket=BUCKET_NAME, max_attempts=5):
+    """
+    Append encodings {student_name: [encoding, ...]} to the sharded gallery,
+    downloading and re-uploading only the shards those students hash to. The
+    manifest is replaced only if nobody else changed it meanwhile (If-Match on
+    its ETag); otherwise the update is redone on the newer manifest.
+    Returns the number of shards rewritten, or None if there is no sharded
+    gallery to append to (publish one with publish_sharded_gallery first).
+    """
+    s3_client = get_s3_client()
+    for _ in range(max_attempts):
+        current, manifest_etag = fetch_manifest(s3_client, bucket)
+        if current is None:
+            return None
+        num_shards = current["num_shards"]
+        additions = {}
+        for student_name, encodings in new_encodings.items():
+            if len(encodings):
+                additions.setdefault(shard_for(student_name, num_shards), {})[student_name] = list(encodings)
+        entries = dict(current["shards"])
+        students = current.get("students", 0)
+        uploaded = []
+        for shard_id, students_added in additions.items():
+            name = f"{shard_id:04d}"
+            shard = {}
+            if name in entries:
+                response = s3_client.get_object(Bucket=bucket, Key=entries[name]["key"])
+                shard = gallery_from_bytes(response["Body"].read()).to_encodings_dict()
+            for student_name, encodings in students_added.items():
+                students += student_name not in shard
+                shard.setdefault(student_name, []).extend(encodings)
+            data = gallery_to_bytes(Gallery.from_encodings_dict({k: shard[k] for k in sorted(shard)}))
+            sha256 = hashlib.sha256(data).hexdigest()
+            key = shard_key(shard_id, sha256)
+            response = s3_client.put_object(Bucket=bucket, Key=key, Body=data)
+            entries[name] = {"key": key, "etag": response["ETag"], "sha256": sha256, "size": len(data)}
+            uploaded.append(key)
+        manifest = dict(current, shards=entries, students=students, updated_at=time.time())
+        try:
+            s3_client.put_object(Bucket=bucket, Key=MANIFEST_KEY, IfMatch=manifest_etag,
+                                 Body=json.dumps(manifest, sort_keys=True).encode("utf-8"))
+        except ClientError as e:
+            if not is_conflict(e):
+                raise
+            # Another writer replaced the manifest first: drop our shards and redo.
+            for key in uploaded:
+                s3_client.delete_object(Bucket=bucket, Key=key)
+            continue
+        for name in additions:
+            previous = current["shards"].get(f"{name:04d}")
+            if previous is not None and previous["key"] != entries[f"{name:04d}"]["key"]:
+                s3_client.delete_object(Bucket=bucket, Key=previous["key"])
+        return len(additions)
+    raise RuntimeError(f"Sharded gallery manifest kept changing; gave up after {max_attempts} attempts.")
+
+
+def _load_local_manifest(cache_dir):
+    path = os.path.join(cache_dir, LOCAL_MANIFEST_FILE)
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def merge_shards(galleries):
+    """Concatenate shard galleries into one Gallery."""
+    galleries = [g for g in galleries if len(g)]
+    if not galleries:
+        return Gallery(np.empty((0, 128), dtype=np.float32), [], [0])
+    names = []
+    offsets = [0]
+    for gallery in galleries:
+        names.extend(gallery.names)
+        offsets.extend((gallery.offsets[1:] + offsets[-1]).tolist())
+    matrix = np.concatenate([np.asarray(g.matrix, dtype=np.float32) for g in galleries])
+    return Gallery(matrix, names, offsets)
+
+
+def _shard_path(cache_dir, entry):
+    return os.path.join(cache_dir, os.path.basename(entry["key"]))
+
+
+def _has_all_shards(cache_dir, manifest):
+    return all(os.path.exists(_shard_path(cache_dir, entry)) for entry in manifest["shards"].values())
+
+
+def _load_shards(cache_dir, manifest):
+    return merge_shards(load_gallery(_shard_path(cache_dir, entry)) for _, entry in sorted(manifest["shards"].items()))
+
+
+def load_cached_sharded_gallery(cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Load the last synced sharded gallery from cache_dir without contacting S3.
+    Returns (Gallery, manifest ETag), or (None, None) if there is no complete local copy.
+    """
+    local = _load_local_manifest(cache_dir)
+    if local is None or not _has_all_shards(cache_dir, local):
+        return None, None
+    return _load_shards(cache_dir, local), local.get("manifest_etag")
+
+
+def sync_sharded_gallery(cache_dir=DEFAULT_CACHE_DIR, bucket=BUCKET_NAME, max_workers=TRANSFER_WORKERS):
+    """
+    Bring the local shard cache up to date with S3 and return (Gallery, stats),
+    or (None, stats) if the bucket has no sharded gallery. stats["manifest_etag"]
+    is the ETag of the manifest the returned gallery was built from. The manifest is
+    fetched with If-None-Match, so an up-to-date cache costs one 304 response.
+    Otherwise only shards whose ETag differs from the last synced manifest (or
+    whose file is missing) are downloaded; shards dropped from the manifest
+    are removed locally.
+    """
+    s3_client = get_s3_client()
+    start = time.perf_counter()
+    local = _load_local_manifest(cache_dir) or {"shards": {}}
+    cached_etag = local.get("manifest_etag") if _has_all_shards(cache_dir, local) else None
+    try:
+        remote, manifest_etag = fetch_manifest(s3_client, bucket, if_none_match=cached_etag)
+    except ClientError as e:
+        if not is_not_modified(e):
+            raise
+        stats = {"shards": len(local["shards"]), "downloaded": 0, "bytes_downloaded": 0,
+                 "manifest_etag": cached_etag, "seconds": time.perf_counter() - start}
+        print(f"Sharded gallery unchanged; using the {stats['shards']} cached shards.")
+        return _load_shards(cache_dir, local), stats
+    if remote is None:
+        return None, {"shards": 0, "downloaded": 0, "manifest_etag": None}
+    os.makedirs(cache_dir, exist_ok=True)
+
+    def local_path(entry):
+        return _shard_path(cache_dir, entry)
+
+    to_download = [
+        entry for name, entry in remote["shards"].items()
+        if local["shards"].get(name, {}).get("etag") != entry["etag"] or not os.path.exists(local_path(entry))
+    ]
+
+    def download(entry):
+        response = s3_client.get_object(Bucket=bucket, Key=entry["key"])
+        data = response["Body"].read()
+        _write_atomic(local_path(entry), data)
+        return len(data)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        downloaded_bytes = sum(pool.map(download, to_download))
+
+    live_files = {os.path.basename(entry["key"]) for entry in remote["shards"].values()}
+    for filename in os.listdir(cache_dir):
+        if filename.endswith(".gallery") and filename not in live_files:
+            os.remove(os.path.join(cache_dir, filename))
+    remote["manifest_etag"] = manifest_etag
+    _write_atomic(os.path.join(cache_dir, LOCAL_MANIFEST_FILE), json.dumps(remote, sort_keys=True).encode("utf-8"))
+
+    gallery = _load_shards(cache_dir, remote)
+    stats = {
+        "shards": len(remote["shards"]),
+        "downloaded": len(to_download),
+        "bytes_downloaded": downloaded_bytes,
+        "manifest_etag": manifest_etag,
+        "seconds": time.perf_counter() - start,
+    }
+    print(f"Synced sharded gallery: {stats['downloaded']} of {stats['shards']} shards downloaded "
+          f"({downloaded_bytes / 1e6:.1f} MB) in {stats['seconds']:.2f}s.")
+    return gallery, stats
+
+
+def get_sharded_gallery_version(bucket=BUCKET_NAME):
+    """ETag of the shard manifest, or None if there is no sharded gallery."""
+    try:
+        return get_s3_client().head_object(Bucket=bucket, Key=MANIFEST_KEY)["ETag"]
+    except Exception:
+        return None
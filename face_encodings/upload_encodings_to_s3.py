@@ -1,17 +1,74 @@
-import boto3  # type: ignore
+import argparse
+import os
+import pickle
+import sys
+
+# Allow running this file directly from the face_encodings directory.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from face_encodings.gallery_format import MAGIC, gallery_to_bytes, is_gallery_data, read_encodings_file
+from face_encodings.s3_utils import get_s3_client
+from face_encodings.sharded_gallery import publish_sharded_gallery
 
 # Update these variables with your bucket name and desired S3 key for the pickle file.
 BUCKET_NAME = "attendance-images-upload"
 PICKLE_FILE = "../encodings/encodings.pickle"
 S3_DESTINATION_KEY = "pickle/encodings.pickle"  # Store the file in the "pickle" folder
+# Binary gallery files (see gallery_format.py) are uploaded here instead.
+GALLERY_DESTINATION_KEY = "pickle/encodings.gallery"
+# Publish as shards plus a manifest, so only changed students' shards are uploaded.
+UPLOAD_SHARDED = True
 
-def upload_pickle_to_s3():
-    s3 = boto3.client("s3")
+def upload_pickle_to_s3(local_file=PICKLE_FILE, sharded=UPLOAD_SHARDED):
+    """
+    Upload an encodings pickle or binary gallery file. With sharded=True only
+    the gallery shards that changed are uploaded (see sharded_gallery.py);
+    otherwise it is uploaded whole to GALLERY_DESTINATION_KEY, a pickle
+    converted to the binary format first, since loaders do not read the
+    legacy pickle key by default.
+    """
+    if sharded:
+        try:
+            publish_sharded_gallery(read_encodings_file(local_file), bucket=BUCKET_NAME)
+        except Exception as e:
+            print(f"Error uploading sharded gallery: {e}")
+        return
+    s3 = get_s3_client()
     try:
-        s3.upload_file(PICKLE_FILE, BUCKET_NAME, S3_DESTINATION_KEY)
-        print(f"Uploaded {PICKLE_FILE} to s3://{BUCKET_NAME}/{S3_DESTINATION_KEY}")
+        with open(local_file, "rb") as f:
+            is_gallery = is_gallery_data(f.read(len(MAGIC)))
+        if is_gallery:
+            s3.upload_file(local_file, BUCKET_NAME, GALLERY_DESTINATION_KEY)
+        else:
+            s3.put_object(Bucket=BUCKET_NAME, Key=GALLERY_DESTINATION_KEY,
+                          Body=gallery_to_bytes(read_encodings_file(local_file)))
+        print(f"Uploaded {local_file} to s3://{BUCKET_NAME}/{GALLERY_DESTINATION_KEY}")
     except Exception as e:
-        print(f"Error uploading pickle file: {e}")
+        print(f"Error uploading encodings file: {e}")
+
+def convert_s3_pickle(sharded=UPLOAD_SHARDED):
+    """
+    One-time migration of a bucket that still holds only the legacy pickle:
+    unpickle S3_DESTINATION_KEY once, here, and publish it as shards (or as a
+    binary gallery with sharded=False), which loaders read without unpickling.
+    The pickle is left in place for older readers.
+    """
+    s3 = get_s3_client()
+    response = s3.get_object(Bucket=BUCKET_NAME, Key=S3_DESTINATION_KEY)
+    data = response["Body"].read()
+    encodings_dict = pickle.loads(data)
+    if sharded:
+        publish_sharded_gallery(encodings_dict, bucket=BUCKET_NAME)
+    else:
+        s3.put_object(Bucket=BUCKET_NAME, Key=GALLERY_DESTINATION_KEY, Body=gallery_to_bytes(encodings_dict))
+        print(f"Converted s3://{BUCKET_NAME}/{S3_DESTINATION_KEY} to s3://{BUCKET_NAME}/{GALLERY_DESTINATION_KEY}")
 
 if __name__ == "__main__":
-    upload_pickle_to_s3()
+    parser = argparse.ArgumentParser(description="Upload local encodings to S3.")
+    parser.add_argument("local_file", nargs="?", default=PICKLE_FILE)
+    parser.add_argument("--convert-s3-pickle", action="store_true",
+                        help=f"convert s3://{BUCKET_NAME}/{S3_DESTINATION_KEY} to the binary format instead")
+    args = parser.parse_args()
+    if args.convert_s3_pickle:
+        convert_s3_pickle()
+    else:
+        upload_pickle_to_s3(args.local_file)
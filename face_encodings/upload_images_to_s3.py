@@ -1,51 +1,139 @@
+import hashlib
 import os
-import boto3 # type: ignore
-from botocore.exceptions import ClientError# type: ignore
+import sys
+import time
 
-def upload_images_to_s3(bucket_name, known_faces_dir='../known_faces'):
+from boto3.s3.transfer import TransferConfig, create_transfer_manager  # type: ignore
+
+# Allow running this file directly from the face_encodings directory.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from face_encodings.s3_utils import get_s3_client
+
+IMAGE_PREFIX = "images/"
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Files uploaded at once; larger files are also split into parts uploaded in parallel.
+UPLOAD_WORKERS = 16
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+
+
+def list_remote_images(bucket_name, prefix=IMAGE_PREFIX):
+    """Returns {key: (size, ETag, last modified epoch)} for every object under prefix, in one paginated listing."""
+    s3_client = get_s3_client()
+    objects = {}
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get("Contents", []):
+            objects[obj["Key"]] = (obj["Size"], obj["ETag"].strip('"'), obj["LastModified"].timestamp())
+    return objects
+
+
+def list_local_images(known_faces_dir, prefix=IMAGE_PREFIX):
     """
-    Uploads only new images from the local known_faces directory to the specified S3 bucket.
-    The S3 object key mirrors the folder structure: images/<StudentName>/<image_filename>.
-    It checks if an object already exists in S3 before uploading.
+    Returns {key: (local path, size, mtime)} for every image in known_faces_dir/<student>/.
+    The S3 key mirrors the folder structure: images/<StudentName>/<image_filename>.
     """
-    # Create an S3 client using default credentials.
-    s3_client = boto3.client('s3')
-
-    # Iterate over each student's subfolder
-    for student_name in os.listdir(known_faces_dir):
+    images = {}
+    for student_name in sorted(os.listdir(known_faces_dir)):
         student_folder = os.path.join(known_faces_dir, student_name)
         if not os.path.isdir(student_folder):
             continue  # Skip non-directory files
-
-        # Upload each image in the student's folder
-        for image_file in os.listdir(student_folder):
-            # Only process typical image files
-            if not image_file.lower().endswith(('.jpg', '.jpeg', '.png')):
+        for image_file in sorted(os.listdir(student_folder)):
+            if not image_file.lower().endswith(IMAGE_EXTENSIONS):
                 continue
-
             local_path = os.path.join(student_folder, image_file)
-            # Construct the S3 object key, e.g., "images/John_Doe/image1.jpg"
-            s3_key = f"images/{student_name}/{image_file}"
+            st = os.stat(local_path)
+            images[f"{prefix}{student_name}/{image_file}"] = (local_path, st.st_size, st.st_mtime)
+    return images
+
+
+def _file_md5(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 
+def needs_upload(local, remote):
+    """
+    Decide from the listing alone whether a local image must be uploaded:
+    missing or a different size uploads; an object written after the file's
+    last modification is current. Only a file modified after its upload with
+    an unchanged size is hashed and compared with a single-part ETag (the MD5).
+    """
+    if remote is None:
+        return True
+    local_path, size, mtime = local
+    remote_size, etag, last_modified = remote
+    if size != remote_size:
+        return True
+    if mtime <= last_modified:
+        return False
+    # Multipart ETags are not a plain MD5 of the content, so re-upload to be safe.
+    return '-' in etag or _file_md5(local_path) != etag
+
+
+def plan_upload(local_images, remote_images):
+    """Split local images into (keys to upload, keys already in S3)."""
+    to_upload = []
+    skipped = []
+    for key, local in local_images.items():
+        if needs_upload(local, remote_images.get(key)):
+            to_upload.append(key)
+        else:
+            skipped.append(key)
+    return to_upload, skipped
+
+
+def upload_images_to_s3(bucket_name, known_faces_dir='../known_faces', prefix=IMAGE_PREFIX,
+                        max_workers=UPLOAD_WORKERS):
+    """
+    Uploads new and changed images from the local known_faces directory to the specified S3 bucket.
+    One paginated listing of the prefix is diffed against the local tree, then the missing
+    images are uploaded concurrently through a transfer manager (multipart for large files).
+    Returns a stats dict with uploaded/skipped/failed counts and throughput.
+    """
+    start = time.perf_counter()
+    local_images = list_local_images(known_faces_dir, prefix)
+    remote_images = list_remote_images(bucket_name, prefix)
+    to_upload, skipped = plan_upload(local_images, remote_images)
+    print(f"{len(local_images)} local images, {len(remote_images)} objects under s3://{bucket_name}/{prefix}: "
+          f"{len(to_upload)} to upload, {len(skipped)} already uploaded.")
+
+    config = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD, multipart_chunksize=MULTIPART_CHUNKSIZE,
+                            max_concurrency=max_workers)
+    upload_start = time.perf_counter()
+    uploaded_bytes = 0
+    failed = []
+    with create_transfer_manager(get_s3_client(), config) as manager:
+        futures = [(key, manager.upload(local_images[key][0], bucket_name, key)) for key in to_upload]
+        for key, future in futures:
             try:
-                # Check if the file already exists in S3
-                s3_client.head_object(Bucket=bucket_name, Key=s3_key)
-                print(f"File {s3_key} already exists in bucket {bucket_name}, skipping upload.")
-            except ClientError as e:
-                # If the error code indicates the object does not exist, then upload it.
-                if e.response['Error']['Code'] == "404":
-                    try:
-                        s3_client.upload_file(local_path, bucket_name, s3_key)
-                        print(f"Uploaded {local_path} to s3://{bucket_name}/{s3_key}")
-                    except Exception as upload_err:
-                        print(f"Error uploading {local_path}: {upload_err}")
-                else:
-                    print(f"Error checking {s3_key}: {e}")
+                future.result()
+                uploaded_bytes += local_images[key][1]
+            except Exception as e:
+                failed.append(key)
+                print(f"Error uploading {local_images[key][0]}: {e}")
+    upload_seconds = time.perf_counter() - upload_start
+
+    stats = {
+        "local": len(local_images),
+        "uploaded": len(to_upload) - len(failed),
+        "skipped": len(skipped),
+        "failed": len(failed),
+        "bytes_uploaded": uploaded_bytes,
+        "seconds": time.perf_counter() - start,
+        "mb_per_second": uploaded_bytes / 1e6 / upload_seconds if to_upload and upload_seconds > 0 else 0.0,
+    }
+    print(f"Uploaded {stats['uploaded']} images ({uploaded_bytes / 1e6:.1f} MB, {stats['mb_per_second']:.1f} MB/s), "
+          f"skipped {stats['skipped']}, failed {stats['failed']} in {stats['seconds']:.1f}s.")
+    return stats
 
 def main():
     # Replace with the name of your S3 bucket
     bucket_name = "attendance-images-upload"
-    
+
     # Call the upload function
     upload_images_to_s3(bucket_name)
 
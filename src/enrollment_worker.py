@@ -0,0 +1,146 @@
+import os
+import queue
+import re
+import threading
+import time
+
+import cv2
+import face_recognition
+
+from database.database_module import create_student, insert_student_image
+from database.student_cache import student_cache
+from face_encodings.enrollment import KNOWN_FACES_DIR, PICKLE_PATH, encode_capture, enroll_images
+from src.preprocessing import FramePreprocessor
+
+# Captures are searched for a face at this fraction of their resolution;
+# registration faces fill much of the frame, so this loses nothing.
+DETECTION_SCALE = 0.5
+THUMBNAIL_SIZE = (100, 75)
+
+
+class EnrollmentWorker(threading.Thread):
+    """
+    Background worker that turns captured frames into gallery entries, keeping
+    detection, encoding, file and database work off the GUI thread.
+
+    submit() never blocks. For each capture the worker finds the face on a
+    downscaled copy, saves the frame under known_faces/<student>/, registers
+    the student and image in MySQL, and encodes the face at the location it
+    just found (no second detection; the chip goes to the face store). Captures
+    queued together are then enrolled in one go: the local gallery first, then
+    the S3 sharded gallery (see face_encodings/enrollment.py).
+
+    Outcomes are reported as event dicts on `events`, which the GUI drains from
+    its own thread: {"type": "captured" | "no_face" | "error" | "enrolled", ...}.
+    """
+
+    def __init__(self, known_faces_dir=KNOWN_FACES_DIR, pickle_path=PICKLE_PATH, upload=True, max_queue=20):
+        super().__init__(name="enrollment-worker", daemon=True)
+        self.known_faces_dir = known_faces_dir
+        self.pickle_path = pickle_path
+        self.upload = upload
+        self.events = queue.Queue()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop_event = threading.Event()
+        self._next_index = {}
+
+    def submit(self, student_name, frame):
+        """Queue a captured BGR frame. Returns False if the queue is full."""
+        try:
+            self._queue.put_nowait((student_name, frame, time.perf_counter()))
+            return True
+        except queue.Full:
+            return False
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _image_filename(self, student_name):
+        """Next free <n>.jpg in the student's folder, so earlier captures are never overwritten."""
+        if student_name not in self._next_index:
+            folder = os.path.join(self.known_faces_dir, student_name)
+            taken = [0]
+            if os.path.isdir(folder):
+                for filename in os.listdir(folder):
+                    match = re.match(r"(\d+)\.jpg$", filename)
+                    if match:
+                        taken.append(int(match.group(1)))
+            self._next_index[student_name] = max(taken) + 1
+        index = self._next_index[student_name]
+        self._next_index[student_name] += 1
+        return f"{index}.jpg"
+
+    def _process(self, student_name, frame, submitted_at):
+        """Detect, save, register and encode one capture. Returns (image_id, encoding) or None."""
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        small = cv2.resize(rgb_frame, None, fx=DETECTION_SCALE, fy=DETECTION_SCALE)
+        face_locations = face_recognition.face_locations(small)
+        if not face_locations:
+            self.events.put({"type": "no_face", "student": student_name})
+            return None
+        face_location = FramePreprocessor.to_full(face_locations[:1], DETECTION_SCALE)[0]
+
+        image_filename = self._image_filename(student_name)
+        output_dir = os.path.join(self.known_faces_dir, student_name)
+        os.makedirs(output_dir, exist_ok=True)
+        cv2.imwrite(os.path.join(output_dir, image_filename), frame)
+        image_id = f"{student_name}/{image_filename}"
+
+        student_id = student_cache.get_student_id(student_name)
+        if student_id is None:
+            # Student is new; create a new record (this also adds it to the cache)
+            student_id = create_student(student_name, metadata=None)
+            if student_id is None:
+                self.events.put({"type": "error", "student": student_name,
+                                 "message": "Failed to register student in the database."})
+                return None
+        # The database stores the path relative to the known_faces folder
+        if not insert_student_image(student_id, os.path.join(student_name, image_filename)):
+            self.events.put({"type": "error", "student": student_name,
+                             "message": "Failed to save image record in the database."})
+
+        encoding = encode_capture(os.path.join(self.known_faces_dir, image_id), rgb_frame, face_location)
+        thumbnail = cv2.resize(rgb_frame, THUMBNAIL_SIZE)
+        self.events.put({"type": "captured", "student": student_name, "image": image_id, "thumbnail": thumbnail,
+                         "seconds": time.perf_counter() - submitted_at})
+        return image_id, encoding
+
+    def _drain(self, first):
+        batch = [first]
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def run(self):
+        while not (self._stop_event.is_set() and self._queue.empty()):
+            try:
+                first = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            enrolled = []
+            for student_name, frame, submitted_at in self._drain(first):
+                try:
+                    result = self._process(student_name, frame, submitted_at)
+                except Exception as e:
+                    self.events.put({"type": "error", "student": student_name, "message": str(e)})
+                    continue
+                if result is not None:
+                    enrolled.append((result[0], student_name, result[1]))
+            if not enrolled:
+                continue
+            students = sorted({student_name for _, student_name, _ in enrolled})
+            try:
+                stats = enroll_images(enrolled, self.known_faces_dir, self.pickle_path, upload=self.upload)
+            except Exception as e:
+                # The images are saved; the next gallery rebuild picks them up.
+                self.events.put({"type": "error", "student": ", ".join(students),
+                                 "message": f"Could not add the images to the gallery: {e}"})
+                continue
+            self.events.put(dict(stats, type="enrolled", students=students))
+
+    def close(self, timeout=None):
+        """Finish every queued capture, then stop."""
+        self._stop_event.set()
+        self.join(timeout)
@@ -1,36 +1,131 @@
-import boto3#type: ignore
-import pickle
-import io
 import cv2
 import face_recognition
-from datetime import datetime
-from face_encodings.data_preparation import load_or_compute_encodings,load_known_encodings
-from database.logging_module import log_attendance
-
-def start_face_recognition():
-    # Load or compute the known face encodings with update checking
-
-    known_encodings_dict = load_known_encodings()
-    
-    if not known_encodings_dict:
+import time
+from face_encodings.gallery_refresher import create_s3_refresher
+from face_encodings.matcher import UNKNOWN_NAME
+from database.attendance_writer import AttendanceWriter
+from database.student_cache import student_cache
+from src.metrics import DEFAULT_EXPORT_INTERVAL, DEFAULT_METRICS_PATH, DEFAULT_METRICS_PORT, METRICS, start_metrics
+from src.pipeline import RecognitionPipeline
+from src.tracker import FaceTracker
+from src.preprocessing import FramePreprocessor, open_capture
+
+def detect_faces(frame, preprocessor):
+    """
+    Detect faces in a BGR camera frame.
+    Returns ((rgb_small_frame, small_locations), face_locations): the
+    downscaled frame and boxes needed for encoding, and the same boxes mapped
+    back to full-frame coordinates.
+    """
+    start = time.perf_counter()
+    rgb_small_frame, scale, upsample = preprocessor.process(frame)
+    detect_start = time.perf_counter()
+    METRICS.observe("preprocess", detect_start - start)
+    small_locations = face_recognition.face_locations(rgb_small_frame, number_of_times_to_upsample=upsample)
+    detect_seconds = time.perf_counter() - detect_start
+    METRICS.observe("detect", detect_seconds)
+    preprocessor.observe(detect_seconds, small_locations, scale)
+    return (rgb_small_frame, small_locations), preprocessor.to_full(small_locations, scale)
+
+def recognize_faces(detection, face_locations, matcher, tolerance, tracker=None):
+    """
+    Encode the detected faces and match them against the gallery in one batch.
+    `detection` is the (rgb_small_frame, small_locations) pair from detect_faces.
+    With a tracker, only faces on new, drifted or stale tracks are encoded; the
+    others reuse the identity already recognised for their track.
+    """
+    rgb_small_frame, small_locations = detection
+    if tracker is None:
+        tracks, to_encode = None, list(range(len(face_locations)))
+    else:
+        tracks, to_encode = tracker.update(face_locations)
+
+    start = time.perf_counter()
+    face_encodings = face_recognition.face_encodings(
+        rgb_small_frame, [small_locations[i] for i in to_encode])
+    match_start = time.perf_counter()
+    try:
+        matches = matcher.match(face_encodings, tolerance)
+    except Exception as e:
+        print(f"Error comparing face encodings: {e}")
+        matches = [(UNKNOWN_NAME, None)] * len(face_encodings)
+    if face_encodings:
+        METRICS.observe("encode", match_start - start)
+        METRICS.observe("match", time.perf_counter() - match_start)
+        METRICS.mark("faces_encoded", len(face_encodings))
+
+    if tracks is None:
+        return [name for name, _ in matches]
+    for i, (name, distance) in zip(to_encode, matches):
+        tracker.assign(tracks[i], name, distance)
+    # Tracks reserved by another worker but not yet recognised show as unknown.
+    return [track.name or UNKNOWN_NAME for track in tracks]
+
+def annotate_frame(frame, face_locations, names):
+    """Draw a box and label on the full-size frame for every recognized face."""
+    for (top, right, bottom, left), name in zip(face_locations, names):
+        if name == UNKNOWN_NAME:
+            continue
+        try:
+            cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+            cv2.putText(frame, name, (left, top - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.75, (0, 255, 0), 2)
+        except Exception as e:
+            print(f"Error drawing annotations: {e}")
+
+def submit_recognized(names, attendance_writer):
+    """Hand recognized names to the background attendance writer."""
+    for name in names:
+        if name != UNKNOWN_NAME:
+            attendance_writer.submit(name)
+            METRICS.mark("recognitions")
+
+def observe_pipeline_stage(stage, seconds):
+    """Report a pipeline stage's item to the metrics: its latency and the stage's throughput."""
+    METRICS.observe(f"pipeline_{stage}", seconds)
+    METRICS.mark(f"{stage}_frames")
+
+def observe_attendance_flush(seconds, inserted):
+    METRICS.observe("attendance_flush", seconds)
+    if inserted is None:
+        METRICS.mark("attendance_flush_failures")
+
+def start_face_recognition(use_pipeline=True, detect_workers=2, encode_workers=2, stats_interval=30,
+                           use_tracker=True, camera_index=0, capture_profile="native", queue_size=2,
+                           gallery_check_interval=10, metrics_path=DEFAULT_METRICS_PATH,
+                           metrics_port=DEFAULT_METRICS_PORT, metrics_interval=DEFAULT_EXPORT_INTERVAL):
+    """
+    Run live face recognition on the default webcam.
+    With use_pipeline=True, capture, detection, encoding/matching, attendance
+    logging and display run as separate stages on their own threads (see
+    src/pipeline.py); otherwise every step runs one after another per frame.
+    With use_tracker=True, faces are tracked between frames and only new or
+    stale tracks are re-encoded (see src/tracker.py). capture_profile selects
+    the camera resolution/FOURCC from src.preprocessing.CAPTURE_PROFILES.
+    The gallery is re-checked every gallery_check_interval seconds and swapped
+    in without restarting when it changes in S3.
+    Per-stage latencies, frame rates and gallery size are appended to
+    metrics_path every metrics_interval seconds and served on
+    127.0.0.1:metrics_port (None disables either); SIGUSR1 or /profile dumps
+    a sampling profile (see src/metrics.py).
+    """
+    # The gallery is flattened (and indexed, for large galleries) at load time
+    # so every frame is matched in a single batch; the refresher rebuilds it
+    # in the background whenever the S3 copy changes. A gallery cached by an
+    # earlier run is used straight away and checked against S3 in the background.
+    startup = time.perf_counter()
+    refresher = create_s3_refresher(interval=gallery_check_interval)
+    if not refresher.reload_from_cache():
+        refresher.reload()
+    print(f"Gallery ready in {time.perf_counter() - startup:.2f}s ({refresher.source or 'unavailable'}).")
+
+    if refresher.matcher is None:
         print("No encodings loaded. Cannot proceed with face recognition.")
         return
-    # try:
-    #     known_encodings = load_or_compute_encodings(
-    #         known_faces_dir='../known_faces', 
-    #         pickle_path='../encodings/encodings.pickle'
-    #     )
-    # except Exception as e:
-    #     print(f"Error loading face encodings: {e}")
-    #     return
-
-    # if not known_encodings:
-    #     print("No known faces found. Exiting.")
-    #     return
 
     # Open a connection to the webcam
     try:
-        video_capture = cv2.VideoCapture(0)
+        video_capture = open_capture(camera_index, capture_profile)
     except Exception as e:
         print(f"Error initializing webcam: {e}")
         return
@@ -39,92 +134,95 @@ def start_face_recognition():
 
     if not video_capture.isOpened():
         print("Error: Cannot open webcam.")
+        video_capture.release()
         return
 
-    # Dictionary to keep track of the last logged time for each student in the current session
-    session_log = {}
-    tolerance = 0.4  # Face recognition tolerance (adjust as needed)
-
+    # Everything started from here on is stopped by the finally block below,
+    # also when a later step (e.g. warming the student cache) fails.
+    attendance_writer = None
+    metrics_exporter = None
     try:
+        # Attendance is written in batches on a background thread; it also keeps
+        # track of the last logged time for each student in the current session
+        attendance_writer = AttendanceWriter(duplicate_threshold=duplicate_threshold, on_flush=observe_attendance_flush)
+        attendance_writer.start()
+        # Load every name -> student_id mapping once so recognitions need no lookups
+        student_cache.warm()
+        tolerance = 0.4  # Face recognition tolerance (adjust as needed)
+        tracker = FaceTracker() if use_tracker else None
+        # Each detect worker reuses its preprocessing buffers; a buffer must
+        # outlive the frames still queued for or being processed by the encoders.
+        preprocessor = FramePreprocessor(buffers=queue_size + encode_workers + 1 if use_pipeline else 1)
+
+        METRICS.gauge("gallery_size", lambda: len(refresher.matcher) if refresher.matcher is not None else 0)
+        METRICS.gauge("gallery", refresher.stats)
+        METRICS.gauge("preprocessing", preprocessor.stats)
+        METRICS.gauge("attendance_writer", attendance_writer.stats)
+        METRICS.gauge("student_cache", student_cache.stats)
+        if tracker is not None:
+            METRICS.gauge("tracker", tracker.stats)
+        metrics_exporter = start_metrics(path=metrics_path, interval=metrics_interval, port=metrics_port)
+
+        # Background gallery checks start only once the capture is open.
+        refresher.start()
+
+        if use_pipeline:
+            pipeline = RecognitionPipeline(
+                video_capture,
+                detect=lambda frame: detect_faces(frame, preprocessor),
+                recognize=lambda detection, locations: recognize_faces(detection, locations, refresher.matcher, tolerance, tracker),
+                annotate=annotate_frame,
+                on_recognized=lambda names: submit_recognized(names, attendance_writer),
+                detect_workers=detect_workers,
+                encode_workers=encode_workers,
+                queue_size=queue_size,
+                stats_interval=stats_interval,
+                stats_providers={
+                    "preprocessing": preprocessor.stats,
+                    "tracker": tracker.stats if tracker else dict,
+                    "gallery": refresher.stats,
+                    "attendance_writer": attendance_writer.stats,
+                    "student_cache": student_cache.stats,
+                },
+                observe_stage=observe_pipeline_stage,
+            )
+            METRICS.gauge("pipeline_queues", lambda: pipeline.stats()["queues"])
+            pipeline.run()
+            return
+
         while True:
             # Read a frame from the webcam
+            frame_start = time.perf_counter()
             ret, frame = video_capture.read()
             if not ret:
                 print("Failed to grab frame from webcam.")
                 break
 
-            # Resize and convert the frame for faster processing
-            try:
-                small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-                rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-            except Exception as e:
-                print(f"Error processing frame: {e}")
-                continue
-
             # Detect face locations and compute face encodings for the current frame
             try:
-                face_locations = face_recognition.face_locations(rgb_small_frame)
-                face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+                detection, face_locations = detect_faces(frame, preprocessor)
+                names = recognize_faces(detection, face_locations, refresher.matcher, tolerance, tracker)
             except Exception as e:
                 print(f"Error detecting faces: {e}")
                 continue
 
-            names = []
-            for face_encoding in face_encodings:
-                name = "Unknown"
-                try:
-                    # Compare with known encodings
-                    for student_name, student_encodings in known_encodings_dict.items():
-                        matches = face_recognition.compare_faces(student_encodings, face_encoding, tolerance)
-                        if True in matches:
-                            name = student_name
-                            break  # Found a match; no need to check further
-                except Exception as e:
-                    print(f"Error comparing face encodings: {e}")
-                names.append(name)
-
             # Process and annotate recognized faces
-            for (top, right, bottom, left), name in zip(face_locations, names):
-                try:
-                    # Scale back up face locations (since we resized earlier)
-                    top *= 4
-                    right *= 4
-                    bottom *= 4
-                    left *= 4
-                except Exception as e:
-                    print(f"Error scaling face location coordinates: {e}")
-                    continue
-
-                if name != "Unknown":
-                    try:
-                        # Draw rectangle and label for recognized students
-                        cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                        cv2.putText(frame, name, (left, top - 10),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.75, (0, 255, 0), 2)
-                    except Exception as e:
-                        print(f"Error drawing annotations: {e}")
-
-                    try:
-                        # Log attendance if not logged recently
-                        current_time = datetime.now()
-                        if name in session_log:
-                            if (current_time - session_log[name]).total_seconds() >= duplicate_threshold:
-                                log_attendance(name)
-                                session_log[name] = current_time
-                        else:
-                            log_attendance(name)
-                            session_log[name] = current_time
-                    except Exception as e:
-                        print(f"Error logging attendance for {name}: {e}")
+            annotate_frame(frame, face_locations, names)
+            submit_recognized(names, attendance_writer)
 
             # Display the resulting frame
+            display_start = time.perf_counter()
             try:
                 cv2.imshow("Face Recognition Attendance", frame)
             except Exception as e:
                 print(f"Error displaying frame: {e}")
 
             # Press 'q' to exit
-            if cv2.waitKey(1) & 0xFF == ord('q'):
+            key = cv2.waitKey(1) & 0xFF
+            METRICS.observe("display", time.perf_counter() - display_start)
+            METRICS.observe("frame", time.perf_counter() - frame_start)
+            METRICS.mark("frames")
+            if key == ord('q'):
                 break
 
     except KeyboardInterrupt:
@@ -133,6 +231,11 @@ def start_face_recognition():
         print(f"An unexpected error occurred during processing: {e}")
     finally:
         # Release the webcam and close windows regardless of errors
+        refresher.stop()
+        if attendance_writer is not None:
+            attendance_writer.close()
+        if metrics_exporter is not None:
+            metrics_exporter.stop()
         video_capture.release()
         cv2.destroyAllWindows()
 
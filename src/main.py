@@ -1,13 +1,19 @@
 import sys
 import os
+import argparse
 
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
 
-
-from face_recognition_module import start_face_recognition
-# Rest of your code...
-from face_recognition_module import start_face_recognition
+from src.face_recognition_module import start_face_recognition
 
 if __name__ == '__main__':
-    start_face_recognition()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Face recognition attendance system.")
+    parser.add_argument("--headless", nargs="+", metavar="SOURCE",
+                        help="Run the multi-camera service on these camera indexes, video files or RTSP URLs.")
+    args = parser.parse_args()
+    if args.headless:
+        from src.service import run_service
+        run_service(args.headless)
+    else:
+        start_face_recognition()
@@ -0,0 +1,362 @@
+"""
+Live-loop metrics and on-demand profiling.
+
+METRICS is the process-wide registry the recognition loop reports into:
+    METRICS.observe("detect", seconds)   latency histogram per stage
+    METRICS.mark("frames")               event meter (FPS over the last few seconds)
+    METRICS.gauge("gallery_size", fn)    value read whenever a snapshot is taken
+Recording is a lock, a bisect and a few additions, cheap enough for every frame.
+
+start_metrics() exports the registry while the loop runs:
+    - a JSON line appended to a file every `interval` seconds
+    - a local HTTP endpoint: /metrics (Prometheus text), /metrics.json
+      and /profile?seconds=N (at most MAX_PROFILE_SECONDS)
+    - SIGUSR1 (POSIX), which like /profile starts a sampling profile of every
+      thread for PROFILE_SECONDS and writes it to profile_dir without stopping
+      the loop
+
+Read a dump with any flame graph tool that accepts collapsed stacks
+(flamegraph.pl, speedscope); the top of the file lists the hottest functions.
+"""
+import bisect
+import collections
+import datetime
+import json
+import math
+import os
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Histogram bucket upper bounds in milliseconds (the last bucket is unbounded).
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+# Latencies kept per stage for the percentiles in snapshots.
+RECENT_SAMPLES = 1024
+# Meters report the event rate over this many seconds.
+METER_WINDOW = 5.0
+
+DEFAULT_METRICS_PATH = "../metrics/metrics.jsonl"
+DEFAULT_METRICS_PORT = 9108
+DEFAULT_EXPORT_INTERVAL = 10
+DEFAULT_PROFILE_DIR = "../metrics/profiles"
+PROFILE_SECONDS = 10
+# Longest profile /profile?seconds=N starts; longer requests are clamped to it.
+MAX_PROFILE_SECONDS = 300
+PROFILE_SAMPLE_INTERVAL = 0.005
+
+
+class Histogram:
+    """Latency histogram: cumulative bucket counts plus the most recent samples for percentiles."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._recent = collections.deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds):
+        ms = seconds * 1000.0
+        with self._lock:
+            self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+            self.count += 1
+            self.total_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+            self._recent.append(ms)
+
+    def snapshot(self):
+        with self._lock:
+            recent = sorted(self._recent)
+            snapshot = {
+                "count": self.count,
+                "mean_ms": self.total_ms / self.count if self.count else 0.0,
+                "max_ms": self.max_ms,
+                "buckets": list(self.counts),
+                "sum_ms": self.total_ms,
+            }
+        for name, q in (("p50_ms", 0.50), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            snapshot[name] = recent[min(len(recent) - 1, int(q * len(recent)))] if recent else 0.0
+        return snapshot
+
+
+class Meter:
+    """Event counter that also reports the rate over the last METER_WINDOW seconds."""
+
+    def __init__(self, window=METER_WINDOW):
+        self.window = window
+        self.count = 0
+        self._times = collections.deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._times and now - self._times[0] > self.window:
+            self._times.popleft()
+
+    def mark(self, n=1):
+        now = time.monotonic()
+        with self._lock:
+            self.count += n
+            self._times.extend([now] * n)
+            self._trim(now)
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            return {"count": self.count, "per_second": len(self._times) / self.window}
+
+
+class MetricsRegistry:
+    """Named histograms, meters and gauges for one process (see the module docstring)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._meters = {}
+        self._gauges = {}
+        self.started_at = time.time()
+
+    def _get(self, table, name, factory):
+        metric = table.get(name)
+        if metric is None:
+            with self._lock:
+                metric = table.setdefault(name, factory())
+        return metric
+
+    def observe(self, name, seconds):
+        """Record one latency, in seconds, for stage `name`."""
+        self._get(self._histograms, name, Histogram).observe(seconds)
+
+    def mark(self, name, n=1):
+        self._get(self._meters, name, Meter).mark(n)
+
+    def gauge(self, name, read):
+        """Register a callable returning the gauge's current value (a number or a dict)."""
+        with self._lock:
+            self._gauges[name] = read
+
+    def snapshot(self):
+        with self._lock:
+            histograms = dict(self._histograms)
+            meters = dict(self._meters)
+            gauges = dict(self._gauges)
+        values = {}
+        for name, read in gauges.items():
+            try:
+                values[name] = read()
+            except Exception as e:
+                values[name] = None
+                print(f"Error reading gauge {name}: {e}")
+        return {
+            "time": datetime.datetime.now().isoformat(timespec="milliseconds"),
+            "uptime_seconds": time.time() - self.started_at,
+            "stages": {name: histogram.snapshot() for name, histogram in sorted(histograms.items())},
+            "meters": {name: meter.snapshot() for name, meter in sorted(meters.items())},
+            "gauges": values,
+        }
+
+
+METRICS = MetricsRegistry()
+
+
+def prometheus_text(snapshot, prefix="attendance"):
+    """Render a snapshot in the Prometheus text exposition format."""
+    lines = [f"# TYPE {prefix}_stage_latency_ms histogram"]
+    for stage, histogram in snapshot["stages"].items():
+        cumulative = 0
+        for bound, count in zip(BUCKETS_MS + ("+Inf",), histogram["buckets"]):
+            cumulative += count
+            lines.append(f'{prefix}_stage_latency_ms_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'{prefix}_stage_latency_ms_sum{{stage="{stage}"}} {histogram["sum_ms"]}')
+        lines.append(f'{prefix}_stage_latency_ms_count{{stage="{stage}"}} {histogram["count"]}')
+    lines.append(f"# TYPE {prefix}_events_total counter")
+    for name, meter in snapshot["meters"].items():
+        lines.append(f'{prefix}_events_total{{meter="{name}"}} {meter["count"]}')
+    lines.append(f"# TYPE {prefix}_events_per_second gauge")
+    for name, meter in snapshot["meters"].items():
+        lines.append(f'{prefix}_events_per_second{{meter="{name}"}} {meter["per_second"]}')
+    for name, value in snapshot["gauges"].items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE {prefix}_{name} gauge")
+            lines.append(f"{prefix}_{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+class SamplingProfiler(threading.Thread):
+    """
+    Samples the stack of every other thread every `interval` seconds for
+    `seconds` and writes the counts to `path` as collapsed stacks
+    ("thread;outer;...;inner count"), preceded by the functions seen most often.
+    Sampling runs on this thread, so the loop keeps going while it profiles.
+    """
+
+    def __init__(self, path, seconds=PROFILE_SECONDS, interval=PROFILE_SAMPLE_INTERVAL):
+        super().__init__(name="sampling-profiler", daemon=True)
+        self.path = path
+        self.seconds = seconds
+        self.interval = interval
+
+    def run(self):
+        stacks = collections.Counter()
+        names = {}
+        samples = 0
+        deadline = time.monotonic() + self.seconds
+        while time.monotonic() < deadline:
+            names.update((thread.ident, thread.name) for thread in threading.enumerate())
+            for ident, frame in sys._current_frames().items():
+                if ident == self.ident:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                stacks[(names.get(ident, str(ident)),) + tuple(reversed(labels))] += 1
+            samples += 1
+            time.sleep(self.interval)
+
+        # Per thread, how many samples each function was on the stack for.
+        inclusive = collections.Counter()
+        for stack, count in stacks.items():
+            for label in set(stack[1:]):
+                inclusive[f"[{stack[0]}] {label}"] += count
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w") as f:
+            f.write(f"# {samples} samples every {self.interval * 1000:.0f} ms over {self.seconds}s\n")
+            f.write("# Functions most often on a thread's stack (samples, share of that thread's samples):\n")
+            for label, count in inclusive.most_common(25):
+                f.write(f"#   {count:>7} {count / max(samples, 1):>6.1%}  {label}\n")
+            for stack, count in stacks.most_common():
+                f.write(f"{';'.join(stack)} {count}\n")
+        print(f"Wrote sampling profile to {self.path}.")
+
+
+class MetricsExporter(threading.Thread):
+    """
+    Appends a JSON snapshot of `registry` to `path` every `interval` seconds,
+    serves it on 127.0.0.1:`port` (port None disables the endpoint) and starts
+    sampling profiles on request. See start_metrics.
+    """
+
+    def __init__(self, registry=METRICS, path=DEFAULT_METRICS_PATH, interval=DEFAULT_EXPORT_INTERVAL,
+                 port=DEFAULT_METRICS_PORT, profile_dir=DEFAULT_PROFILE_DIR):
+        super().__init__(name="metrics-exporter", daemon=True)
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.port = port
+        self.profile_dir = profile_dir
+        self._stop_event = threading.Event()
+        self._profiler = None
+        self._profiler_lock = threading.Lock()
+        self._server = None
+
+    def start_profile(self, seconds=PROFILE_SECONDS):
+        """Start a sampling profile unless one is running. Returns the dump path, or None."""
+        with self._profiler_lock:
+            if self._profiler is not None and self._profiler.is_alive():
+                return None
+            stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+            path = os.path.join(self.profile_dir, f"profile-{stamp}-{os.getpid()}.txt")
+            self._profiler = SamplingProfiler(path, seconds)
+            self._profiler.start()
+        print(f"Profiling for {seconds}s; the profile will be written to {path}.")
+        return path
+
+    def _serve(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/metrics":
+                    body, content_type = prometheus_text(exporter.registry.snapshot()), "text/plain; version=0.0.4"
+                elif url.path == "/metrics.json":
+                    body, content_type = json.dumps(exporter.registry.snapshot(), default=str), "application/json"
+                elif url.path == "/profile":
+                    try:
+                        seconds = float(parse_qs(url.query).get("seconds", [PROFILE_SECONDS])[0])
+                    except ValueError:
+                        seconds = math.nan
+                    if not math.isfinite(seconds) or seconds <= 0:
+                        self.send_error(400, "seconds must be a positive number")
+                        return
+                    seconds = min(seconds, MAX_PROFILE_SECONDS)
+                    path = exporter.start_profile(seconds)
+                    body = json.dumps({"profile": path, "seconds": seconds} if path else
+                                      {"error": "a profile is already running"})
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        except OSError as e:
+            print(f"Metrics endpoint not started on port {self.port}: {e}")
+            return
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Metrics at http://127.0.0.1:{self._server.server_address[1]}/metrics")
+
+    def _write(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(self.registry.snapshot(), default=str) + "\n")
+
+    def start(self):
+        if self.port is not None:
+            self._serve()
+        super().start()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            if self.path:
+                try:
+                    self._write()
+                except Exception as e:
+                    print(f"Error exporting metrics: {e}")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._server is not None:
+            self._server.shutdown()
+        if self.is_alive():
+            self.join(timeout=1.0)
+        if self.path:
+            try:
+                self._write()  # final snapshot
+            except Exception as e:
+                print(f"Error exporting metrics: {e}")
+
+
+def start_metrics(registry=METRICS, path=DEFAULT_METRICS_PATH, interval=DEFAULT_EXPORT_INTERVAL,
+                  port=DEFAULT_METRICS_PORT, profile_dir=DEFAULT_PROFILE_DIR):
+    """
+    Start a MetricsExporter and, when called on the main thread of a POSIX
+    process, make SIGUSR1 start a sampling profile. Returns the exporter; call
+    stop() on it at shutdown.
+    """
+    exporter = MetricsExporter(registry, path, interval, port, profile_dir)
+    exporter.start()
+    if hasattr(signal, "SIGUSR1") and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, lambda signum, frame: exporter.start_profile())
+        print(f"Send SIGUSR1 (kill -USR1 {os.getpid()}) for a {PROFILE_SECONDS}s sampling profile.")
+    return exporter
@@ -0,0 +1,260 @@
+import collections
+import threading
+import time
+
+import cv2
+
+
+class DropOldestQueue:
+    """
+    Bounded FIFO queue that never blocks the producer.
+    When the queue is full, put() discards the oldest item so consumers always
+    work on the most recent frames. Discarded items are counted in `dropped`.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._items = collections.deque()
+        self._not_empty = threading.Condition()
+
+    def put(self, item):
+        with self._not_empty:
+            if len(self._items) >= self.maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._not_empty.notify()
+
+    def get(self, timeout=None):
+        """Return the oldest item, or None if nothing arrived within timeout."""
+        with self._not_empty:
+            if not self._items:
+                self._not_empty.wait(timeout)
+            if not self._items:
+                return None
+            return self._items.popleft()
+
+    def qsize(self):
+        with self._not_empty:
+            return len(self._items)
+
+
+class StageStats:
+    """
+    Thread-safe throughput and busy-time counters for one pipeline stage.
+    Every record is also passed to observe(name, seconds) when given.
+    """
+
+    def __init__(self, name=None, observe=None):
+        self.name = name
+        self.observe = observe
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.processed = 0
+        self.busy_seconds = 0.0
+
+    def record(self, seconds):
+        with self._lock:
+            self.processed += 1
+            self.busy_seconds += seconds
+        if self.observe is not None:
+            self.observe(self.name, seconds)
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(time.perf_counter() - self._started, 1e-9)
+            return {
+                "processed": self.processed,
+                "per_second": self.processed / elapsed,
+                "avg_ms": 1000.0 * self.busy_seconds / self.processed if self.processed else 0.0,
+            }
+
+
+class LatestFrameCapture(threading.Thread):
+    """
+    Capture thread that reads the camera as fast as it delivers frames.
+    It always holds the latest (seq, frame) and forwards every frame to
+    `output_queue`, whose drop-oldest policy sheds load when workers lag.
+    """
+
+    def __init__(self, video_capture, output_queue, stop_event, stats):
+        super().__init__(name="capture", daemon=True)
+        self.video_capture = video_capture
+        self.output_queue = output_queue
+        self.stop_event = stop_event
+        self.stats = stats
+        self._lock = threading.Lock()
+        self._latest = (0, None)
+        self.failed = False
+
+    def run(self):
+        seq = 0
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            ret, frame = self.video_capture.read()
+            if not ret:
+                print("Failed to grab frame from webcam.")
+                self.failed = True
+                self.stop_event.set()
+                break
+            seq += 1
+            with self._lock:
+                self._latest = (seq, frame)
+            self.output_queue.put((seq, frame))
+            self.stats.record(time.perf_counter() - start)
+
+    def latest(self):
+        with self._lock:
+            return self._latest
+
+
+class RecognitionPipeline:
+    """
+    Staged capture -> detect -> encode/match -> display pipeline.
+
+    Each stage runs on its own thread(s) and hands work on through bounded
+    drop-oldest queues, so a slow stage sheds stale frames instead of stalling
+    the camera. The stage callables do the actual work:
+      detect(frame) -> (detection, face_locations), face_locations in full-frame coordinates
+      recognize(detection, face_locations) -> names
+      annotate(frame, face_locations, names) draws on the frame in place
+      on_recognized(names) is called on the encode worker for every non-empty result; it must
+        not block (AttendanceWriter.submit only enqueues, its own thread writes to the database)
+    dlib and OpenCV release the GIL, so detect/recognize workers use several cores.
+    `stats_providers` maps extra names to callables whose dicts are included in stats().
+    `observe_stage(stage, seconds)` is called for every item a stage finishes.
+    """
+
+    def __init__(self, video_capture, detect, recognize, annotate, on_recognized=None,
+                 detect_workers=2, encode_workers=2, queue_size=2, stats_interval=None,
+                 stats_providers=None, observe_stage=None):
+        self.video_capture = video_capture
+        self.detect = detect
+        self.recognize = recognize
+        self.annotate = annotate
+        self.on_recognized = on_recognized
+        self.detect_workers = detect_workers
+        self.encode_workers = encode_workers
+        self.stats_interval = stats_interval
+        self.stats_providers = stats_providers or {}
+
+        self.stop_event = threading.Event()
+        self.queues = {
+            "detect": DropOldestQueue(queue_size),
+            "encode": DropOldestQueue(queue_size),
+            "results": DropOldestQueue(queue_size),
+        }
+        self.stage_stats = {name: StageStats(name, observe_stage)
+                            for name in ("capture", "detect", "encode", "display", "attendance")}
+        self.capture = LatestFrameCapture(video_capture, self.queues["detect"], self.stop_event,
+                                          self.stage_stats["capture"])
+        self._threads = []
+
+    def _detect_worker(self):
+        while not self.stop_event.is_set():
+            item = self.queues["detect"].get(timeout=0.1)
+            if item is None:
+                continue
+            seq, frame = item
+            start = time.perf_counter()
+            try:
+                detection, face_locations = self.detect(frame)
+            except Exception as e:
+                print(f"Error detecting faces: {e}")
+                continue
+            self.queues["encode"].put((seq, detection, face_locations))
+            self.stage_stats["detect"].record(time.perf_counter() - start)
+
+    def _encode_worker(self):
+        while not self.stop_event.is_set():
+            item = self.queues["encode"].get(timeout=0.1)
+            if item is None:
+                continue
+            seq, detection, face_locations = item
+            start = time.perf_counter()
+            try:
+                names = self.recognize(detection, face_locations)
+            except Exception as e:
+                print(f"Error recognizing faces: {e}")
+                continue
+            self.queues["results"].put((seq, face_locations, names))
+            self.stage_stats["encode"].record(time.perf_counter() - start)
+            if self.on_recognized is not None and names:
+                start = time.perf_counter()
+                try:
+                    self.on_recognized(names)
+                except Exception as e:
+                    print(f"Error logging attendance: {e}")
+                self.stage_stats["attendance"].record(time.perf_counter() - start)
+
+    def start(self):
+        self.capture.start()
+        workers = [("detect", self._detect_worker)] * self.detect_workers
+        workers += [("encode", self._encode_worker)] * self.encode_workers
+        for i, (name, target) in enumerate(workers):
+            thread = threading.Thread(target=target, name=f"{name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self.stop_event.set()
+        self.capture.join(timeout=1.0)
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+
+    def stats(self):
+        """Queue depths, dropped-item counts and per-stage throughput."""
+        stats = {
+            "queues": {name: {"depth": q.qsize(), "dropped": q.dropped} for name, q in self.queues.items()},
+            "stages": {name: stats.snapshot() for name, stats in self.stage_stats.items()},
+        }
+        for name, provider in self.stats_providers.items():
+            stats[name] = provider()
+        return stats
+
+    def run(self, window_name="Face Recognition Attendance"):
+        """
+        Start the worker threads and run the display stage on the calling
+        thread (OpenCV GUI calls must stay on one thread) until 'q' is pressed
+        or the camera stops delivering frames.
+        """
+        self.start()
+        last_seq = 0
+        last_result = (0, [], [])
+        last_stats = time.perf_counter()
+        try:
+            while not self.stop_event.is_set():
+                # Keep only the newest result; workers may finish out of order.
+                while True:
+                    result = self.queues["results"].get(timeout=0)
+                    if result is None:
+                        break
+                    if result[0] > last_result[0]:
+                        last_result = result
+
+                seq, frame = self.capture.latest()
+                if frame is None or seq == last_seq:
+                    if cv2.waitKey(1) & 0xFF == ord('q'):
+                        break
+                    continue
+                last_seq = seq
+
+                start = time.perf_counter()
+                display_frame = frame.copy()
+                _, face_locations, names = last_result
+                try:
+                    self.annotate(display_frame, face_locations, names)
+                    cv2.imshow(window_name, display_frame)
+                except Exception as e:
+                    print(f"Error displaying frame: {e}")
+                self.stage_stats["display"].record(time.perf_counter() - start)
+
+                if self.stats_interval and time.perf_counter() - last_stats >= self.stats_interval:
+                    print(f"Pipeline stats: {self.stats()}")
+                    last_stats = time.perf_counter()
+
+                if cv2.waitKey(1) & 0xFF == ord('q'):
+                    break
+        finally:
+            self.stop()
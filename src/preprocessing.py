@@ -0,0 +1,143 @@
+import collections
+import threading
+
+import cv2
+
+# Downscale factors the preprocessor may choose from, smallest first.
+SCALE_LADDER = (0.125, 0.1875, 0.25, 0.375, 0.5, 0.75, 1.0)
+# dlib's HOG detector finds faces down to roughly 80px in the image it scans;
+# each upsampling step halves that.
+MIN_DETECTABLE_FACE_PX = 80
+
+# Camera capture profiles: requested FOURCC, resolution and frame rate.
+# "native" leaves the camera at its driver defaults.
+CAPTURE_PROFILES = {
+    "native": {},
+    "vga_mjpg": {"fourcc": "MJPG", "width": 640, "height": 480, "fps": 30},
+    "hd_mjpg": {"fourcc": "MJPG", "width": 1280, "height": 720, "fps": 30},
+    "fullhd_mjpg": {"fourcc": "MJPG", "width": 1920, "height": 1080, "fps": 30},
+}
+
+
+def open_capture(source=0, profile="native"):
+    """
+    Open a cv2.VideoCapture and apply a capture profile from CAPTURE_PROFILES.
+    The FOURCC is set before the resolution since many UVC cameras only offer
+    high resolutions at a usable frame rate in MJPG mode.
+    """
+    video_capture = cv2.VideoCapture(source)
+    settings = CAPTURE_PROFILES[profile]
+    if "fourcc" in settings:
+        video_capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*settings["fourcc"]))
+    if "width" in settings:
+        video_capture.set(cv2.CAP_PROP_FRAME_WIDTH, settings["width"])
+        video_capture.set(cv2.CAP_PROP_FRAME_HEIGHT, settings["height"])
+    if "fps" in settings:
+        video_capture.set(cv2.CAP_PROP_FPS, settings["fps"])
+    # Keep the driver queue short so reads return fresh frames.
+    video_capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+    return video_capture
+
+
+class FramePreprocessor:
+    """
+    Downscale and colour-convert camera frames into reusable buffers, and pick
+    the downscale factor and detector upsampling adaptively.
+
+    Each thread gets its own ring of `buffers` destination arrays per output
+    size, so no per-frame allocation happens once the ring is warm. A frame's
+    buffer is reused only after `buffers` further frames, so the ring must be
+    larger than the number of frames a thread can have in flight downstream.
+
+    Callers report the detection latency and the faces found through observe().
+    When detection runs over latency_budget seconds the scale is lowered (as
+    long as recently seen faces stay detectable) and upsampling is dropped;
+    when faces get too small to detect reliably and there is latency headroom,
+    the scale (and, at full resolution, upsampling) goes back up.
+    """
+
+    def __init__(self, scale=0.25, upsample=1, latency_budget=0.08, buffers=1,
+                 adapt_every=15, face_history=30, max_upsample=2):
+        self.scale = scale
+        self.upsample = upsample
+        self.latency_budget = latency_budget
+        self.buffers = buffers
+        self.adapt_every = adapt_every
+        self.max_upsample = max_upsample
+        self.latency_ema = None
+        self.recent_face_heights = collections.deque(maxlen=face_history)
+        self._observed = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _ring(self, size):
+        """This thread's [next_slot, slots] ring of (small, rgb) buffers for one output size."""
+        rings = getattr(self._local, "rings", None)
+        if rings is None:
+            rings = self._local.rings = {}
+        ring = rings.get(size)
+        if ring is None:
+            ring = rings[size] = [0, [[None, None] for _ in range(self.buffers)]]
+        return ring
+
+    def process(self, frame):
+        """
+        Return (rgb_small_frame, scale, upsample) for a BGR frame. The returned
+        array lives in a reused buffer.
+        """
+        with self._lock:
+            scale, upsample = self.scale, self.upsample
+        height, width = frame.shape[:2]
+        size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+        ring = self._ring(size)
+        slot = ring[1][ring[0]]
+        ring[0] = (ring[0] + 1) % self.buffers
+        slot[0] = cv2.resize(frame, size, dst=slot[0])
+        slot[1] = cv2.cvtColor(slot[0], cv2.COLOR_BGR2RGB, dst=slot[1])
+        return slot[1], scale, upsample
+
+    @staticmethod
+    def to_full(face_locations, scale):
+        """Map (top, right, bottom, left) boxes from a frame downscaled by `scale` back to full size."""
+        return [tuple(int(round(v / scale)) for v in box) for box in face_locations]
+
+    def observe(self, latency, face_locations, scale):
+        """Record one detection run (seconds taken, boxes found at `scale`) and adapt every adapt_every runs."""
+        with self._lock:
+            self.latency_ema = latency if self.latency_ema is None else 0.8 * self.latency_ema + 0.2 * latency
+            for top, _, bottom, _ in face_locations:
+                self.recent_face_heights.append((bottom - top) / scale)
+            self._observed += 1
+            if self._observed % self.adapt_every == 0:
+                self._adapt()
+
+    def _detectable(self, face_height, scale, upsample):
+        # Keep a 20% margin above the detector's minimum face size.
+        return face_height * scale * (2 ** upsample) >= 1.2 * MIN_DETECTABLE_FACE_PX
+
+    def _adapt(self):
+        smallest = min(self.recent_face_heights) if self.recent_face_heights else None
+        step = SCALE_LADDER.index(self.scale) if self.scale in SCALE_LADDER else None
+        over_budget = self.latency_ema > self.latency_budget
+        headroom = self.latency_ema < 0.5 * self.latency_budget
+
+        if over_budget:
+            if step is not None and step > 0 and (
+                    smallest is None or self._detectable(smallest, SCALE_LADDER[step - 1], self.upsample)):
+                self.scale = SCALE_LADDER[step - 1]
+            elif self.upsample > 0 and (
+                    smallest is None or self._detectable(smallest, self.scale, self.upsample - 1)):
+                self.upsample -= 1
+        elif headroom and smallest is not None and not self._detectable(smallest, self.scale, self.upsample):
+            if step is not None and step < len(SCALE_LADDER) - 1:
+                self.scale = SCALE_LADDER[step + 1]
+            elif self.upsample < self.max_upsample:
+                self.upsample += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "scale": self.scale,
+                "upsample": self.upsample,
+                "latency_ema_ms": None if self.latency_ema is None else 1000.0 * self.latency_ema,
+            }
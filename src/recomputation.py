@@ -1,89 +1,221 @@
+import argparse
 import os
-import pickle
-import boto3 # type: ignore
+import sys
 import face_recognition
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from botocore.exceptions import ClientError  # type: ignore
+
+from face_encodings.gallery_format import gallery_from_bytes, gallery_to_bytes
+from face_encodings.compaction import DEDUP_DISTANCE, MAX_PROTOTYPES, compact_gallery, format_report
+from face_encodings.face_store import FaceStore, encode_with_store
+from face_encodings.manifest import EncodingManifest, file_sha256, sync_local_manifest
+from face_encodings.s3_utils import get_s3_client, is_conflict
+from face_encodings.sharded_gallery import fetch_manifest, publish_sharded_gallery
+
 # Configuration
 BUCKET_NAME = "attendance-images-upload"  # Your S3 bucket name
-PICKLE_S3_KEY = "pickle/encodings.pickle"  # S3 key for the pickle file
+GALLERY_S3_KEY = "pickle/encodings.gallery"  # S3 key for the binary gallery (preferred by loaders)
+LEGACY_PICKLE_S3_KEY = "pickle/encodings.pickle"  # Only checked for, to refuse dropping an unconverted gallery
+# "sharded" uploads only the changed gallery shards, "gallery" one binary
+# gallery object. Readers prefer sharded, then gallery; the legacy pickle is
+# no longer published since readers only load it when explicitly allowed.
+UPLOAD_FORMAT = "sharded"
+MANIFEST_S3_KEY = "pickle/encodings_manifest.json"  # Per-image manifest the gallery is built from
 KNOWN_FACES_FOLDER = "../known_faces"  # Local folder with known faces
+FACE_STORE_DIR = "../encodings/face_chips"  # Aligned faces found on each image's first encode
+# Deduplicate each student's encodings and keep at most MAX_PROTOTYPES diverse
+# ones in the published gallery (see face_encodings/compaction.py). The manifest
+# keeps every image's encoding, so compaction settings can change at any time.
+COMPACT_GALLERY = True
 
-def download_pickle_from_s3():
+def download_manifest_from_s3():
     """
-    Downloads the encodings pickle file from S3.
-    Returns an empty dictionary if the file doesn’t exist or an error occurs.
+    Downloads the per-image encoding manifest from S3.
+    Returns (manifest, ETag); an empty manifest and None if it doesn't exist
+    or an error occurs.
     """
-    s3_client = boto3.client('s3')
+    s3_client = get_s3_client()
     try:
-        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=PICKLE_S3_KEY)
-        pickle_data = response['Body'].read()
-        encodings_dict = pickle.loads(pickle_data)
-        print("Downloaded existing pickle file from S3.")
-        return encodings_dict
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=MANIFEST_S3_KEY)
+        manifest = EncodingManifest.from_json(response['Body'].read())
+        print(f"Downloaded encoding manifest from S3 ({len(manifest)} images).")
+        return manifest, response['ETag']
     except s3_client.exceptions.NoSuchKey:
-        print("No existing pickle file found. Starting with an empty dictionary.")
-        return {}
+        print("No encoding manifest found. Every image will be encoded once.")
+        return EncodingManifest(), None
     except Exception as e:
-        print(f"Error downloading pickle file: {e}")
+        print(f"Error downloading encoding manifest: {e}")
+        return EncodingManifest(), None
+
+def upload_manifest_to_s3(manifest, etag, owned, removed, max_attempts=5):
+    """
+    Uploads the per-image encoding manifest to S3, replacing the copy it was
+    downloaded as (If-Match on etag, If-None-Match when there was none). If
+    another machine wrote the manifest meanwhile, this machine's entries
+    (images of the `owned` students) and `removed` image ids are applied to
+    the newer copy and the upload is retried.
+    """
+    s3_client = get_s3_client()
+    for _ in range(max_attempts):
+        condition = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+        try:
+            s3_client.put_object(Bucket=BUCKET_NAME, Key=MANIFEST_S3_KEY, **condition,
+                                 Body=manifest.to_json().encode('utf-8'))
+            print("Uploaded encoding manifest to S3.")
+            return True
+        except ClientError as e:
+            if not is_conflict(e):
+                print(f"Error uploading encoding manifest: {e}")
+                return False
+        newer, etag = download_manifest_from_s3()
+        if etag is None:
+            print("Error uploading encoding manifest: it changed in S3 and could not be read back.")
+            return False
+        print("The encoding manifest changed in S3 meanwhile; merging this machine's images into it.")
+        for image_id, entry in list(newer.entries.items()):
+            if entry["student"] in owned:
+                del newer.entries[image_id]
+        newer.remove(removed)
+        newer.entries.update({image_id: entry for image_id, entry in manifest.entries.items()
+                              if entry["student"] in owned})
+        newer.published = manifest.published
+        manifest = newer
+    print(f"Error uploading encoding manifest: it kept changing; gave up after {max_attempts} attempts.")
+    return False
+
+def existing_students(owned):
+    """
+    Students of the single-object gallery in S3 that `owned` does not cover,
+    which a publish limited to this machine's students would otherwise drop:
+    always for UPLOAD_FORMAT "gallery", and for "sharded" until the first
+    sharded gallery exists (its shards are merged by publish_sharded_gallery).
+    Raises RuntimeError if S3 only has the legacy pickle, which is not read.
+    """
+    s3_client = get_s3_client()
+    if UPLOAD_FORMAT == "sharded" and fetch_manifest(s3_client, BUCKET_NAME)[0] is not None:
         return {}
+    try:
+        response = s3_client.get_object(Bucket=BUCKET_NAME, Key=GALLERY_S3_KEY)
+    except s3_client.exceptions.NoSuchKey:
+        try:
+            s3_client.head_object(Bucket=BUCKET_NAME, Key=LEGACY_PICKLE_S3_KEY)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ("404", "NoSuchKey"):
+                return {}
+            raise
+        raise RuntimeError(f"s3://{BUCKET_NAME}/{LEGACY_PICKLE_S3_KEY} has not been converted; run "
+                           "face_encodings/upload_encodings_to_s3.py --convert-s3-pickle first")
+    encodings = gallery_from_bytes(response['Body'].read()).to_encodings_dict()
+    return {name: student_encodings for name, student_encodings in encodings.items() if name not in owned}
 
-def compute_encodings_for_person(person_name):
+def compute_encoding_for_image(image_path):
     """
-    Computes face encodings for all valid images in the person’s subfolder.
-    Returns a list of encodings.
+    Computes the face encoding of one image, or None if no face is found.
+    Faces already in the face store (see face_encodings/face_store.py) are
+    encoded without decoding the image or detecting the face again.
     """
-    person_folder = os.path.join(KNOWN_FACES_FOLDER, person_name)
-    encodings = []
-    for filename in os.listdir(person_folder):
-        if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-            image_path = os.path.join(person_folder, filename)
-            image = face_recognition.load_image_file(image_path)
-            face_encodings = face_recognition.face_encodings(image)
-            if face_encodings:
-                encodings.append(face_encodings[0])
-                print(f"Computed encoding for {filename} in {person_name}'s folder.")
-            else:
-                print(f"No face found in {filename} in {person_name}'s folder.")
-    return encodings
+    encoding = encode_with_store(FaceStore(FACE_STORE_DIR), file_sha256(image_path),
+                                 lambda: face_recognition.load_image_file(image_path))
+    if encoding is not None:
+        print(f"Computed encoding for {image_path}.")
+        return encoding
+    print(f"No face found in {image_path}.")
+    return None
 
-def upload_pickle_to_s3(encodings_dict):
+def upload_pickle_to_s3(encodings_dict, fmt=None, replace_only=None):
     """
-    Serializes the encodings dictionary and uploads it to S3.
+    Serializes the encodings dictionary and uploads it to S3: as shards of
+    which only the changed ones are uploaded ("sharded") or as one binary
+    gallery (GALLERY_S3_KEY, "gallery").
+    fmt defaults to UPLOAD_FORMAT. replace_only limits a sharded upload to
+    those students (see publish_sharded_gallery). Returns True on success.
     """
-    s3_client = boto3.client('s3')
+    fmt = fmt or UPLOAD_FORMAT
+    if fmt not in ("sharded", "gallery"):
+        raise ValueError(f"Unknown upload format {fmt!r}; use 'sharded' or 'gallery'")
+    s3_client = get_s3_client()
     try:
-        pickle_data = pickle.dumps(encodings_dict)
-        s3_client.put_object(Bucket=BUCKET_NAME, Key=PICKLE_S3_KEY, Body=pickle_data)
-        print("Uploaded updated pickle file to S3.")
+        if fmt == "sharded":
+            publish_sharded_gallery(encodings_dict, bucket=BUCKET_NAME, replace_only=replace_only)
+            return True
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=GALLERY_S3_KEY, Body=gallery_to_bytes(encodings_dict))
+        print(f"Uploaded updated encodings to s3://{BUCKET_NAME}/{GALLERY_S3_KEY}.")
+        return True
     except Exception as e:
-        print(f"Error uploading updated pickle file: {e}")
+        print(f"Error uploading updated encodings: {e}")
+        return False
 
-def main():
-    # Step 1: Download existing encodings from S3
-    encodings_dict = download_pickle_from_s3()
+def publish_settings():
+    """Settings that change the published gallery even when no image changed."""
+    settings = {"format": UPLOAD_FORMAT, "compact": COMPACT_GALLERY}
+    if COMPACT_GALLERY:
+        settings.update(max_prototypes=MAX_PROTOTYPES, dedup_distance=DEDUP_DISTANCE)
+    return settings
+
+def local_students():
+    """Names of the students with a folder in KNOWN_FACES_FOLDER."""
+    return {name for name in os.listdir(KNOWN_FACES_FOLDER)
+            if os.path.isdir(os.path.join(KNOWN_FACES_FOLDER, name))}
 
-    # Step 2: List all persons in the known_faces folder
-    known_persons = [
-        name for name in os.listdir(KNOWN_FACES_FOLDER)
-        if os.path.isdir(os.path.join(KNOWN_FACES_FOLDER, name))
-    ]
+def main():
+    parser = argparse.ArgumentParser(description="Re-encode changed known faces and republish the gallery to S3.")
+    parser.add_argument("--prune", action="store_true",
+                        help="treat this machine's known_faces folder as the whole gallery: drop students "
+                             "that have no folder here, including ones registered on other machines")
+    parser.add_argument("--force", action="store_true",
+                        help="republish the gallery even if no image or publish setting changed")
+    args = parser.parse_args()
 
-    # Step 3: Identify new persons
-    existing_persons = set(encodings_dict.keys())
-    all_persons = set(known_persons)
-    new_persons = all_persons - existing_persons
+    # Step 1: Download the per-image manifest the S3 gallery was built from
+    manifest, manifest_etag = download_manifest_from_s3()
 
-    # Step 4 & 5: Compute encodings for new persons and update the dictionary
-    for person in new_persons:
-        person_encodings = compute_encodings_for_person(person)
-        if person_encodings:
-            encodings_dict[person] = person_encodings
-            print(f"Added encodings for {person}.")
-        else:
-            print(f"No encodings found for {person}.")
+    # Step 2: Encode images that are new or changed in the known_faces folder
+    # (including new photos of existing students) and drop deleted ones.
+    # Students without a folder on this machine were added elsewhere; unless
+    # pruning, their images stay in the manifest and their shards in S3.
+    owned = local_students()
+    foreign = {} if args.prune else {
+        image_id: entry for image_id, entry in manifest.entries.items() if entry["student"] not in owned}
+    manifest.remove(foreign)
+    changed, removed, touched = sync_local_manifest(manifest, KNOWN_FACES_FOLDER, compute_encoding_for_image)
+    manifest.entries.update(foreign)
+    print(f"{len(changed)} new or changed image(s), {len(removed)} deleted image(s)"
+          + (f", {len(foreign)} image(s) of students from other machines kept." if foreign else "."))
+    # The manifest records the settings of the last successful publish, so a
+    # change of UPLOAD_FORMAT or the compaction settings alone republishes too.
+    settings = publish_settings()
+    if not changed and not removed and manifest.published == settings and not args.force:
+        if touched:
+            upload_manifest_to_s3(manifest, manifest_etag, owned, removed)
+        print("Encodings are up to date.")
+        return
+    if not changed and not removed and manifest.published != settings:
+        print(f"Publish settings changed ({manifest.published} -> {settings}); republishing.")
 
-    # Step 6: Upload the updated encodings back to S3
-    upload_pickle_to_s3(encodings_dict)
+    # Step 3: Compact the gallery, then upload it and the manifest back to S3
+    encodings_dict = manifest.to_encodings_dict()
+    if COMPACT_GALLERY:
+        encodings_dict, report = compact_gallery(encodings_dict, MAX_PROTOTYPES, DEDUP_DISTANCE)
+        print(format_report(report))
+    replace_only = None
+    if not args.prune:
+        # Students only in a gallery published before this manifest existed
+        # (e.g. by an older builder) are carried over as they are.
+        replace_only = owned | set(encodings_dict)
+        try:
+            kept = existing_students(replace_only)
+        except Exception as e:
+            print(f"Not publishing: could not read the existing gallery ({e}). "
+                  "Fix that, or pass --prune to publish only this machine's students.")
+            return
+        if kept:
+            print(f"Keeping {len(kept)} student(s) from the existing gallery.")
+            encodings_dict = {**encodings_dict, **kept}
+    published = upload_pickle_to_s3(encodings_dict, replace_only=replace_only)
+    # A failed publish is retried by the next run even if no image changes by then.
+    manifest.published = settings if published else None
+    upload_manifest_to_s3(manifest, manifest_etag, owned, removed)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
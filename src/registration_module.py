@@ -5,11 +5,11 @@ import os
 parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, parent_dir)
 import cv2
+import queue
 import tkinter as tk
 from tkinter import ttk, messagebox
 from PIL import Image, ImageTk
-import face_recognition
-from database.database_module import get_student_by_name, create_student, insert_student_image
+from src.enrollment_worker import EnrollmentWorker
 
 
 
@@ -33,6 +33,11 @@ class RegistrationApp(tk.Tk):
         # Setup UI components
         self.create_widgets()
 
+        # Captures are processed and enrolled in the background
+        self.enrollment_worker = EnrollmentWorker()
+        self.enrollment_worker.start()
+        self.poll_enrollment()
+
         # Open the webcam
         self.cap = cv2.VideoCapture(0)
         if not self.cap.isOpened():
@@ -58,6 +63,10 @@ class RegistrationApp(tk.Tk):
         quit_button = ttk.Button(control_frame, text="Quit", command=self.quit_app)
         quit_button.pack(side=tk.LEFT, padx=5)
 
+        self.status_var = tk.StringVar(value="")
+        status_label = ttk.Label(control_frame, textvariable=self.status_var)
+        status_label.pack(side=tk.LEFT, padx=5)
+
         # Frame for video display
         self.video_frame = ttk.Frame(self, relief=tk.SUNKEN, padding="10 10 10 10")
         self.video_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -95,57 +104,60 @@ class RegistrationApp(tk.Tk):
             messagebox.showerror("Error", "Failed to capture image from webcam.")
             return
 
-        # Convert frame to RGB for face detection
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb_frame)
-        if not face_locations:
-            messagebox.showinfo("No Face Detected", "No face detected. Please adjust your position and try again.")
+        # Face detection, saving, database records and encoding happen on the
+        # enrollment worker; poll_enrollment() reports the outcome
+        if not self.enrollment_worker.submit(student_name, frame):
+            messagebox.showinfo("Busy", "Still processing earlier captures. Please wait a moment.")
             return
-
-        # Create a directory for the student if it doesn't exist
-        # Local directory where images are temporarily stored
-        output_dir = os.path.join("..", "known_faces", student_name)
-        os.makedirs(output_dir, exist_ok=True)
-
-        # Increment counter and save the captured image
-        self.captured_count += 1
-        image_filename = f"{self.captured_count}.jpg"
-        local_image_path = os.path.join(output_dir, image_filename)
-        cv2.imwrite(local_image_path, frame)
-        messagebox.showinfo("Captured", f"Captured image {self.captured_count} for {student_name}")
-
-        # Display a thumbnail of the captured image in the UI
-        thumb = cv2.resize(frame, (100, 75))
-        thumb = cv2.cvtColor(thumb, cv2.COLOR_BGR2RGB)
-        thumb_image = Image.fromarray(thumb)
-        thumb_photo = ImageTk.PhotoImage(thumb_image)
-        thumb_label = ttk.Label(self.thumbnail_frame, image=thumb_photo)
-        thumb_label.image = thumb_photo  # Keep a reference
-        thumb_label.pack(side=tk.LEFT, padx=5)
-
-        # Handle new student registration and image insertion into MySQL
-        student = get_student_by_name(student_name)
-        if student is None:
-            # Student is new; create a new record
-            student_id = create_student(student_name, metadata=None)
-            if student_id is None:
-                messagebox.showerror("Database Error", "Failed to register student in the database.")
-                return
-        else:
-            student_id = student.get("student_id")
-
-        # Compute the relative path for storage in the database (relative to the known_faces folder)
-        relative_path = os.path.join(student_name, image_filename)
-        # Insert the image record into the student_images table (storing the relative path)
-        if not insert_student_image(student_id, relative_path):
-            messagebox.showerror("Database Error", "Failed to save image record in the database.")
-
-        if self.captured_count >= self.desired_images:
-            messagebox.showinfo("Registration Completed",
-                                f"Successfully captured {self.captured_count} images for {student_name}.")
+        self.status_var.set(f"Processing {self.enrollment_worker.pending()} capture(s)...")
+
+    def poll_enrollment(self):
+        # Tk widgets may only be touched from this thread, so worker events are drained here
+        while True:
+            try:
+                event = self.enrollment_worker.events.get_nowait()
+            except queue.Empty:
+                break
+            self.handle_enrollment_event(event)
+        self.after(100, self.poll_enrollment)
+
+    def handle_enrollment_event(self, event):
+        if event["type"] == "no_face":
+            messagebox.showinfo("No Face Detected", "No face detected. Please adjust your position and try again.")
+        elif event["type"] == "error":
+            messagebox.showerror("Registration Error", event["message"])
+        elif event["type"] == "captured":
+            self.captured_count += 1
+            self.status_var.set(f"Captured image {self.captured_count} for {event['student']}")
+
+            # Display a thumbnail of the captured image in the UI
+            thumb_photo = ImageTk.PhotoImage(Image.fromarray(event["thumbnail"]))
+            thumb_label = ttk.Label(self.thumbnail_frame, image=thumb_photo)
+            thumb_label.image = thumb_photo  # Keep a reference
+            thumb_label.pack(side=tk.LEFT, padx=5)
+
+            if self.captured_count >= self.desired_images:
+                messagebox.showinfo("Registration Completed",
+                                    f"Successfully captured {self.captured_count} images for {event['student']}.")
+        elif event["type"] == "enrolled":
+            s3_updated = event["s3_shards"] is not None and not event["s3_error"]
+            skipped = [reason for reason in (event["local_skipped"], event["s3_skipped"]) if reason]
+            if event["s3_error"]:
+                skipped.append(f"S3 update failed: {event['s3_error']}")
+            students = ', '.join(event['students'])
+            if event["local"] or s3_updated:
+                updated = [name for name, done in (("the local gallery", event["local"]), ("S3", s3_updated)) if done]
+                where = " and ".join(updated)
+                self.status_var.set(f"{students} added to {where} in {event['seconds']:.1f}s "
+                                    f"and can now be recognized"
+                                    + (f" ({'; '.join(skipped)})." if skipped else "."))
+            else:
+                self.status_var.set(f"{students} saved to the image folder; the images will be picked up "
+                                    f"at the next recompute ({'; '.join(skipped)}).")
 
     def quit_app(self):
-        # Cleanly release the webcam and close the application
+        # Cleanly release the webcam and close the application, letting queued captures finish
+        self.enrollment_worker.close(timeout=30)
         if self.cap.isOpened():
             self.cap.release()
         self.destroy()
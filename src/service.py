@@ -0,0 +1,157 @@
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, parent_dir)
+
+from face_encodings.data_preparation import load_known_matcher
+from face_encodings.matcher import UNKNOWN_NAME
+from database.attendance_writer import AttendanceWriter
+from src.face_recognition_module import detect_faces, recognize_faces
+from src.preprocessing import FramePreprocessor, open_capture
+from src.tracker import FaceTracker
+
+# A stream reports the same student again only after this many seconds; the
+# attendance writer applies the real duplicate_threshold across all streams.
+EVENT_COOLDOWN = 10
+EVENT_QUEUE_SIZE = 10000
+
+# Set in the parent before the pool forks, so workers share the gallery pages
+# copy-on-write instead of each unpickling their own copy.
+_matcher = None
+_events = None
+
+
+def _init_worker(events, matcher=None):
+    global _events, _matcher
+    _events = events
+    if matcher is not None:
+        # Platforms without fork get the gallery pickled once per worker.
+        _matcher = matcher
+
+
+def parse_source(source):
+    """Camera device indexes are given as integers; anything else is a file path or URL."""
+    return int(source) if source.isdigit() else source
+
+
+def run_stream(source, tolerance=0.4, capture_profile="native", use_tracker=True):
+    """
+    Worker process body: recognise faces in one stream until it ends and send
+    (source, name) events to the attendance writer. Returns a summary dict.
+    """
+    video_capture = open_capture(parse_source(source), capture_profile)
+    if not video_capture.isOpened():
+        print(f"Error: Cannot open source {source}.")
+        return {"source": source, "frames": 0, "recognitions": 0, "error": "cannot open source"}
+
+    preprocessor = FramePreprocessor()
+    tracker = FaceTracker() if use_tracker else None
+    last_sent = {}
+    frames = 0
+    recognitions = 0
+    start = time.perf_counter()
+    try:
+        while True:
+            ret, frame = video_capture.read()
+            if not ret:
+                break
+            frames += 1
+            try:
+                detection, face_locations = detect_faces(frame, preprocessor)
+                names = recognize_faces(detection, face_locations, _matcher, tolerance, tracker)
+            except Exception as e:
+                print(f"[{source}] Error recognizing faces: {e}")
+                continue
+            now = time.monotonic()
+            for name in names:
+                if name == UNKNOWN_NAME or now - last_sent.get(name, -EVENT_COOLDOWN) < EVENT_COOLDOWN:
+                    continue
+                last_sent[name] = now
+                recognitions += 1
+                _events.put((source, name))
+    finally:
+        video_capture.release()
+    elapsed = time.perf_counter() - start
+    return {"source": source, "frames": frames, "recognitions": recognitions,
+            "fps": frames / elapsed if elapsed > 0 else 0.0}
+
+
+def forward_events(events, attendance_writer):
+    """Feed events from every stream into the single attendance writer until None arrives."""
+    while True:
+        event = events.get()
+        if event is None:
+            break
+        source, name = event
+        attendance_writer.submit(name)
+
+
+def run_service(sources, workers=None, tolerance=0.4, capture_profile="native", use_tracker=True,
+                duplicate_threshold=3600):
+    """
+    Headless multi-camera recognition service.
+    Loads the gallery once, then runs every source (device index, video file or
+    RTSP URL) in its own worker process. Recognitions from all workers flow
+    through one queue to a single attendance writer in this process.
+    """
+    global _matcher
+    _matcher = load_known_matcher()
+    if _matcher is None:
+        print("No encodings loaded. Cannot proceed with face recognition.")
+        return []
+
+    use_fork = "fork" in mp.get_all_start_methods()
+    ctx = mp.get_context("fork" if use_fork else "spawn")
+    events = ctx.Queue(maxsize=EVENT_QUEUE_SIZE)
+    attendance_writer = AttendanceWriter(duplicate_threshold=duplicate_threshold)
+    forwarder = threading.Thread(target=forward_events, args=(events, attendance_writer),
+                                 name="event-forwarder", daemon=True)
+
+    summaries = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers or len(sources), mp_context=ctx,
+                                 initializer=_init_worker,
+                                 initargs=(events, None if use_fork else _matcher)) as pool:
+            futures = {pool.submit(run_stream, source, tolerance, capture_profile, use_tracker): source
+                       for source in sources}
+            # Threads are started only after the workers have been forked.
+            attendance_writer.start()
+            forwarder.start()
+            for future in as_completed(futures):
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    summary = {"source": futures[future], "error": str(e)}
+                print(f"Stream finished: {summary}")
+                summaries.append(summary)
+    except KeyboardInterrupt:
+        print("Keyboard interrupt received. Exiting.")
+    finally:
+        events.put(None)
+        if forwarder.is_alive():
+            forwarder.join()
+        attendance_writer.close()
+        print(f"Attendance writer: {attendance_writer.stats()}")
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-camera face recognition attendance service.")
+    parser.add_argument("sources", nargs="+", help="Camera indexes, video files or RTSP URLs.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per source).")
+    parser.add_argument("--tolerance", type=float, default=0.4)
+    parser.add_argument("--capture-profile", default="native")
+    parser.add_argument("--no-tracker", action="store_true")
+    args = parser.parse_args()
+    run_service(args.sources, workers=args.workers, tolerance=args.tolerance,
+                capture_profile=args.capture_profile, use_tracker=not args.no_tracker)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import itertools
+import threading
+
+from face_encodings.matcher import UNKNOWN_NAME
+
+
+def box_iou(a, b):
+    """Intersection-over-union of two (top, right, bottom, left) boxes."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    union = area_a + area_b - inter
+    return inter / union if union > 0 else 0.0
+
+
+def centroid_shift(a, b):
+    """Distance between box centres, relative to the width of box a."""
+    ay, ax = (a[0] + a[2]) / 2, (a[1] + a[3]) / 2
+    by, bx = (b[0] + b[2]) / 2, (b[1] + b[3]) / 2
+    width = max(a[1] - a[3], 1)
+    return ((ay - by) ** 2 + (ax - bx) ** 2) ** 0.5 / width
+
+
+class Track:
+    """A face followed across frames, with the identity recognised for it."""
+
+    def __init__(self, track_id, box, frame_index):
+        self.track_id = track_id
+        self.box = box
+        self.name = None
+        self.distance = None
+        self.last_seen = frame_index
+        # Frame index and box of the last (re-)encoding, or None if never encoded.
+        self.encoded_at = None
+        self.encoded_box = None
+
+
+class FaceTracker:
+    """
+    Links face detections across frames so an identity is recognised once per
+    track instead of once per frame.
+
+    Detections are matched to existing tracks greedily by IoU, falling back to
+    centroid distance for small fast-moving faces. A track is (re-)encoded only
+    when it is new, when its box has drifted from where it was last encoded,
+    or when its last encoding is older than max_age frames (unknown faces are
+    retried after unknown_max_age frames). Safe to share between worker threads.
+    """
+
+    def __init__(self, min_iou=0.3, max_centroid_shift=0.5, drift_iou=0.5,
+                 max_age=30, unknown_max_age=5, max_missed=5):
+        self.min_iou = min_iou
+        self.max_centroid_shift = max_centroid_shift
+        self.drift_iou = drift_iou
+        self.max_age = max_age
+        self.unknown_max_age = unknown_max_age
+        self.max_missed = max_missed
+        self.tracks = []
+        self.frame_index = 0
+        self.encoded = 0
+        self.reused = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _link(self, face_locations):
+        """Return the track matched to each detection (None for unmatched)."""
+        assigned = [None] * len(face_locations)
+        free_tracks = set(range(len(self.tracks)))
+        pairs = []
+        for d, box in enumerate(face_locations):
+            for t in free_tracks:
+                iou = box_iou(self.tracks[t].box, box)
+                if iou >= self.min_iou:
+                    pairs.append((iou, d, t))
+        for _, d, t in sorted(pairs, reverse=True):
+            if assigned[d] is None and t in free_tracks:
+                assigned[d] = self.tracks[t]
+                free_tracks.discard(t)
+        for d, box in enumerate(face_locations):
+            if assigned[d] is not None:
+                continue
+            candidates = [(centroid_shift(self.tracks[t].box, box), t) for t in free_tracks]
+            candidates = [c for c in candidates if c[0] <= self.max_centroid_shift]
+            if candidates:
+                _, t = min(candidates)
+                assigned[d] = self.tracks[t]
+                free_tracks.discard(t)
+        return assigned
+
+    def _needs_encoding(self, track):
+        if track.encoded_at is None:
+            return True
+        max_age = self.unknown_max_age if track.name in (None, UNKNOWN_NAME) else self.max_age
+        if self.frame_index - track.encoded_at >= max_age:
+            return True
+        return box_iou(track.encoded_box, track.box) < self.drift_iou
+
+    def update(self, face_locations):
+        """
+        Advance one frame with the given detections.
+        Returns (tracks, to_encode): the track for each detection in order, and
+        the indexes of detections whose encoding must be (re)computed. Those
+        tracks are reserved for the caller, who reports back with assign().
+        """
+        with self._lock:
+            self.frame_index += 1
+            matched = self._link(face_locations)
+            tracks = []
+            to_encode = []
+            for d, (box, track) in enumerate(zip(face_locations, matched)):
+                if track is None:
+                    track = Track(next(self._ids), box, self.frame_index)
+                    self.tracks.append(track)
+                track.box = box
+                track.last_seen = self.frame_index
+                if self._needs_encoding(track):
+                    track.encoded_at = self.frame_index
+                    track.encoded_box = box
+                    to_encode.append(d)
+                    self.encoded += 1
+                else:
+                    self.reused += 1
+                tracks.append(track)
+            self.tracks = [t for t in self.tracks if self.frame_index - t.last_seen <= self.max_missed]
+            return tracks, to_encode
+
+    def assign(self, track, name, distance):
+        """Record the identity recognised for a track."""
+        with self._lock:
+            track.name = name
+            track.distance = distance
+
+    def stats(self):
+        with self._lock:
+            return {"active_tracks": len(self.tracks), "encoded": self.encoded, "reused": self.reused}